@@ -19,15 +19,14 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import sys
 import argparse
 import logging
-import requests
-import argcomplete
-from edi.commands import clean, config, image, lxc, target, version, documentation  # noqa: ignore=F401
-from edi.lib.commandfactory import get_sub_commands, get_command
-from edi.lib.helpers import print_error_and_exit, FatalError
-from edi.lib.edicommand import EdiCommand
+from edi.lib.commandfactory import (get_command, get_command_help, get_full_command_name, get_short_command_name,
+                                    get_sub_command_names)
+from edi.lib.helpers import print_error_and_exit, FatalError, create_artifact_dir, get_artifact_dir, chown_to_user
+from edi.lib.profiler import Profiler, profiled_stage
 from edi.lib.configurationparser import command_context
 from subprocess import CalledProcessError
 
@@ -45,7 +44,26 @@ def _setup_logging(cli_args):
     logging.basicConfig(level=log_level)
 
 
-def _setup_command_line_interface():
+def _write_profile():
+    create_artifact_dir()
+    report_file, trace_file = Profiler.write_report(get_artifact_dir())
+    for profile_file in [report_file, trace_file]:
+        chown_to_user(profile_file)
+    print("Wrote timing report {} and trace event file {}.".format(report_file, trace_file))
+
+
+def _get_requested_words(argv):
+    if '_ARGCOMPLETE' in os.environ:
+        return os.environ.get('COMP_LINE', '').split()[1:]
+    else:
+        return argv
+
+
+def _setup_command_line_interface(argv=None):
+    """
+    Setup the command line interface. If argv is given, only the commands that
+    got mentioned get imported - the other ones just get advertised by name.
+    """
     parser = argparse.ArgumentParser(description=("Setup and manage an "
                                                   "embedded development "
                                                   "infrastructure."))
@@ -58,38 +76,80 @@ def _setup_command_line_interface():
                         help="switch command processing into interactive debug mode (useful for playbook debugging)")
     parser.add_argument('-s', '--start-at-task', type=str, default="",
                         help="start the Ansible playbook processing at a given task (useful for playbook debugging)")
+    parser.add_argument('--cache-host-facts', action="store_true",
+                        help="persist the gathered host facts within the artifacts directory (faster startup)")
+    parser.add_argument('--profile', action="store_true",
+                        help="write a timing report (json and Chrome trace event file) into the artifacts directory")
 
     subparsers = parser.add_subparsers(title='commands',
                                        dest="command_name")
 
-    for _, command in get_sub_commands().items():
-        command.advertise(subparsers)
-    argcomplete.autocomplete(parser)
+    requested_words = _get_requested_words(argv)
+    for command_name in get_sub_command_names():
+        short_name = get_short_command_name(command_name)
+        if requested_words is None or short_name in requested_words:
+            get_command(command_name).advertise(subparsers)
+        else:
+            subparsers.add_parser(short_name, help=get_command_help(command_name))
+
+    if '_ARGCOMPLETE' in os.environ:
+        import argcomplete
+        argcomplete.autocomplete(parser)
     return parser
 
 
+def _get_output_tail(subprocess_error, line_count=20):
+    if not isinstance(subprocess_error.output, str) or not subprocess_error.output.strip():
+        return ''
+
+    tail = subprocess_error.output.rstrip('\n').splitlines()[-line_count:]
+    return "Last lines of output:\n{}\n".format('\n'.join(tail))
+
+
+def _get_network_error_message(error):
+    # requests is a heavy import: if it did not get loaded it can not be the source of the error
+    requests = sys.modules.get('requests')
+    if requests is None:
+        return None
+    elif isinstance(error, requests.exceptions.SSLError):
+        return "{}\nPlease verify your ssl/proxy setup.".format(error)
+    elif isinstance(error, requests.exceptions.ConnectionError):
+        return "{}\nPlease verify your internet connectivity and the requested url.".format(error)
+    else:
+        return None
+
+
 def main():
     try:
-        cli_interface = _setup_command_line_interface()
+        cli_interface = _setup_command_line_interface(sys.argv[1:])
         cli_args = cli_interface.parse_args(sys.argv[1:])
         _setup_logging(cli_args)
 
         if cli_args.command_name is None:
             raise FatalError("Missing command. Use 'edi --help' for help.")
 
-        command_name = "{0}.{1}".format(EdiCommand._get_command_name(),
-                                        cli_args.command_name)
-        with command_context({'edi_debug_mode': cli_args.debug,
-                              'edi_start_at_task': cli_args.start_at_task}):
-            get_command(command_name)().run_cli(cli_args)
+        command_name = get_full_command_name(cli_args.command_name)
+        if cli_args.profile:
+            Profiler.enable()
+
+        try:
+            with command_context({'edi_debug_mode': cli_args.debug,
+                                  'edi_start_at_task': cli_args.start_at_task,
+                                  'edi_cache_host_facts': cli_args.cache_host_facts}):
+                with profiled_stage(' '.join(['edi'] + sys.argv[1:]), 'edi'):
+                    get_command(command_name)().run_cli(cli_args)
+        finally:
+            if cli_args.profile:
+                _write_profile()
     except FatalError as fatal_error:
         print_error_and_exit(fatal_error.message)
     except KeyboardInterrupt:
         print_error_and_exit("Command interrupted by user.")
     except CalledProcessError as subprocess_error:
-        print_error_and_exit("{}\nFor more information increase the log level.".format(subprocess_error))
-    except requests.exceptions.SSLError as ssl_error:
-        print_error_and_exit("{}\nPlease verify your ssl/proxy setup.".format(ssl_error))
-    except requests.exceptions.ConnectionError as connection_error:
-        print_error_and_exit(("{}\nPlease verify your internet connectivity and the requested url."
-                              ).format(connection_error))
+        print_error_and_exit("{}\n{}For more information increase the log level.".format(
+            subprocess_error, _get_output_tail(subprocess_error)))
+    except Exception as error:
+        network_error_message = _get_network_error_message(error)
+        if network_error_message is None:
+            raise
+        print_error_and_exit(network_error_message)
@@ -19,13 +19,6 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
-from edi.commands.imagecommands import bootstrap, create, imageclean  # noqa: ignore=F401
-from edi.commands.lxccommands import (export, importcmd, launch, lxcclean, lxcconfigure,  # noqa: ignore=F401
-                                      lxcprepare, profile, publish, stop)  # noqa: ignore=F401
-from edi.commands.configcommands import configclean, configinit  # noqa: ignore=F401
-from edi.commands.targetcommands import targetconfigure  # noqa: ignore=F401
-from edi.commands.documentationcommands import render  # noqa: ignore=F401
-from edi.commands.projectcommands import prepare, configure, make, clean  # noqa: ignore=F401
-
+# The command modules get imported on demand (see edi.lib.commandfactory).
 
 __all__ = ["config", "image", "lxc", "version", "clean", "target", "documentation", "project"]
@@ -22,7 +22,6 @@
 import os
 from edi.lib.helpers import FatalError, copy_tree, print_success
 from edi.lib.versionhelpers import get_edi_version, get_stripped_version
-from jinja2 import Template
 import yaml
 from edi.commands.config import Config
 from edi.lib.configurationparser import get_base_dictionary
@@ -60,6 +59,7 @@ class Init(Config):
         source = get_project_tree()
         copy_tree(source, workdir)
         template = ConfigurationTemplate(workdir)
+        from jinja2 import Template
         with open(get_template(config_template), encoding="UTF-8", mode="r") as template_file:
             t = Template(template_file.read())
             template_dict = yaml.safe_load(t.render(get_base_dictionary())).get('parameters', {})
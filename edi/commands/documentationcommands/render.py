@@ -26,6 +26,8 @@ from edi.commands.documentation import Documentation
 from edi.lib.helpers import print_success
 from edi.lib.shellhelpers import is_running_in_user_namespace
 from edi.lib.documentationsteprunner import DocumentationStepRunner
+from edi.lib.documentationinput import documentation_input, parse_raw_input
+from edi.lib.artifact import ArtifactType
 
 
 def readable_directory(directory):
@@ -36,6 +38,19 @@ def readable_directory(directory):
     return directory
 
 
+def readable_raw_input(raw_input):
+    artifact_type, location = parse_raw_input(raw_input)
+    if artifact_type != ArtifactType.PATH:
+        return raw_input
+    if os.path.isdir(location):
+        return readable_directory(location)
+    if not os.path.isfile(location):
+        raise argparse.ArgumentTypeError("directory or archive '{}' does not exist".format(location))
+    if not os.access(location, os.R_OK):
+        raise argparse.ArgumentTypeError("archive '{}' is not readable".format(location))
+    return location
+
+
 def valid_output_directory(directory):
     if not os.path.isdir(directory):
         raise argparse.ArgumentTypeError("output directory '{}' does not exist".format(directory))
@@ -62,8 +77,9 @@ class Render(Documentation):
         exclusive_group = cls._offer_options(parser, introspection=True, clean=False)
         exclusive_group.add_argument('--clean', action="store_true",
                                      help='clean the artifacts that got produced by this command')
-        parser.add_argument('raw_input', type=readable_directory,
-                            help="directory containing the input files")
+        parser.add_argument('raw_input', type=readable_raw_input,
+                            help=("directory containing the input files, root file system archive, "
+                                  "buildah-container:NAME or podman-image:NAME"))
         parser.add_argument('rendered_output', type=valid_output_directory,
                             help="directory receiving the output files")
         cls._require_config_file(parser)
@@ -79,7 +95,8 @@ class Render(Documentation):
         return self._dispatch(raw_input, rendered_output, config_file, run_method=self._dry_run)
 
     def _dry_run(self):
-        plugins = DocumentationStepRunner(self.config, self.raw_input, self._result()).get_plugin_report()
+        with documentation_input(self.raw_input) as raw_input:
+            plugins = DocumentationStepRunner(self.config, raw_input, self._result()).get_plugin_report()
         return plugins
 
     def run(self, raw_input, rendered_output, config_file):
@@ -88,9 +105,9 @@ class Render(Documentation):
     def _run(self):
         print("Going to render project documentation to '{}'.".format(self._result()))
 
-        documentation_step_runner = DocumentationStepRunner(self.config, self.raw_input, self._result())
-        documentation_step_runner.check_for_absence_of_output_files()
-        documentation_step_runner.run_all()
+        DocumentationStepRunner(self.config, self.raw_input, self._result()).check_for_absence_of_output_files()
+        with documentation_input(self.raw_input) as raw_input:
+            DocumentationStepRunner(self.config, raw_input, self._result()).run_all()
         print_success("Rendered project documentation to '{}'.".format(self._result()))
         return self._result()
 
@@ -103,7 +120,8 @@ class Render(Documentation):
 
     def _dispatch(self, raw_input, rendered_output, config_file, run_method):
         self._setup_parser(config_file)
-        self.raw_input = os.path.abspath(raw_input)
+        artifact_type, _ = parse_raw_input(raw_input)
+        self.raw_input = os.path.abspath(raw_input) if artifact_type == ArtifactType.PATH else raw_input
         self.rendered_output = os.path.abspath(rendered_output)
 
         if os.getuid() == 0 and not is_running_in_user_namespace():
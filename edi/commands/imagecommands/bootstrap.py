@@ -20,18 +20,23 @@
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import hashlib
 import subprocess
 import shutil
 import logging
 from codecs import open
-from aptsources.sourceslist import SourceEntry
 from edi.commands.image import Image
 from edi.lib.helpers import (FatalError, chown_to_user, print_success,
                              get_workdir, get_artifact_dir, create_artifact_dir)
 from edi.lib.configurationparser import command_context
-from edi.lib.shellhelpers import run, get_chroot_cmd, require, mount_aware_tempdir, get_debian_architecture
+from edi.lib.shellhelpers import (run, get_chroot_cmd, require, mount_aware_tempdir, get_debian_architecture,
+                                  step_log)
 from edi.lib.proxyhelpers import ProxySetup
 from edi.lib.keyhelpers import fetch_repository_key, build_keyring
+from edi.lib.artifact import ArtifactType, Artifact
+from edi.lib.archivehelpers import get_archive_extension
+from edi.lib.artifactcache import ArtifactCache, get_fingerprint
+from edi.lib.bootstrapcache import BootstrapCache
 
 
 class Bootstrap(Image):
@@ -60,37 +65,63 @@ class Bootstrap(Image):
         return self._dispatch(config_file, run_method=self._run)
 
     def _run(self):
-        if os.path.isfile(self._result()):
-            logging.info(("{0} is already there. "
-                          "Delete it to regenerate it."
+        fingerprint = self._fingerprint()
+        if ArtifactCache().restore(fingerprint, self._get_artifacts()):
+            logging.info(("{0} is already there and up to date. "
+                          "Clean it to regenerate it."
                           ).format(self._result()))
             return self._result()
 
+        if self.config.get_bootstrap_tool() != "debootstrap":
+            raise FatalError(("At the moment only debootstrap "
+                              "is supported for bootstrapping!"))
+
+        key_data = fetch_repository_key(self.config.get_bootstrap_repository_key())
+        bootstrap_cache = BootstrapCache(self.config.get_bootstrap_cache_size() * 1024 * 1024)
+        cache_key = self._get_bootstrap_cache_key(key_data)
+
+        create_artifact_dir()
+        with bootstrap_cache.locked(cache_key):
+            if not bootstrap_cache.retrieve(cache_key, self._result()):
+                self._bootstrap(key_data)
+                bootstrap_cache.add(cache_key, self._result())
+
+        ArtifactCache(max_versions=self.config.get_artifact_cache_versions()).store(fingerprint, self._get_artifacts())
+
+        print_success("Bootstrapped initial image {}.".format(self._result()))
+        return self._result()
+
+    def _bootstrap(self, key_data):
         self._require_sudo()
 
         needs_qemu = self._needs_qemu()
 
         print("Going to bootstrap initial image - be patient.")
 
-        if self.config.get_bootstrap_tool() != "debootstrap":
-            raise FatalError(("At the moment only debootstrap "
-                              "is supported for bootstrapping!"))
-
         workdir = get_workdir()
 
-        with mount_aware_tempdir(workdir, log_warning=True) as tempdir:
+        with mount_aware_tempdir(workdir, log_warning=True) as tempdir, \
+                step_log(self._get_command_file_name_prefix()):
             chown_to_user(tempdir)
-            key_data = fetch_repository_key(self.config.get_bootstrap_repository_key())
             keyring_file = build_keyring(tempdir, "temp_keyring.gpg", key_data)
             rootfs = self._run_debootstrap(tempdir, keyring_file, needs_qemu)
             self._postprocess_rootfs(rootfs, key_data)
             archive = self._pack_image(tempdir, rootfs)
             chown_to_user(archive)
-            create_artifact_dir()
             shutil.move(archive, self._result())
 
-        print_success("Bootstrapped initial image {}.".format(self._result()))
-        return self._result()
+    def _get_bootstrap_cache_key(self, key_data):
+        # normalized bootstrap configuration: equivalent setups of different projects share the image
+        # (the content of the repository key matters since a key might get rotated behind the same url)
+        return get_fingerprint({
+            'format': 3,
+            'tool': self.config.get_bootstrap_tool(),
+            'repository': ' '.join(self.config.get_bootstrap_repository().split()),
+            'architecture': self.config.get_bootstrap_architecture(),
+            'additional_packages': ','.join(sorted(set(self.config.get_bootstrap_additional_packages()))),
+            'repository_key': hashlib.sha256(key_data.encode()).hexdigest() if key_data else '',
+            'compression': self.config.get_compression(),
+        })
 
     def clean_recursive(self, config_file, depth):
         self.clean_depth = depth
@@ -108,20 +139,36 @@ class Bootstrap(Image):
             os.remove(self._result())
             print_success("Removed bootstrap image {}.".format(self._result()))
 
+        ArtifactCache().forget(self._get_artifacts())
+
     def _dispatch(self, config_file, run_method):
         self._setup_parser(config_file)
         return run_method()
 
+    def fingerprint(self, config_file):
+        return self._dispatch(config_file, run_method=self._fingerprint)
+
+    def _fingerprint(self):
+        return get_fingerprint(self._get_command_name(),
+                               self.config.get_config().get('bootstrap', {}),
+                               self.config.get_bootstrap_architecture(),
+                               self.config.get_bootstrap_additional_packages(),
+                               self.config.get_compression())
+
+    def _get_artifacts(self):
+        return [Artifact(name='edi_bootstrap_image', location=self._result(), type=ArtifactType.PATH)]
+
     def _result(self):
-        archive_name = ("{0}_{1}{2}.tar.{3}"
+        archive_name = ("{0}_{1}{2}.{3}"
                         ).format(self.config.get_configuration_name(),
                                  self._get_command_file_name_prefix(),
                                  self.config.get_context_suffix(),
-                                 self.config.get_compression())
+                                 get_archive_extension(self.config.get_compression()))
         return os.path.join(get_artifact_dir(), archive_name)
 
     @require("debootstrap", "'sudo apt install debootstrap'")
     def _run_debootstrap(self, tempdir, keyring_file, needs_qemu):
+        from aptsources.sourceslist import SourceEntry
         additional_packages = ','.join(self.config.get_bootstrap_additional_packages())
         rootfs = os.path.join(tempdir, "rootfs")
         bootstrap_source = SourceEntry(self.config.get_bootstrap_repository())
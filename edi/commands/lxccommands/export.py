@@ -27,6 +27,8 @@ from edi.lib.lxchelpers import (export_image, get_file_extension_from_image_comp
                                 get_server_image_compression_algorithm)
 from edi.commands.lxccommands.publish import Publish
 from edi.lib.helpers import print_success, get_artifact_dir, create_artifact_dir
+from edi.lib.artifact import ArtifactType, Artifact
+from edi.lib.artifactcache import ArtifactCache, get_fingerprint
 
 
 class Export(Lxc):
@@ -54,12 +56,12 @@ class Export(Lxc):
         return self._dispatch(config_file, run_method=self._run)
 
     def _run(self):
-        if os.path.isfile(self._result()):
-            logging.info(("{0} is already there. "
-                          "Delete it to regenerate it."
+        fingerprint = self._fingerprint()
+        if ArtifactCache().restore(fingerprint, self._get_artifacts()):
+            logging.info(("{0} is already there and up to date. "
+                          "Clean it to regenerate it."
                           ).format(self._result()))
             return self._result()
-
         image_name = Publish().run(self.config.get_base_config_file())
 
         print("Going to export lxc image from image store.")
@@ -73,6 +75,8 @@ class Export(Lxc):
             logging.info("Fixing file extension of exported image.")
             os.rename(self._image_without_extension(), self._result())
 
+        ArtifactCache(max_versions=self.config.get_artifact_cache_versions()).store(fingerprint, self._get_artifacts())
+
         print_success("Exported lxc image as {}.".format(self._result()))
         return self._result()
 
@@ -89,6 +93,8 @@ class Export(Lxc):
             os.remove(self._result())
             print_success("Removed lxc image {}.".format(self._result()))
 
+        ArtifactCache().forget(self._get_artifacts())
+
         if self.clean_depth > 0:
             Publish().clean_recursive(self.config.get_base_config_file(), self.clean_depth - 1)
 
@@ -97,6 +103,12 @@ class Export(Lxc):
             self._setup_parser(config_file)
             return run_method()
 
+    def _fingerprint(self):
+        return get_fingerprint(self._get_command_name(), Publish().fingerprint(self.config.get_base_config_file()))
+
+    def _get_artifacts(self):
+        return [Artifact(name='edi_lxc_export', location=self._result(), type=ArtifactType.PATH)]
+
     def _result_base_name(self):
         return "{0}_{1}".format(self.config.get_configuration_name(),
                                 self._get_command_file_name_prefix())
@@ -24,8 +24,10 @@ import logging
 from edi.commands.lxc import Lxc
 from edi.commands.lxccommands.lxcprepare import Prepare
 from edi.lib.helpers import print_success
-from edi.lib.lxchelpers import is_in_image_store, import_image, delete_image
+from edi.lib.lxchelpers import is_in_image_store, import_image, delete_image, lxd_state_snapshot
 from edi.lib.configurationparser import command_context
+from edi.lib.artifact import ArtifactType, Artifact
+from edi.lib.artifactcache import ArtifactCache, get_fingerprint
 
 
 class Import(Lxc):
@@ -53,17 +55,26 @@ class Import(Lxc):
         return self._dispatch(config_file, run_method=self._run)
 
     def _run(self):
+        fingerprint = self._fingerprint()
         if is_in_image_store(self._result()):
-            logging.info(("{0} is already in image store. "
-                          "Delete it to regenerate it."
+            if ArtifactCache().restore(fingerprint, self._get_artifacts()):
+                logging.info(("{0} is already in image store. "
+                              "Delete it to regenerate it."
+                              ).format(self._result()))
+                return self._result()
+
+            logging.info(("{0} stems from an outdated lxc image. "
+                          "Removing it from the image store."
                           ).format(self._result()))
-            return self._result()
+            delete_image(self._result())
 
         image = Prepare().run(self.config.get_base_config_file())
+        rootfs = Prepare().rootfs(self.config.get_base_config_file())
 
         print("Going to import lxc image into image store.")
 
-        import_image(image, self._result())
+        import_image(image, self._result(), rootfs=rootfs)
+        ArtifactCache().store(fingerprint, self._get_artifacts())
 
         print_success("Imported lxc image into image store as {}.".format(self._result()))
 
@@ -86,12 +97,24 @@ class Import(Lxc):
             delete_image(self._result())
             print_success("Removed {} from image store.".format(self._result()))
 
+        ArtifactCache().forget(self._get_artifacts())
+
         if self.clean_depth > 0:
             Prepare().clean_recursive(self.config.get_base_config_file(), self.clean_depth - 1)
 
     def _dispatch(self, config_file, run_method):
-        self._setup_parser(config_file)
-        return run_method()
+        with lxd_state_snapshot():
+            self._setup_parser(config_file)
+            return run_method()
+
+    def fingerprint(self, config_file):
+        return self._dispatch(config_file, run_method=self._fingerprint)
+
+    def _fingerprint(self):
+        return get_fingerprint(self._get_command_name(), Prepare().fingerprint(self.config.get_base_config_file()))
+
+    def _get_artifacts(self):
+        return [Artifact(name='edi_lxc_import', location=self._result(), type=ArtifactType.LXC_IMAGE)]
 
     def _result(self):
         return "{}_{}{}_{}".format(self.config.get_configuration_name(),
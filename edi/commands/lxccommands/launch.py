@@ -25,9 +25,12 @@ from edi.commands.lxccommands.importcmd import Import
 from edi.commands.lxccommands.profile import Profile
 from edi.lib.helpers import FatalError, print_success
 from edi.lib.networkhelpers import is_valid_hostname
+from edi.lib.artifact import ArtifactType, Artifact
+from edi.lib.artifactcache import ArtifactCache
 from edi.lib.lxchelpers import (is_container_existing, is_container_running, start_container,
                                 launch_container, get_container_profiles, stop_container,
-                                apply_profiles, try_delete_container, is_bridge_available, create_bridge)
+                                apply_profiles, try_delete_container, is_bridge_available, create_bridge,
+                                lxd_state_snapshot)
 
 
 class Launch(Lxc):
@@ -78,6 +81,17 @@ class Launch(Lxc):
                               "is not a valid host name."
                               ).format(self.container_name))
 
+        image_fingerprint = None
+        if self.config.create_distributable_image():
+            # a distributable container must stem from the current image
+            image_fingerprint = Import().fingerprint(self.config.get_base_config_file())
+            if (is_container_existing(self._result()) and
+                    not ArtifactCache().restore(image_fingerprint, self._get_artifacts())):
+                logging.info(("Container {0} stems from an outdated image. "
+                              "Deleting it."
+                              ).format(self._result()))
+                try_delete_container(self._result(), self.config.get_lxc_stop_timeout())
+
         if is_container_existing(self._result()):
             logging.info(("Container {0} is already existing. "
                           "Destroy it to regenerate it or reconfigure it."
@@ -108,6 +122,8 @@ class Launch(Lxc):
             self._setup_bridge()
             print("Going to launch container.")
             launch_container(image, self._result(), profiles)
+            if image_fingerprint:
+                ArtifactCache().store(image_fingerprint, self._get_artifacts())
             print_success("Launched container {}.".format(self._result()))
 
         return self._result()
@@ -121,14 +137,16 @@ class Launch(Lxc):
             # Do not delete containers that were generated using "edi lxc configure ..."!
             if try_delete_container(self._result(), self.config.get_lxc_stop_timeout()):
                 print_success("Deleted lxc container {}.".format(self._result()))
+            ArtifactCache().forget(self._get_artifacts())
 
         if self.clean_depth > 0:
             Import().clean_recursive(self.config.get_base_config_file(), self.clean_depth - 1)
 
     def _dispatch(self, container_name, config_file, run_method):
-        self._setup_parser(config_file)
-        self.container_name = container_name
-        return run_method()
+        with lxd_state_snapshot():
+            self._setup_parser(config_file)
+            self.container_name = container_name
+            return run_method()
 
     @staticmethod
     def verify_profiles(desired_profiles, current_profiles):
@@ -137,5 +155,8 @@ class Launch(Lxc):
                 return False
         return True
 
+    def _get_artifacts(self):
+        return [Artifact(name='edi_lxc_container', location=self._result(), type=ArtifactType.LXC_CONTAINER)]
+
     def _result(self):
         return self.container_name
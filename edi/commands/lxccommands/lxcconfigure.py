@@ -19,16 +19,22 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
+import logging
 from edi.commands.lxc import Lxc
 from edi.commands.lxccommands.profile import Profile
 from edi.commands.lxccommands.launch import Launch
 from edi.lib.playbookrunner import PlaybookRunner
 from edi.lib.helpers import print_success
 from edi.lib.sharedfoldercoordinator import SharedFolderCoordinator
-from edi.lib.lxchelpers import apply_profiles
+from edi.lib.lxchelpers import (apply_profiles, lxd_state_snapshot, get_container_snapshots, create_container_snapshot,
+                                restore_container_snapshot, delete_container_snapshot, get_container_config_item,
+                                set_container_config_item)
+from edi.lib.artifactcache import get_fingerprint
 
 
 class Configure(Lxc):
+    _snapshot_prefix = 'edi-playbooks-'
+    _playbooks_config_key = 'user.edi-playbooks'
 
     def __init__(self):
         super().__init__()
@@ -73,7 +79,11 @@ class Configure(Lxc):
         print("Going to configure container {} - be patient.".format(self._result()))
 
         playbook_runner = PlaybookRunner(self.config, self._result(), self.ansible_connection)
-        playbook_runner.run_all()
+        max_snapshots = self.config.get_lxc_max_snapshots()
+        if max_snapshots:
+            self._run_playbooks_with_snapshots(playbook_runner, max_snapshots)
+        else:
+            playbook_runner.run_all()
 
         sfc = SharedFolderCoordinator(self.config)
         sfc.create_host_folders()
@@ -87,6 +97,68 @@ class Configure(Lxc):
         print_success("Configured container {}.".format(self._result()))
         return self._result()
 
+    def _run_playbooks_with_snapshots(self, playbook_runner, max_snapshots):
+        """
+        Take a snapshot of the container after each playbook. The snapshots get labelled with the chained
+        fingerprint of the playbooks. If a previous run did not complete or if the playbooks changed, the
+        container gets restored from the newest snapshot that is still valid and only the remaining playbooks
+        get applied. The edi snapshots that are newer than the restored one get deleted beforehand. A container
+        that got completely configured with the current playbooks is left untouched.
+        """
+        base_fingerprint = get_fingerprint(self._get_command_name(), self._result())
+        fingerprints = [base_fingerprint] + playbook_runner.get_fingerprints(base_fingerprint)
+        snapshots = ['{}{}'.format(Configure._snapshot_prefix, fingerprint[:32]) for fingerprint in fingerprints[1:]]
+
+        existing_snapshots = get_container_snapshots(self._result())
+        applied = next((index + 1 for index in reversed(range(len(snapshots)))
+                        if snapshots[index] in existing_snapshots), 0)
+
+        if applied == len(snapshots) and (get_container_config_item(self._result(), Configure._playbooks_config_key)
+                                          == fingerprints[-1]):
+            logging.info("Container {} is already configured with the current playbooks.".format(self._result()))
+            self._prune_snapshots(snapshots, max_snapshots)
+            return
+
+        # an interrupted run must not leave a valid marker behind
+        set_container_config_item(self._result(), Configure._playbooks_config_key, '')
+
+        if applied:
+            # some storage backends (e.g. zfs) can only restore the most recent snapshot
+            newer_snapshots = existing_snapshots[existing_snapshots.index(snapshots[applied - 1]) + 1:]
+            for snapshot in newer_snapshots:
+                if snapshot.startswith(Configure._snapshot_prefix):
+                    logging.info("Deleting snapshot {} of container {}.".format(snapshot, self._result()))
+                    delete_container_snapshot(self._result(), snapshot)
+
+            print("Restoring container {} from snapshot {}.".format(self._result(), snapshots[applied - 1]))
+            restore_container_snapshot(self._result(), snapshots[applied - 1])
+            # the restore also reverts the profiles of the container: make sure that the current ones get applied
+            Launch().run(self.container_name, self.config.get_base_config_file())
+
+        if applied < len(snapshots):
+            def take_snapshot(index, _):
+                create_container_snapshot(self._result(), snapshots[index])
+
+            playbook_runner.run_all(skip=applied, playbook_done=take_snapshot)
+        else:
+            logging.info("All playbooks of container {} got restored from a snapshot.".format(self._result()))
+
+        # mark the container as completely configured
+        set_container_config_item(self._result(), Configure._playbooks_config_key, fingerprints[-1])
+        self._prune_snapshots(snapshots, max_snapshots)
+
+    def _prune_snapshots(self, snapshots, max_snapshots):
+        """
+        Delete the outdated snapshots and the oldest snapshots that exceed the maximal number of snapshots.
+        """
+        edi_snapshots = [snapshot for snapshot in get_container_snapshots(self._result())
+                         if snapshot.startswith(Configure._snapshot_prefix)]
+        outdated_snapshots = [snapshot for snapshot in edi_snapshots if snapshot not in snapshots]
+        valid_snapshots = [snapshot for snapshot in edi_snapshots if snapshot in snapshots]
+        for snapshot in outdated_snapshots + valid_snapshots[:max(0, len(valid_snapshots) - max_snapshots)]:
+            logging.info("Deleting snapshot {} of container {}.".format(snapshot, self._result()))
+            delete_container_snapshot(self._result(), snapshot)
+
     def clean_recursive(self, container_name, config_file, depth):
         self.clean_depth = depth
         self._dispatch(container_name, config_file, run_method=self._clean)
@@ -96,9 +168,10 @@ class Configure(Lxc):
             Launch().clean_recursive(self.container_name, self.config.get_base_config_file(), self.clean_depth - 1)
 
     def _dispatch(self, container_name, config_file, run_method):
-        self._setup_parser(config_file)
-        self.container_name = container_name
-        return run_method()
+        with lxd_state_snapshot():
+            self._setup_parser(config_file)
+            self.container_name = container_name
+            return run_method()
 
     def _result(self):
         return self.container_name
@@ -27,14 +27,18 @@ import calendar
 import yaml
 import shutil
 import glob
-from jinja2 import Template
 from codecs import open
 from edi.commands.lxc import Lxc
 from edi.commands.imagecommands.bootstrap import Bootstrap
 from edi.lib.yamlhelpers import LiteralString, normalize_yaml
+from edi.lib.templateengine import TemplateEngine
 from edi.lib.helpers import chown_to_user, print_success, get_workdir, get_artifact_dir, create_artifact_dir
 from edi.lib.shellhelpers import get_debian_architecture
 from edi.lib.configurationparser import remove_passwords, command_context
+from edi.lib.artifact import ArtifactType, Artifact
+from edi.lib.archivehelpers import get_archive_extension
+from edi.lib.artifactcache import ArtifactCache, get_fingerprint, get_file_digest
+from edi.lib.cachehelpers import link_file
 
 
 class Prepare(Lxc):
@@ -69,13 +73,16 @@ class Prepare(Lxc):
         return self._dispatch(config_file, run_method=self._run)
 
     def _run(self):
-        if os.path.isfile(self._result()):
-            logging.info(("{0} is already there. "
-                          "Delete it to regenerate it."
+        fingerprint = self._fingerprint()
+        if ArtifactCache().restore(fingerprint, self._get_artifacts()):
+            logging.info(("{0} is already there and up to date. "
+                          "Clean it to regenerate it."
                           ).format(self._result()))
             return self._result()
 
-        self._require_sudo()
+        split_image = self.config.get_lxc_split_image()
+        if not split_image:
+            self._require_sudo()
 
         bootstrap_cmd = Bootstrap()
 
@@ -89,16 +96,40 @@ class Prepare(Lxc):
         with tempfile.TemporaryDirectory(dir=workdir) as tempdir:
             chown_to_user(tempdir)
             lxcimagedir = os.path.join(tempdir, "lxcimage")
-            self._unpack_image(bootstrap_result, lxcimagedir)
-            self._write_container_metadata(lxcimagedir)
-            archive = self._pack_image(tempdir, lxcimagedir)
+            if split_image:
+                # the bootstrap archive is used as is for the rootfs of the split image
+                os.mkdir(lxcimagedir)
+                self._write_container_metadata(lxcimagedir)
+                archive = self._pack_image(tempdir, lxcimagedir, sudo=False)
+            else:
+                self._unpack_image(bootstrap_result, lxcimagedir)
+                self._write_container_metadata(lxcimagedir)
+                archive = self._pack_image(tempdir, lxcimagedir)
             chown_to_user(archive)
             create_artifact_dir()
             shutil.move(archive, self._result())
+            if split_image:
+                link_file(bootstrap_result, self._rootfs_result())
+                chown_to_user(self._rootfs_result())
+            ArtifactCache(max_versions=self.config.get_artifact_cache_versions()).store(fingerprint,
+                                                                                        self._get_artifacts())
 
         print_success("Created lxc image {}.".format(self._result()))
         return self._result()
 
+    def rootfs(self, config_file):
+        """
+        Get the rootfs tarball of a split image.
+        :return: The path of the rootfs tarball or None if the image is a unified image.
+        """
+        return self._dispatch(config_file, run_method=self._get_rootfs)
+
+    def _get_rootfs(self):
+        if self.config.get_lxc_split_image():
+            return self._rootfs_result()
+        else:
+            return None
+
     def clean_recursive(self, config_file, depth):
         self.clean_depth = depth
         self._dispatch(config_file, run_method=self._clean)
@@ -110,10 +141,13 @@ class Prepare(Lxc):
             self._dispatch(config_file, run_method=self._clean)
 
     def _clean(self):
-        if os.path.isfile(self._result()):
-            logging.info("Removing '{}'.".format(self._result()))
-            os.remove(self._result())
-            print_success("Removed lxc image {}.".format(self._result()))
+        for result in [self._result(), self._rootfs_result()]:
+            if os.path.isfile(result):
+                logging.info("Removing '{}'.".format(result))
+                os.remove(result)
+                print_success("Removed lxc image {}.".format(result))
+
+        ArtifactCache().forget(self._get_artifacts())
 
         if self.clean_depth > 0:
             Bootstrap().clean_recursive(self.config.get_base_config_file(), self.clean_depth - 1)
@@ -122,12 +156,45 @@ class Prepare(Lxc):
         self._setup_parser(config_file)
         return run_method()
 
+    def fingerprint(self, config_file):
+        return self._dispatch(config_file, run_method=self._fingerprint)
+
+    def _fingerprint(self):
+        templates = self._get_templates()
+        template_files = dict()
+        for _, _, path, _ in templates:
+            for tpl_file in glob.iglob(os.path.join(os.path.dirname(path), "*.tpl")):
+                if os.path.isfile(tpl_file):
+                    template_files[tpl_file] = get_file_digest(tpl_file)
+
+        return get_fingerprint(self._get_command_name(),
+                               Bootstrap().fingerprint(self.config.get_base_config_file()),
+                               [template for template, _, _, _ in templates],
+                               template_files,
+                               get_debian_architecture(),
+                               self.config.get_compression(),
+                               self.config.get_lxc_split_image())
+
+    def _get_artifacts(self):
+        artifacts = [Artifact(name='edi_lxc_image', location=self._result(), type=ArtifactType.PATH)]
+        if self.config.get_lxc_split_image():
+            artifacts.append(Artifact(name='edi_lxc_rootfs', location=self._rootfs_result(), type=ArtifactType.PATH))
+        return artifacts
+
     def _result(self):
-        archive_name = ("{0}_{1}{2}.tar.{3}"
+        archive_name = ("{0}_{1}{2}.{3}"
+                        ).format(self.config.get_configuration_name(),
+                                 self._get_command_file_name_prefix(),
+                                 self.config.get_context_suffix(),
+                                 get_archive_extension(self.config.get_compression()))
+        return os.path.join(get_artifact_dir(), archive_name)
+
+    def _rootfs_result(self):
+        archive_name = ("{0}_{1}{2}_rootfs.{3}"
                         ).format(self.config.get_configuration_name(),
                                  self._get_command_file_name_prefix(),
                                  self.config.get_context_suffix(),
-                                 self.config.get_compression())
+                                 get_archive_extension(self.config.get_compression()))
         return os.path.join(get_artifact_dir(), archive_name)
 
     def _write_container_metadata(self, imagedir):
@@ -173,10 +240,8 @@ class Prepare(Lxc):
         collected_templates = []
         template_list = self.config.get_ordered_path_items(self.config_section)
         for name, path, dictionary, _ in template_list:
-            with open(path, encoding="UTF-8", mode="r") as template_file:
-                t = Template(template_file.read())
-                template_text = normalize_yaml(t.render(dictionary))
-                collected_templates.append((template_text, name, path, dictionary))
+            template_text = normalize_yaml(TemplateEngine().render_file(path, dictionary))
+            collected_templates.append((template_text, name, path, dictionary))
 
         return collected_templates
 
@@ -22,13 +22,13 @@
 
 import logging
 import yaml
-from jinja2 import Template
 from edi.commands.lxc import Lxc
 from edi.lib.helpers import print_success
 from edi.lib.sharedfoldercoordinator import SharedFolderCoordinator
 from edi.lib.configurationparser import remove_passwords
-from edi.lib.lxchelpers import write_lxc_profile
+from edi.lib.lxchelpers import write_lxc_profile, lxd_state_snapshot
 from edi.lib.yamlhelpers import LiteralString
+from edi.lib.templateengine import TemplateEngine
 
 
 class Profile(Lxc):
@@ -85,18 +85,17 @@ class Profile(Lxc):
         return profile_name_list
 
     def _dispatch(self, config_file, include_post_config_profiles, run_method):
-        self._setup_parser(config_file)
-        self.include_post_config_profiles = include_post_config_profiles
-        return run_method()
+        with lxd_state_snapshot():
+            self._setup_parser(config_file)
+            self.include_post_config_profiles = include_post_config_profiles
+            return run_method()
 
     def _get_profiles(self, include_post_config_profiles):
         collected_profiles = []
         profile_list = self.config.get_ordered_path_items(self.config_section)
         for name, path, dictionary, _ in profile_list:
-            with open(path, encoding="UTF-8", mode="r") as profile_file:
-                profile = Template(profile_file.read())
-                profile_text = profile.render(dictionary)
-                collected_profiles.append((profile_text, name, path, dictionary))
+            profile_text = TemplateEngine().render_file(path, dictionary)
+            collected_profiles.append((profile_text, name, path, dictionary))
 
         sfc = SharedFolderCoordinator(self.config)
         if include_post_config_profiles:
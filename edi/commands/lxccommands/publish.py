@@ -23,8 +23,11 @@ import logging
 from edi.commands.lxc import Lxc
 from edi.lib.helpers import print_success
 from edi.commands.lxccommands.stop import Stop
+from edi.commands.lxccommands.lxcprepare import Prepare
 from edi.lib.configurationparser import command_context
-from edi.lib.lxchelpers import is_in_image_store, publish_container, delete_image
+from edi.lib.lxchelpers import is_in_image_store, publish_container, delete_image, lxd_state_snapshot
+from edi.lib.artifactcache import ArtifactCache, get_fingerprint
+from edi.lib.artifact import Artifact, ArtifactType
 
 
 class Publish(Lxc):
@@ -52,16 +55,25 @@ class Publish(Lxc):
         return self._dispatch(config_file, self._run)
 
     def _run(self):
+        fingerprint = self._fingerprint()
         if is_in_image_store(self._result()):
-            logging.info(("{0} is already in image store. "
-                          "Delete it to regenerate it."
+            if ArtifactCache().restore(fingerprint, self._get_artifacts()):
+                logging.info(("{0} is already in image store. "
+                              "Delete it to regenerate it."
+                              ).format(self._result()))
+                return self._result()
+
+            # only the image is outdated: the container gets re-configured by the configure command
+            logging.info(("{0} stems from an outdated configuration. "
+                          "Removing it from the image store."
                           ).format(self._result()))
-            return self._result()
+            delete_image(self._result())
 
         container_name = Stop().run(self.config.get_base_config_file())
 
         print("Going to publish lxc container in image store.")
         publish_container(container_name, self._result())
+        ArtifactCache().store(fingerprint, self._get_artifacts())
         print_success("Published lxc container in image store as {}.".format(self._result()))
         return self._result()
 
@@ -79,14 +91,28 @@ class Publish(Lxc):
             delete_image(self._result())
             print_success("Removed {} from image store.".format(self._result()))
 
+        ArtifactCache().forget(self._get_artifacts())
+
         if self.clean_depth > 0:
             Stop().clean_recursive(self.config.get_base_config_file(), self.clean_depth - 1)
 
     def _dispatch(self, config_file, run_method):
-        with command_context({'edi_create_distributable_image': True}):
+        with command_context({'edi_create_distributable_image': True}), lxd_state_snapshot():
             self._setup_parser(config_file)
             return run_method()
 
+    def fingerprint(self, config_file):
+        return self._dispatch(config_file, run_method=self._fingerprint)
+
+    def _fingerprint(self):
+        return get_fingerprint(self._get_command_name(),
+                               Prepare().fingerprint(self.config.get_base_config_file()),
+                               self.config.get_config(),
+                               self._get_plugin_digests(['lxc_templates', 'lxc_profiles', 'playbooks']))
+
+    def _get_artifacts(self):
+        return [Artifact(name='edi_lxc_publish', location=self._result(), type=ArtifactType.LXC_IMAGE)]
+
     def _result(self):
         return "{}_{}_{}".format(self.config.get_configuration_name(),
                                  self._get_command_file_name_prefix(),
@@ -24,7 +24,7 @@ from edi.commands.lxc import Lxc
 from edi.commands.lxccommands.lxcconfigure import Configure
 from edi.lib.configurationparser import command_context
 from edi.lib.helpers import print_success
-from edi.lib.lxchelpers import stop_container, try_delete_container
+from edi.lib.lxchelpers import stop_container, try_delete_container, lxd_state_snapshot
 
 
 class Stop(Lxc):
@@ -81,7 +81,7 @@ class Stop(Lxc):
             Configure().clean_recursive(self._result(), self.config.get_base_config_file(), self.clean_depth - 1)
 
     def _dispatch(self, config_file, run_method):
-        with command_context({'edi_create_distributable_image': True}):
+        with command_context({'edi_create_distributable_image': True}), lxd_state_snapshot():
             self._setup_parser(config_file)
             return run_method()
 
@@ -25,11 +25,16 @@ import os
 from edi.commands.project import Project
 from edi.commands.projectcommands.prepare import Prepare
 from edi.lib.playbookrunner import PlaybookRunner
-from edi.lib.helpers import print_success, get_artifact_dir, create_artifact_dir
+from codecs import open
+from edi.lib.helpers import print_success, get_artifact_dir, create_artifact_dir, chown_to_user
 from edi.lib.shellhelpers import run
-from edi.lib.buildahhelpers import create_container, delete_container, is_container_existing
+from edi.lib.buildahhelpers import (create_container, delete_container, is_container_existing, commit_container,
+                                    get_repository_images, delete_image)
+from edi.lib.podmanhelpers import is_image_existing
+from edi.lib.artifactcache import ArtifactCache, get_fingerprint
 from edi.lib.configurationparser import command_context
 from edi.lib.commandrunner import find_artifact
+from edi.lib.profiler import profiled_stage
 from edi.lib.artifact import ArtifactType, Artifact
 
 
@@ -38,7 +43,6 @@ class Configure(Project):
     def __init__(self):
         super().__init__()
         self.clean_depth = 1
-        self.ansible_connection = 'buildah'
         self._prepare_results = None
 
     @classmethod
@@ -64,7 +68,7 @@ class Configure(Project):
     def _dry_run(self):
         plugins = {}
         plugins.update(Prepare().dry_run(self.config.get_base_config_file()))
-        playbook_runner = PlaybookRunner(self.config, self._result(), self.ansible_connection)
+        playbook_runner = PlaybookRunner(self.config, self._result(), self.config.get_buildah_connection())
         plugins.update(playbook_runner.get_plugin_report())
         return plugins
 
@@ -72,7 +76,9 @@ class Configure(Project):
         return self._dispatch(config_file, run_method=self._run)
 
     def _run(self):
-        if self._needs_processing():
+        if self._needs_processing() and self.config.get_project_layer_cache():
+            self._run_layered()
+        elif self._needs_processing():
             container_name = self._get_container_artifact().location
 
             if is_container_existing(container_name):
@@ -86,7 +92,8 @@ class Configure(Project):
 
                 print(f"Going to create project container '{container_name}'\n"
                       f"based on content of '{bootstrapped_rootfs.location}'.")
-                create_container(container_name, bootstrapped_rootfs)
+                with profiled_stage('create_container', 'buildah'):
+                    create_container(container_name, bootstrapped_rootfs)
 
             seal_file = self._get_seal_artifact().location
 
@@ -96,7 +103,7 @@ class Configure(Project):
             else:
                 print(f"Going to configure project container '{container_name}' - be patient.")
 
-                playbook_runner = PlaybookRunner(self.config, container_name, self.ansible_connection)
+                playbook_runner = PlaybookRunner(self.config, container_name, self.config.get_buildah_connection())
                 playbook_runner.run_all()
                 create_artifact_dir()
                 run(["touch", seal_file])
@@ -111,6 +118,95 @@ class Configure(Project):
 
         return collected_results
 
+    def _run_layered(self):
+        """
+        Configure the project container using cached layers: After every playbook the container gets
+        committed to an image that is tagged with the chained fingerprint of the playbooks. A subsequent
+        run resumes from the deepest layer that is still valid and only applies the remaining playbooks.
+        The layers that do not belong to the current chain get deleted after a successful run.
+        An existing container that is not sealed with the current chain gets re-created from the layers.
+        """
+        container_name = self._get_container_artifact().location
+        seal_file = self._get_seal_artifact().location
+
+        self._prepare_results = Prepare().run(self.config.get_base_config_file())
+        bootstrapped_rootfs = find_artifact(self._prepare_results, "edi_bootstrapped_rootfs",
+                                            "configure", "prepare")
+
+        playbook_runner = PlaybookRunner(self.config, container_name, self.config.get_buildah_connection())
+        base_fingerprint = get_fingerprint(self._get_command_name(), ArtifactCache().get_digest(bootstrapped_rootfs))
+        layers = [base_fingerprint] + playbook_runner.get_fingerprints(base_fingerprint)
+
+        if is_container_existing(container_name) and self._read_seal(seal_file) == layers[-1]:
+            logging.info(f"Project container {container_name} is already fully configured. "
+                         f"Use 'edi project configure --clean' to get it re-configured from scratch.")
+        else:
+            if os.path.exists(seal_file):
+                os.remove(seal_file)
+
+            if is_container_existing(container_name):
+                # modifications that got applied in place are not part of the layers
+                logging.info(f"Project container {container_name} is not sealed with the current playbooks. "
+                             f"It gets re-created from the deepest cached layer that is still valid.")
+                delete_container(container_name)
+
+            depth = next((index for index in reversed(range(len(layers)))
+                          if is_image_existing(self._get_layer_image(layers[index]))), None)
+
+            with profiled_stage('create_container', 'buildah'):
+                if depth is None:
+                    print(f"Going to create project container '{container_name}'\n"
+                          f"based on content of '{bootstrapped_rootfs.location}'.")
+                    create_container(container_name, bootstrapped_rootfs)
+                    commit_container(container_name, self._get_layer_image(base_fingerprint))
+                    depth = 0
+                else:
+                    layer_image = self._get_layer_image(layers[depth])
+                    print(f"Going to create project container '{container_name}'\n"
+                          f"based on the cached layer '{layer_image}'.")
+                    create_container(container_name, Artifact(name="edi_project_layer", location=layer_image,
+                                                              type=ArtifactType.PODMAN_IMAGE))
+
+            if depth < len(layers) - 1:
+                print(f"Going to configure project container '{container_name}' - be patient.")
+
+                def commit_layer(index, _):
+                    commit_container(container_name, self._get_layer_image(layers[index + 1]))
+
+                playbook_runner.run_all(skip=depth, playbook_done=commit_layer)
+            else:
+                logging.info(f"All playbooks of project container {container_name} got restored from the cache.")
+
+            create_artifact_dir()
+            with open(seal_file, encoding='utf-8', mode='w') as f:
+                f.write(layers[-1])
+            chown_to_user(seal_file)
+
+            self._prune_layers(layers)
+
+        print_success(f"Configured project container '{container_name}'.")
+
+    @staticmethod
+    def _read_seal(seal_file):
+        if not os.path.isfile(seal_file):
+            return None
+
+        with open(seal_file, encoding='utf-8') as f:
+            return f.read().strip()
+
+    def _prune_layers(self, layers):
+        current_layer_images = [self._get_layer_image(layer) for layer in layers]
+        for layer_image in get_repository_images(self._get_layer_repository()):
+            if layer_image not in current_layer_images:
+                logging.info(f"Deleting outdated layer '{layer_image}'.")
+                delete_image(layer_image)
+
+    def _get_layer_repository(self):
+        return f"localhost/{self._get_container_artifact().location}-layers"
+
+    def _get_layer_image(self, fingerprint):
+        return f"{self._get_layer_repository()}:{fingerprint}"
+
     def clean_recursive(self, config_file, depth):
         self.clean_depth = depth
         self._dispatch(config_file, run_method=self._clean)
@@ -130,6 +226,11 @@ class Configure(Project):
                 delete_container(container_name)
                 print_success(f"Deleted project container '{container_name}'.")
 
+            if self.config.get_project_layer_cache():
+                for layer_image in get_repository_images(self._get_layer_repository()):
+                    delete_image(layer_image)
+                    print_success(f"Deleted cached layer '{layer_image}'.")
+
         if self.clean_depth > 1:
             Prepare().clean_recursive(self.config.get_base_config_file(), self.clean_depth - 2)
 
@@ -22,10 +22,25 @@
 import zlib
 import bz2
 import lzma
+import os
 import subprocess
+import tarfile
+from contextlib import contextmanager
 from functools import partial
 from edi.lib.helpers import FatalError
-from edi.lib.shellhelpers import run
+from edi.lib.shellhelpers import run, Executables, require
+
+# compression algorithm: (archive file extension, [(compressor, thread option), ...] in order of preference)
+# the thread option is None if the compressor is single threaded
+_compressors = {
+    'gz': ('tar.gz', [('pigz', '-p{}'), ('gzip', None)]),
+    'bz2': ('tar.bz2', [('pbzip2', '-p{}'), ('bzip2', None)]),
+    'xz': ('tar.xz', [('xz', '-T{}')]),
+    'zstd': ('tar.zst', [('zstd', '-T{}')]),
+}
+
+# compressors that interpret a thread count of 0 as "use all cores"
+_auto_thread_compressors = ['xz', 'zstd']
 
 
 def _gz_decompress(data):
@@ -36,11 +51,19 @@ def _zstd_decompress(data):
     return run(['zstd', '-dc'], input=data, stdout=subprocess.PIPE, universal_newlines=False).stdout
 
 
+_magic_numbers = {
+    'gz': b'\x1f\x8b\x08',
+    'bz2': b'\x42\x5a\x68',
+    'xz': b'\xfd\x37\x7a\x58\x5a\x00',
+    'zstd': b'(\xb5/\xfd',
+}
+
+
 decompressor_from_magic = [
-    (b'\x1f\x8b\x08', partial(_gz_decompress)),  # gz
-    (b'\x42\x5a\x68', partial(bz2.decompress)),  # bz2
-    (b'\xfd\x37\x7a\x58\x5a\x00', partial(lzma.decompress)),  # xz
-    (b'(\xb5/\xfd', partial(_zstd_decompress)),
+    (_magic_numbers['gz'], partial(_gz_decompress)),
+    (_magic_numbers['bz2'], partial(bz2.decompress)),
+    (_magic_numbers['xz'], partial(lzma.decompress)),
+    (_magic_numbers['zstd'], partial(_zstd_decompress)),
     ]
 
 
@@ -49,3 +72,103 @@ def decompress(data):
         if data.startswith(item[0]):
             return item[1](data)
     raise FatalError("Unknown compression type!")
+
+
+def get_compression_from_magic(data):
+    """
+    Get the compression algorithm based on the magic number at the beginning of the data.
+    :return: The compression algorithm or None if the data is not compressed (or unknown).
+    """
+    for compression, magic_number in _magic_numbers.items():
+        if data.startswith(magic_number):
+            return compression
+    return None
+
+
+@contextmanager
+def open_tar_stream(archive):
+    """
+    Open a (compressed) tar archive for a single sequential pass over its members.
+    The compression gets detected using the magic number of the archive.
+    :return: A tarfile.TarFile in stream mode.
+    """
+    with open(archive, mode='rb') as f:
+        compression = get_compression_from_magic(f.read(8))
+
+    if compression != 'zstd':
+        with tarfile.open(archive, mode='r|*') as tar:
+            yield tar
+        return
+
+    with _open_zstd_tar_stream(archive) as tar:
+        yield tar
+
+
+@require('zstd')
+@contextmanager
+def _open_zstd_tar_stream(archive):
+    # tarfile is not able to decompress zstd archives on its own
+    process = subprocess.Popen([Executables.get('zstd'), '-dc', archive], stdout=subprocess.PIPE)
+    try:
+        with tarfile.open(fileobj=process.stdout, mode='r|') as tar:
+            yield tar
+        # tarfile stops at the end-of-archive marker: drain the padding to avoid a SIGPIPE of zstd
+        while process.stdout.read(1024 * 1024):
+            pass
+    finally:
+        process.stdout.close()
+        process.wait()
+
+    if process.returncode != 0:
+        raise FatalError("Failed to decompress '{}'.".format(archive))
+
+
+def get_supported_compressions():
+    return sorted(_compressors.keys())
+
+
+def get_archive_extension(compression):
+    """
+    Get the file extension of a tar archive that uses the given compression (e.g. tar.zst for zstd).
+    """
+    try:
+        return _compressors[compression][0]
+    except KeyError:
+        raise FatalError("Unsupported compression algorithm '{}'.".format(compression))
+
+
+def get_compression_from_archive(archive):
+    """
+    Get the compression algorithm of a tar archive based on its file extension.
+    :return: The compression algorithm or None if the archive is not compressed (or unknown).
+    """
+    for compression, (extension, _) in _compressors.items():
+        if archive.endswith('.{}'.format(extension)):
+            return compression
+    return None
+
+
+def get_compress_program(compression, threads=0, level=None):
+    """
+    Get a (multithreaded if possible) compressor command that can be passed to tar --use-compress-program.
+    :param compression: The compression algorithm (gz, bz2, xz or zstd).
+    :param threads: The number of compression threads (0 means all available cores).
+    :param level: The compression level or None to use the default level of the compressor.
+    :return: The compressor command or None if no suitable compressor is installed.
+    """
+    get_archive_extension(compression)
+    for compressor, thread_option in _compressors[compression][1]:
+        if not Executables.has(compressor):
+            continue
+
+        cmd = [compressor]
+        if thread_option:
+            if threads == 0 and compressor not in _auto_thread_compressors:
+                cmd.append(thread_option.format(os.cpu_count() or 1))
+            else:
+                cmd.append(thread_option.format(threads))
+        if level is not None:
+            cmd.append('-{}'.format(level))
+        return ' '.join(cmd)
+
+    return None
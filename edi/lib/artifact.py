@@ -7,6 +7,8 @@ class ArtifactType(Enum):
     BUILDAH_CONTAINER = 'buildah-container'
     PODMAN_IMAGE = 'podman-image'  # Owned by non-root user.
     PODMAN_IMAGE_ROOT = 'podman-image-root'  # Owned by root.
+    LXC_IMAGE = 'lxc-image'
+    LXC_CONTAINER = 'lxc-container'
 
 
 Artifact = namedtuple("Artifact", "name, location, type")
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import logging
+import os
+import yaml
+from codecs import open
+from edi.lib.artifact import ArtifactType
+from edi.lib.helpers import get_artifact_dir, chown_to_user, create_user_directory
+from edi.lib.cachehelpers import locked_file, link_file
+
+
+def get_fingerprint(*inputs):
+    """
+    Compute a fingerprint over json serializable inputs (e.g. configuration nodes and rendered plugins).
+    """
+    serialized_inputs = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(serialized_inputs.encode()).hexdigest()
+
+
+def get_file_digest(path):
+    sha256 = hashlib.sha256()
+    with open(path, mode='rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def get_directory_digest(directory):
+    """
+    Compute a digest over the names, the link targets and the content of all files within a directory tree.
+    """
+    digests = dict()
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files) + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            path = os.path.join(root, name)
+            relative_path = os.path.relpath(path, directory)
+            if os.path.islink(path):
+                digests[relative_path] = 'link:{}'.format(os.readlink(path))
+            elif os.path.isfile(path):
+                digests[relative_path] = get_file_digest(path)
+    return get_fingerprint(digests)
+
+
+class ArtifactCache:
+    """
+    Content addressed cache for the artifacts of the pipeline stages.
+
+    Each stage computes a fingerprint from all its inputs (configuration nodes,
+    rendered plugins, plugin file hashes and the fingerprints of the upstream artifacts).
+    File artifacts get stored as hard links below <artifacts>/.edi_cache/objects/<fingerprint>/
+    and get restored from there if a stage with the same fingerprint gets run again.
+    An index keeps track of the fingerprint that produced the artifact at a given location.
+    Only the most recently used versions of each file artifact are kept (see edi_artifact_cache_versions).
+    """
+    _cache_directory_name = '.edi_cache'
+    _index_file_name = 'index.yml'
+    _lock_file_name = '.lock'
+    _max_entries_per_artifact = 4
+
+    def __init__(self, cache_directory=None, max_versions=None):
+        if cache_directory:
+            self.cache_directory = cache_directory
+        else:
+            self.cache_directory = os.path.join(get_artifact_dir(), ArtifactCache._cache_directory_name)
+
+        if max_versions is None:
+            self.max_versions = ArtifactCache._max_entries_per_artifact
+        else:
+            self.max_versions = max_versions
+
+    def get_digest(self, artifact):
+        """
+        Get a cheap digest of an artifact: the fingerprint of the stage that produced it or,
+        if unknown, the size and the modification time of the artifact.
+        """
+        fingerprint = self._read_index().get(artifact.location)
+        if fingerprint:
+            return fingerprint
+
+        if artifact.type is ArtifactType.PATH and os.path.exists(artifact.location):
+            stat = os.stat(artifact.location)
+            return '{}:{}'.format(stat.st_size, stat.st_mtime_ns)
+
+        return artifact.location
+
+    def restore(self, fingerprint, artifacts):
+        """
+        Make sure that the artifacts match the fingerprint.
+        File artifacts get restored from the cache if possible.
+        :return: True if all artifacts match the fingerprint.
+        """
+        with self._lock():
+            index = self._read_index()
+            restored = True
+            index_changed = False
+            for artifact in artifacts:
+                cached_file = self._get_object(fingerprint, artifact)
+                if artifact.type is ArtifactType.PATH and os.path.isfile(cached_file):
+                    if (not os.path.isfile(artifact.location) or
+                            not os.path.samefile(cached_file, artifact.location)):
+                        logging.info("Restoring '{}' from the artifact cache.".format(artifact.location))
+                        self._link(cached_file, artifact.location)
+                    if index.get(artifact.location) != fingerprint:
+                        index[artifact.location] = fingerprint
+                        index_changed = True
+                elif index.get(artifact.location) != fingerprint:
+                    restored = False
+                elif artifact.type is ArtifactType.PATH and not os.path.exists(artifact.location):
+                    restored = False
+
+            if index_changed:
+                self._write_index(index)
+            return restored
+
+    def store(self, fingerprint, artifacts):
+        """
+        Store the artifacts that got produced by a stage with the given fingerprint.
+        """
+        with self._lock():
+            index = self._read_index()
+            for artifact in artifacts:
+                index[artifact.location] = fingerprint
+                if artifact.type is ArtifactType.PATH and os.path.isfile(artifact.location):
+                    if self.max_versions:
+                        cached_file = self._get_object(fingerprint, artifact)
+                        create_user_directory(os.path.dirname(cached_file))
+                        self._link(artifact.location, cached_file)
+                    self._prune(os.path.basename(artifact.location))
+
+            self._write_index(index)
+
+    def forget(self, artifacts):
+        """
+        Remove all cached versions of the artifacts (e.g. when cleaning a stage).
+        """
+        with self._lock():
+            index = self._read_index()
+            for artifact in artifacts:
+                index.pop(artifact.location, None)
+                if artifact.type is ArtifactType.PATH:
+                    for cached_file in self._get_cached_versions(os.path.basename(artifact.location)):
+                        self._remove_object(cached_file)
+
+            self._write_index(index)
+
+    def _lock(self):
+        create_user_directory(self.cache_directory)
+        return locked_file(os.path.join(self.cache_directory, ArtifactCache._lock_file_name))
+
+    def _get_objects_directory(self):
+        return os.path.join(self.cache_directory, 'objects')
+
+    def _get_object(self, fingerprint, artifact):
+        return os.path.join(self._get_objects_directory(), fingerprint, os.path.basename(artifact.location))
+
+    def _get_cached_versions(self, file_name):
+        objects_directory = self._get_objects_directory()
+        if not os.path.isdir(objects_directory):
+            return []
+
+        candidates = [os.path.join(objects_directory, fingerprint, file_name)
+                      for fingerprint in os.listdir(objects_directory)]
+        return [candidate for candidate in candidates if os.path.isfile(candidate)]
+
+    def _prune(self, file_name):
+        versions = sorted(self._get_cached_versions(file_name), key=os.path.getmtime, reverse=True)
+        for outdated_version in versions[self.max_versions:]:
+            logging.debug("Evicting '{}' from the artifact cache.".format(outdated_version))
+            self._remove_object(outdated_version)
+
+    @staticmethod
+    def _remove_object(cached_file):
+        os.remove(cached_file)
+        fingerprint_directory = os.path.dirname(cached_file)
+        if not os.listdir(fingerprint_directory):
+            os.rmdir(fingerprint_directory)
+
+    @staticmethod
+    def _link(source, target):
+        link_file(source, target)
+        # mark the cached version as recently used
+        os.utime(target)
+
+    def _get_index_file(self):
+        return os.path.join(self.cache_directory, ArtifactCache._index_file_name)
+
+    def _read_index(self):
+        index_file = self._get_index_file()
+        if not os.path.isfile(index_file):
+            return dict()
+
+        try:
+            with open(index_file, encoding='utf-8', mode='r') as f:
+                index = yaml.safe_load(f.read())
+        except (OSError, yaml.YAMLError) as error:
+            logging.warning("Ignoring unreadable artifact cache index '{}' ({}).".format(index_file, error))
+            return dict()
+
+        if not isinstance(index, dict):
+            return dict()
+
+        return index
+
+    def _write_index(self, index):
+        create_user_directory(self.cache_directory)
+        index_file = self._get_index_file()
+        with open(index_file, encoding='utf-8', mode='w') as f:
+            f.write(yaml.dump(index, default_flow_style=False))
+        chown_to_user(index_file)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+from contextlib import contextmanager
+from edi.lib.helpers import create_user_directory, get_user
+from edi.lib.shellhelpers import get_user_home_directory
+from edi.lib.cachehelpers import locked_file, remove_lock_file, link_file
+
+
+class BootstrapCache:
+    """
+    Host wide cache for bootstrapped images that can be shared among projects.
+
+    The entries are keyed by the normalized bootstrap configuration and get
+    hard linked (or reflinked/copied if the file system does not allow it)
+    into the artifact directory of the project. Concurrent edi runs get
+    serialized per key using file locks. The least recently used entries get
+    evicted as soon as the cache exceeds its maximal size.
+    """
+    _entry_file_name = 'image'
+    _lock_file_name = '.lock'
+
+    def __init__(self, max_size, cache_directory=None):
+        """
+        :param max_size: The maximal size of the cache in bytes (0 disables the cache).
+        :param cache_directory: The cache directory (default: ~/.cache/edi/bootstrap of the current user).
+        """
+        self.max_size = max_size
+        if cache_directory:
+            self.cache_directory = cache_directory
+        else:
+            user_home = get_user_home_directory(get_user())
+            self.cache_directory = os.path.join(user_home, '.cache', 'edi', 'bootstrap')
+
+    def is_enabled(self):
+        return self.max_size > 0
+
+    @contextmanager
+    def locked(self, key):
+        """
+        Serialize the retrieval and the creation of an entry among concurrent edi runs.
+        """
+        if not self.is_enabled():
+            yield
+            return
+
+        create_user_directory(self.cache_directory)
+        with self._lock('{}.lock'.format(key)):
+            yield
+
+    def retrieve(self, key, target):
+        """
+        Link the cached image into the target location.
+        :return: True if the image was available within the cache.
+        """
+        if not self.is_enabled() or not os.path.isdir(self.cache_directory):
+            return False
+
+        # the eviction of a concurrent edi run must not remove the entry while it gets linked
+        with self._lock(BootstrapCache._lock_file_name):
+            entry = self._get_entry(key)
+            if not os.path.isfile(entry):
+                return False
+
+            logging.info("Retrieving bootstrapped image from shared cache '{}'.".format(entry))
+            link_file(entry, target)
+            # mark the entry as recently used
+            os.utime(entry)
+            return True
+
+    def add(self, key, source):
+        """
+        Add a freshly bootstrapped image to the cache and evict outdated entries.
+        """
+        if not self.is_enabled():
+            return
+
+        entry = self._get_entry(key)
+        create_user_directory(os.path.dirname(entry))
+        with self._lock(BootstrapCache._lock_file_name):
+            link_file(source, entry)
+            os.utime(entry)
+            self._evict(keep=key)
+
+    def _get_entry(self, key):
+        return os.path.join(self.cache_directory, key, BootstrapCache._entry_file_name)
+
+    def _evict(self, keep):
+        entries = []
+        for key in os.listdir(self.cache_directory):
+            entry = self._get_entry(key)
+            if os.path.isfile(entry):
+                stat = os.stat(entry)
+                entries.append((stat.st_mtime, stat.st_size, key, entry))
+
+        total_size = sum(size for _, size, _, _ in entries)
+        for _, size, key, entry in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if key == keep:
+                continue
+            logging.info("Evicting '{}' from the shared bootstrap cache.".format(entry))
+            os.remove(entry)
+            os.rmdir(os.path.dirname(entry))
+            remove_lock_file(os.path.join(self.cache_directory, '{}.lock'.format(key)))
+            total_size -= size
+
+    def _lock(self, lock_file_name):
+        return locked_file(os.path.join(self.cache_directory, lock_file_name))
@@ -23,12 +23,13 @@ import subprocess
 import yaml
 import os
 import logging
-from packaging.version import Version
+import shlex
 from edi.lib.helpers import FatalError
 from edi.lib.artifact import ArtifactType
 from edi.lib.versionhelpers import get_stripped_version
 from edi.lib.shellhelpers import run, Executables, require
 from edi.lib.podmanhelpers import is_image_existing
+from edi.lib.archivehelpers import get_compress_program, get_compression_from_archive
 
 
 buildah_install_hint = "'sudo apt install buildah'"
@@ -64,6 +65,7 @@ class BuildahVersion:
         if BuildahVersion._check_done:
             return
 
+        from packaging.version import Version
         if Version(get_stripped_version(get_buildah_version())) < Version(BuildahVersion._required_minimal_version):
             raise FatalError(('The current buildah installation ({}) does not meet the minimal requirements (>={}).\n'
                               'Please update your buildah installation!'
@@ -123,22 +125,158 @@ def create_container(name, source_artifact):
 
 
 @require('buildah', buildah_install_hint, BuildahVersion.check)
-def extract_container_rootfs(name, rootfs_archive):
+def commit_container(name, image):
+    if not is_container_existing(name):
+        raise FatalError(f"The container '{name}' does not exist!")
+
+    cmd = [buildah_exec(), "commit", "--quiet", name, image]
+    run(cmd, log_threshold=logging.INFO)
+
+
+@require('buildah', buildah_install_hint, BuildahVersion.check)
+def get_repository_images(repository):
+    """
+    Get the tagged images (repository:tag) of a repository (e.g. localhost/foo).
+    """
+    cmd = [buildah_exec(), "images", "--format", "{{.Name}}:{{.Tag}}"]
+    result = run(cmd, stdout=subprocess.PIPE)
+    return [image for image in result.stdout.splitlines() if image.rsplit(':', 1)[0] == repository]
+
+
+@require('buildah', buildah_install_hint, BuildahVersion.check)
+def delete_image(image):
+    cmd = [buildah_exec(), "rmi", image]
+    run(cmd, log_threshold=logging.INFO)
+
+
+@require('buildah', buildah_install_hint, BuildahVersion.check)
+def extract_container_rootfs(name, rootfs_archive, compression_threads=0, compression_level=None):
     if not is_container_existing(name):
         raise FatalError(f"The container '{name}' does not exist!")
 
     if os.path.exists(rootfs_archive):
         raise FatalError(f"The root file system archive '{rootfs_archive}' already exists!")
 
-    nested_command = ("tar --numeric-owner --xattrs --selinux --acls -C " + r'${edi_project_container_root}' +
-                      " -acf " + str(rootfs_archive) + " .")
+    compress_option = ""
+    compression = get_compression_from_archive(str(rootfs_archive))
+    if compression:
+        compress_program = get_compress_program(compression, compression_threads, compression_level)
+        if compress_program:
+            compress_option = "--use-compress-program=" + shlex.quote(compress_program) + " "
+
+    nested_command = ("tar --numeric-owner --xattrs --selinux --acls " + compress_option +
+                      "-C " + r'${edi_project_container_root}' + " -acf " + str(rootfs_archive) + " .")
+    run_buildah_unshare(name, nested_command)
+
+
+@require('buildah', buildah_install_hint, BuildahVersion.check)
+def archive_container_files(name, directory, archive, find_arguments):
+    """
+    Write the files of a container directory that match the find arguments into an uncompressed tar archive.
+    The member names are relative to the root of the container (e.g. ./usr/share/doc/sudo/changelog.gz).
+    """
+    if not is_container_existing(name):
+        raise FatalError(f"The container '{name}' does not exist!")
+
+    nested_command = ("cd " + r'${edi_project_container_root}' + " && find ./" + shlex.quote(directory.strip('/')) +
+                      " " + " ".join(shlex.quote(argument) for argument in find_arguments) + " -print0 | " +
+                      "tar --numeric-owner --null --no-recursion -T - -cf " + shlex.quote(str(archive)))
     run_buildah_unshare(name, nested_command)
 
 
+# Prepares the mounted root file system (edi_project_container_root) like buildah run does:
+# /dev is a minimal tmpfs, /proc and /sys are the ones of the host and the name resolution files of the host
+# get bind mounted onto the (symlink resolved) files of the container. Everything gets cleaned up after the command.
+_mounted_container_script = r"""
+root="${edi_project_container_root}"
+set -e
+mounts=""
+created=""
+mkdir -p "${root}/dev"
+mount -t tmpfs -o mode=755,nosuid tmpfs "${root}/dev"
+mounts="dev"
+for device in null zero full random urandom tty; do
+    touch "${root}/dev/${device}"
+    mount --bind "/dev/${device}" "${root}/dev/${device}"
+done
+mkdir -p "${root}/dev/pts" "${root}/dev/shm"
+mount -t devpts -o newinstance,ptmxmode=0666,mode=0620 devpts "${root}/dev/pts" || true
+mount -t tmpfs -o mode=1777,nosuid,nodev tmpfs "${root}/dev/shm"
+ln -sfn pts/ptmx "${root}/dev/ptmx"
+ln -sfn /proc/self/fd "${root}/dev/fd"
+ln -sfn /proc/self/fd/0 "${root}/dev/stdin"
+ln -sfn /proc/self/fd/1 "${root}/dev/stdout"
+ln -sfn /proc/self/fd/2 "${root}/dev/stderr"
+for fs in proc sys; do
+    mount --rbind "/${fs}" "${root}/${fs}"
+    mounts="${fs} ${mounts}"
+done
+for file in etc/resolv.conf etc/hosts; do
+    if [ ! -f "/${file}" ] || { [ ! -e "${root}/${file}" ] && [ ! -L "${root}/${file}" ]; }; then
+        continue
+    fi
+    target="${file}"
+    count=0
+    while [ -L "${root}/${target}" ] && [ ${count} -lt 16 ]; do
+        link="$(readlink "${root}/${target}")"
+        case "${link}" in
+            /*) target="${link}" ;;
+            *) target="$(dirname "${target}")/${link}" ;;
+        esac
+        target="$(realpath -m -s "/${target}")"
+        target="${target#/}"
+        count=$((count + 1))
+    done
+    if [ -L "${root}/${target}" ] || [ -d "${root}/${target}" ]; then
+        continue
+    fi
+    if [ ! -e "${root}/${target}" ]; then
+        # e.g. the stub resolver of systemd-resolved: create a placeholder and the missing directories
+        missing="${target}"
+        while [ ! -d "${root}/$(dirname "${missing}")" ]; do
+            missing="$(dirname "${missing}")"
+        done
+        mkdir -p "${root}/$(dirname "${target}")"
+        touch "${root}/${target}"
+        created="${missing} ${created}"
+    fi
+    mount --bind "/${file}" "${root}/${target}"
+    mounts="${target} ${mounts}"
+done
+set +e
+"$@"
+result=$?
+for mount_point in ${mounts}; do umount -R -l "${root}/${mount_point}"; done
+for path in ${created}; do rm -rf "${root:?}/${path}"; done
+exit ${result}
+"""
+
+
 @require('buildah', buildah_install_hint, BuildahVersion.check)
-def run_buildah_unshare(name, command):
+def run_in_mounted_container(name, cmd, **kwargs):
+    """
+    Run a host command while the root file system of the container is mounted (see the environment
+    variable edi_project_container_root). Like for buildah run, the container gets a minimal /dev, the
+    /proc and /sys of the host and the name resolution files of the host. Everything gets unmounted once
+    the command terminated.
+    """
+    if not is_container_existing(name):
+        raise FatalError(f"The container '{name}' does not exist!")
+
+    return run_buildah_unshare(name, _mounted_container_script, arguments=cmd, **kwargs)
+
+
+@require('buildah', buildah_install_hint, BuildahVersion.check)
+def run_buildah_unshare(name, command, arguments=None, **kwargs):
+    """
+    Run a shell command within a buildah unshare session.
+    The optional arguments get passed to the shell command as positional parameters.
+    """
     cmd = [buildah_exec(), "unshare"]
     if name:
         cmd.extend(["--mount", f"edi_project_container_root={name}"])
     cmd.extend(["--", "sh", "-c", command])
-    return run(cmd, log_threshold=logging.INFO)
+    if arguments:
+        cmd.append("sh")
+        cmd.extend(arguments)
+    return run(cmd, log_threshold=logging.INFO, **kwargs)
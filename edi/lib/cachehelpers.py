@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+import fcntl
+import os
+from contextlib import contextmanager
+from edi.lib.helpers import chown_to_user
+from edi.lib.shellhelpers import run
+
+
+@contextmanager
+def locked_file(lock_file):
+    """
+    Serialize a critical section among concurrent threads and edi runs using an exclusive file lock.
+    The lock file gets created if it does not exist yet.
+    """
+    while True:
+        with open(lock_file, mode='a') as f:
+            chown_to_user(lock_file)
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                if not _is_same_file(f, lock_file):
+                    # the lock file got removed (see remove_lock_file) while waiting for it
+                    continue
+                yield
+                return
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def remove_lock_file(lock_file):
+    """
+    Remove a lock file unless it is currently in use.
+    """
+    try:
+        f = open(lock_file, mode='r')
+    except FileNotFoundError:
+        return
+
+    with f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+
+        if _is_same_file(f, lock_file):
+            os.remove(lock_file)
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def link_file(source, target):
+    """
+    Atomically replace the target by a hard link of the source.
+    If hard linking is not possible (e.g. different file systems), a reflink or a copy gets used.
+    """
+    temporary_target = '{}.edi_tmp'.format(target)
+    if os.path.exists(temporary_target):
+        os.remove(temporary_target)
+
+    try:
+        os.link(source, temporary_target)
+    except OSError:
+        run(['cp', '--reflink=auto', source, temporary_target])
+
+    os.replace(temporary_target, target)
+
+
+def _is_same_file(f, path):
+    try:
+        return os.path.samestat(os.fstat(f.fileno()), os.stat(path))
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import logging
+import os
+from edi.lib.helpers import chown_to_user, create_user_directory, get_user
+from edi.lib.shellhelpers import get_user_home_directory
+from edi.lib.cachehelpers import locked_file
+
+
+class ChangelogCache:
+    """
+    Host wide cache for parsed and annotated package changelogs.
+
+    The entries are keyed by the digest of the compressed changelog and the
+    parameters that affect the parsing (baseline and replacements). Most
+    changelogs do not change from one build to the next and therefore do not
+    need to get parsed again. The least recently used entries get evicted as
+    soon as the cache exceeds its maximal size.
+    """
+    _format_version = 1
+    _entry_extension = '.json'
+    _lock_file_name = '.lock'
+
+    def __init__(self, max_size, cache_directory=None):
+        """
+        :param max_size: The maximal size of the cache in bytes (0 disables the cache).
+        :param cache_directory: The cache directory (default: ~/.cache/edi/changelogs of the current user).
+        """
+        self.max_size = max_size
+        if cache_directory:
+            self.cache_directory = cache_directory
+        elif self.is_enabled():
+            user_home = get_user_home_directory(get_user())
+            self.cache_directory = os.path.join(user_home, '.cache', 'edi', 'changelogs')
+        else:
+            self.cache_directory = None
+
+    def is_enabled(self):
+        return self.max_size > 0
+
+    def get_key(self, changelog_path, *parameters):
+        """
+        Get the key of a changelog.
+        :param changelog_path: The path of the compressed changelog.
+        :param parameters: JSON serializable parameters that affect the parsing of the changelog.
+        """
+        digest = hashlib.sha256()
+        with open(changelog_path, mode='rb') as changelog:
+            for chunk in iter(lambda: changelog.read(1024 * 1024), b''):
+                digest.update(chunk)
+        digest.update(json.dumps([ChangelogCache._format_version, parameters]).encode())
+        return digest.hexdigest()
+
+    def retrieve(self, key):
+        """
+        :return: The cached changelog or None if it is not available within the cache.
+        """
+        if not self.is_enabled():
+            return None
+
+        entry = self._get_entry(key)
+        try:
+            with open(entry, mode='r', encoding='UTF-8') as f:
+                changelog = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # mark the entry as recently used
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+
+        # JSON does not know tuples
+        for change_block in changelog.get('change_blocks', []):
+            change_block['changes'] = [tuple(change) for change in change_block['changes']]
+        return changelog
+
+    def add(self, key, changelog):
+        if not self.is_enabled():
+            return
+
+        create_user_directory(self.cache_directory)
+        entry = self._get_entry(key)
+        temporary_entry = '{}.{}.edi_tmp'.format(entry, os.getpid())
+        with open(temporary_entry, mode='w', encoding='UTF-8') as f:
+            json.dump(changelog, f)
+        chown_to_user(temporary_entry)
+        os.replace(temporary_entry, entry)
+
+    def evict(self):
+        """
+        Evict the least recently used entries until the cache does no longer exceed its maximal size.
+        """
+        if not self.is_enabled() or not os.path.isdir(self.cache_directory):
+            return
+
+        with self._lock():
+            entries = []
+            for file_name in os.listdir(self.cache_directory):
+                if not file_name.endswith(ChangelogCache._entry_extension):
+                    continue
+                entry = os.path.join(self.cache_directory, file_name)
+                try:
+                    stat = os.stat(entry)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry))
+
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, entry in sorted(entries):
+                if total_size <= self.max_size:
+                    break
+                logging.debug("Evicting '{}' from the changelog cache.".format(entry))
+                os.remove(entry)
+                total_size -= size
+
+    def _get_entry(self, key):
+        return os.path.join(self.cache_directory, '{}{}'.format(key, ChangelogCache._entry_extension))
+
+    def _lock(self):
+        return locked_file(os.path.join(self.cache_directory, ChangelogCache._lock_file_name))
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import re
+import gzip
+from concurrent.futures import ProcessPoolExecutor
+from edi.lib.helpers import FatalError
+
+
+class ChangesAnnotator():
+    def __init__(self, package):
+        self._pattern_lookup = [
+            # level 0: author, empty line or fallback
+            [('author', r'^[ ]{2}\[[ ]*', self._trim_author, []),
+             ('empty_line', r'^$', self._nop, []),
+             ('list_item', r'.*', self._report_parser_warning, [])],
+            # level 1: list item, list item continuation or empty line
+            [('list_item', r'^[ ]{2}[*+-] ', self._trim_list_item, []),
+             ('list_item_continuation', r'^[ ]{2,4}[^[]', self._trim_list_item_continuation,
+              ['list_item', 'list_item_continuation'])],
+            # level 2: sub list item, sub list item continuation or empty line
+            [('sub_list_item', r'^[ ]{3,4}[*+-] ', ChangesAnnotator._trim_list_item, []),
+             ('sub_list_item_continuation', r'^[ ]{5,6}', ChangesAnnotator._trim_list_item_continuation,
+              ['sub_list_item', 'sub_list_item_continuation'])],
+            # level 3: sub sub list item, sub sub list item continuation or empty line
+            [('sub_sub_list_item', r'^[ ]{6}[*+-] ', self._trim_list_item, []),
+             ('sub_sub_list_item_continuation', r'^[ ]{8}', ChangesAnnotator._trim_list_item_continuation,
+              ['sub_sub_list_item', 'sub_sub_list_item_continuation'])],
+            # level 5: sentinel
+            [],
+        ]
+        self._current_level = 0
+        self._package = package
+
+    def annotate(self, changes):
+        annotated_changes = list()
+        self._current_level = 0
+
+        for change in changes:
+            match_found = False
+            for level in range(self._current_level + 1, -1, -1):
+                for annotation, expression, modification, compatibility in self._pattern_lookup[level]:
+                    if re.match(expression, change):
+                        match_found = True
+                        self._current_level = level
+                        current_change = modification(change)
+
+                        if annotated_changes and annotated_changes[-1][0] in compatibility:
+                            previous_annotation, previous_change = annotated_changes[-1]
+                            annotated_changes[-1] = (previous_annotation, " ".join([previous_change, current_change]))
+                        else:
+                            annotated_changes.append((annotation, current_change))
+                        break
+
+                    if level == self._current_level + 1:
+                        break
+
+                if match_found:
+                    break
+
+        return annotated_changes
+
+    @staticmethod
+    def _trim_author(text):
+        return re.sub(r'^[ ]*\[(.*)\]$', r'\1', text).strip()
+
+    @staticmethod
+    def _trim_list_item(text):
+        return re.sub(r'^[ ]*[*+-] (.*)$', r'\1', text)
+
+    @staticmethod
+    def _trim_list_item_continuation(text):
+        return text.strip()
+
+    @staticmethod
+    def _nop(text):
+        return text
+
+    def _report_parser_warning(self, text):
+        logging.warning("For package '{}': Failed to parse '{}' at level {}!".format(
+            self._package, text, self._current_level))
+        return text
+
+
+def parse_date(date_string):
+    from dateutil import parser
+
+    try:
+        return parser.parse(date_string)
+    except Exception as e:
+        raise FatalError("Failed to parse date string '{}':\n{}".format(date_string, str(e)))
+
+
+def apply_replacements(string_list, replacements):
+    result = []
+    for item in string_list:
+        for replacement in replacements:
+            p = replacement.get('pattern', '')
+            r = replacement.get('replacement', '')
+            try:
+                item = re.sub(p, r, item)
+            except Exception as e:
+                raise FatalError(("Failed to apply regular expression:\n"
+                                  "pattern: {}\nreplacement: {}:\nmessage: {}").format(p, r, str(e)))
+
+        result. append(item)
+
+    return result
+
+
+def get_changelog_path(raw_input, package_name):
+    for file_name in ['changelog.Debian.gz', 'changelog.gz']:
+        package_changelog_path = os.path.join(raw_input, package_name, file_name)
+        if os.path.isfile(package_changelog_path):
+            return package_changelog_path
+
+    return None
+
+
+def read_changelog(lines, is_outdated):
+    """
+    Parse a changelog block by block and stop reading as soon as an outdated block got parsed.
+    :param lines: An iterable providing the lines of the changelog (e.g. an open file).
+    :param is_outdated: A function that tells whether a change block (and all older ones) can get skipped.
+    :return: A debian.changelog.Changelog containing the blocks up to and including the first outdated one.
+    """
+    from debian.changelog import Changelog
+
+    changelog = Changelog()
+
+    def read_lines():
+        block_count = 0
+        for line in lines:
+            # the parser appends a block as soon as it consumed its trailer line
+            if len(changelog) > block_count:
+                block_count = len(changelog)
+                if is_outdated(changelog[block_count - 1]):
+                    return
+            yield line
+
+    changelog.parse_changelog(read_lines(), strict=False)
+    return changelog
+
+
+def extract_changelog(raw_input, package_name, baseline_date, baseline_version, replacements):
+    """
+    Parse and annotate the changes of a package that are newer than the given baseline.
+    :param raw_input: The folder that contains the changelogs of the packages.
+    :param package_name: The name of the package.
+    :param baseline_date: Changes from this date or older get skipped.
+    :param baseline_version: Changes of this version or older get skipped.
+    :param replacements: The pattern/replacement pairs that get applied to the changes.
+    :return: A dictionary describing the changelog or None if no usable changelog was found.
+    """
+    from debian.debian_support import Version
+
+    # TODO: evaluate baseline by package
+    package_changelog_path = get_changelog_path(raw_input, package_name)
+    if not package_changelog_path:
+        logging.warning("No changelog found for package '{}'.".format(package_name))
+        return None
+
+    baseline = Version(baseline_version)
+
+    def is_outdated(change_block):
+        return parse_date(change_block.date) <= baseline_date or change_block.version <= baseline
+
+    with gzip.open(package_changelog_path) as fh:
+        try:
+            changelog = read_changelog(fh, is_outdated)
+        except UnicodeDecodeError as e:
+            raise FatalError("Failed to parse changelog of {}:\n{}".format(package_name, str(e)))
+
+        if not changelog.package or not changelog.date or not changelog.author:
+            logging.warning("The changelog of package '{}' is incomplete.".format(package_name))
+            return None
+
+        package_dict = dict()
+        package_dict['author'] = changelog.author
+        package_dict['date'] = changelog.date
+        package_dict['short_date'] = parse_date(changelog.date).strftime("%d. %B %Y")
+        package_dict['version'] = str(changelog.get_version())
+        package_dict['package'] = changelog.package
+
+        change_blocks = list()
+        for change_block in changelog:
+            if is_outdated(change_block):
+                break
+
+            changeblock_date = parse_date(change_block.date)
+            block_dict = dict()
+            block_dict['author'] = change_block.author
+            block_dict['date'] = change_block.date
+            block_dict['short_date'] = changeblock_date.strftime("%d. %B %Y")
+            block_dict['version'] = str(change_block.version)
+            block_dict['package'] = change_block.package
+            block_dict['distributions'] = change_block.distributions
+            block_dict['urgency'] = change_block.urgency
+            changes = apply_replacements(change_block.changes(), replacements)
+            block_dict['changes'] = ChangesAnnotator(package_name).annotate(changes)
+            change_blocks.append(block_dict)
+
+        package_dict['change_blocks'] = change_blocks
+
+        return package_dict
+
+
+class ChangelogExtractor():
+    """
+    Extracts the changelogs that are needed by the documentation steps.
+
+    The changelogs of all steps get registered first and then get parsed at once
+    using a pool of worker processes. Identical requests of different steps get
+    parsed only once and unchanged changelogs get taken from the (optional) cache.
+    The results get looked up by package, baseline and replacements and are
+    therefore independent of the order in which the workers complete.
+    """
+
+    def __init__(self, raw_input, package_index, max_workers=0, cache=None):
+        """
+        :param raw_input: The folder that contains the changelogs of the packages.
+        :param package_index: The PackageIndex providing the baseline versions.
+        :param max_workers: The maximum number of worker processes (0 = number of cores).
+        :param cache: A ChangelogCache or None.
+        """
+        self._raw_input = raw_input
+        self._package_index = package_index
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._cache = cache
+        self._pending = dict()
+        self._changelogs = dict()
+
+    def add(self, package_name, baseline_date, replacements):
+        """
+        Register a changelog that will get extracted by the next call of run().
+        """
+        key = self._get_key(package_name, baseline_date, replacements)
+        if key not in self._changelogs and key not in self._pending:
+            self._pending[key] = self._get_arguments(package_name, baseline_date, replacements)
+
+    def run(self):
+        """
+        Extract all registered changelogs.
+        """
+        pending = []
+        for key, arguments in self._pending.items():
+            cache_key = self._get_cache_key(arguments)
+            changelog = self._cache.retrieve(cache_key) if cache_key else None
+            if changelog is None:
+                pending.append((key, cache_key, arguments))
+            else:
+                self._changelogs[key] = changelog
+        self._pending.clear()
+
+        if not pending:
+            return
+
+        max_workers = min(self._max_workers, len(pending))
+        if max_workers <= 1:
+            for key, cache_key, arguments in pending:
+                self._add_changelog(key, cache_key, extract_changelog(*arguments))
+        else:
+            logging.debug("Extracting {} changelogs using {} processes.".format(len(pending), max_workers))
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [(key, cache_key, executor.submit(extract_changelog, *arguments))
+                           for key, cache_key, arguments in pending]
+                for key, cache_key, future in futures:
+                    self._add_changelog(key, cache_key, future.result())
+
+        if self._cache:
+            self._cache.evict()
+
+    def get(self, package_name, baseline_date, replacements):
+        """
+        Get an extracted changelog. Changelogs that did not get registered get extracted on demand.
+        :return: A dictionary describing the changelog or None if no usable changelog was found.
+        """
+        key = self._get_key(package_name, baseline_date, replacements)
+        if key not in self._changelogs:
+            self._pending.pop(key, None)
+            arguments = self._get_arguments(package_name, baseline_date, replacements)
+            cache_key = self._get_cache_key(arguments)
+            changelog = self._cache.retrieve(cache_key) if cache_key else None
+            if changelog is None:
+                self._add_changelog(key, cache_key, extract_changelog(*arguments))
+            else:
+                self._changelogs[key] = changelog
+        return self._changelogs[key]
+
+    def _add_changelog(self, key, cache_key, changelog):
+        self._changelogs[key] = changelog
+        # incomplete changelogs do not get cached in order to keep the warnings
+        if cache_key and changelog is not None:
+            self._cache.add(cache_key, changelog)
+
+    def _get_cache_key(self, arguments):
+        if not self._cache or not self._cache.is_enabled():
+            return None
+
+        raw_input, package_name, baseline_date, baseline_version, replacements = arguments
+        changelog_path = get_changelog_path(raw_input, package_name)
+        if not changelog_path:
+            return None
+
+        return self._cache.get_key(changelog_path, package_name, baseline_date.isoformat(), baseline_version,
+                                   self._get_replacements_key(replacements))
+
+    def _get_arguments(self, package_name, baseline_date, replacements):
+        return (self._raw_input, package_name, baseline_date,
+                self._package_index.get_baseline_version(package_name), replacements)
+
+    @staticmethod
+    def _get_key(package_name, baseline_date, replacements):
+        return package_name, baseline_date, ChangelogExtractor._get_replacements_key(replacements)
+
+    @staticmethod
+    def _get_replacements_key(replacements):
+        return tuple((replacement.get('pattern', ''), replacement.get('replacement', ''))
+                     for replacement in replacements)
@@ -18,23 +18,106 @@
 #
 # You should have received a copy of the GNU Lesser General Public License
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
+import importlib
 from edi.lib.helpers import FatalError
 
 _command_anchor = "edicommand"
 
 _command_registry = {}
 
+# Static manifest of all built-in commands: the command module gets imported
+# only once the command is needed (fast startup of edi and its shell completion).
+_command_manifest = {
+    "edicommand.clean": ("edi.commands.clean", "clean all intermediate results"),
+    "edicommand.config": ("edi.commands.config", "run configuration related operations"),
+    "edicommand.config.clean": ("edi.commands.configcommands.configclean",
+                                "clean all intermediate configuration items"),
+    "edicommand.config.init": ("edi.commands.configcommands.configinit",
+                               "initialize a configuration within an empty folder"),
+    "edicommand.image": ("edi.commands.image", "handle edi images"),
+    "edicommand.image.bootstrap": ("edi.commands.imagecommands.bootstrap", "bootstrap an initial image"),
+    "edicommand.image.create": ("edi.commands.imagecommands.create", "create a re-distributable image"),
+    "edicommand.image.clean": ("edi.commands.imagecommands.imageclean", "clean all intermediate images"),
+    "edicommand.lxc": ("edi.commands.lxc", "run lxc related operations"),
+    "edicommand.lxc.profile": ("edi.commands.lxccommands.profile", "create the LXD container profiles"),
+    "edicommand.lxc.prepare": ("edi.commands.lxccommands.lxcprepare", "upgrade a bootstrap image to a lxc image"),
+    "edicommand.lxc.import": ("edi.commands.lxccommands.importcmd", "import an image into the LXD image store"),
+    "edicommand.lxc.launch": ("edi.commands.lxccommands.launch", "launch an image using LXC"),
+    "edicommand.lxc.configure": ("edi.commands.lxccommands.lxcconfigure", "configure a LXC container"),
+    "edicommand.lxc.stop": ("edi.commands.lxccommands.stop", "stop a running lxc container"),
+    "edicommand.lxc.publish": ("edi.commands.lxccommands.publish", "publish a container within the LXD image store"),
+    "edicommand.lxc.export": ("edi.commands.lxccommands.export", "export an image from the LXD image store"),
+    "edicommand.lxc.clean": ("edi.commands.lxccommands.lxcclean", "clean all intermediate lxc items"),
+    "edicommand.target": ("edi.commands.target", "run target related operations"),
+    "edicommand.target.configure": ("edi.commands.targetcommands.targetconfigure",
+                                    "(re)configure an edi target system"),
+    "edicommand.version": ("edi.commands.version", "print the program version"),
+    "edicommand.documentation": ("edi.commands.documentation", "run documentation related operations"),
+    "edicommand.documentation.render": ("edi.commands.documentationcommands.render",
+                                        "render the project documentation"),
+    "edicommand.project": ("edi.commands.project", "handle edi projects"),
+    "edicommand.project.prepare": ("edi.commands.projectcommands.prepare", "prepare an edi project configuration"),
+    "edicommand.project.configure": ("edi.commands.projectcommands.configure",
+                                     "configure a project container using Ansible playbook(s)"),
+    "edicommand.project.make": ("edi.commands.projectcommands.make", "make an edi project configuration"),
+    "edicommand.project.clean": ("edi.commands.projectcommands.clean", "clean all intermediate project artifacts"),
+}
+
+
+def _is_direct_sub_command(command, parent_command):
+    return (command.startswith("{}.".format(parent_command)) and
+            len(command.split(".")) == len(parent_command.split(".")) + 1)
+
+
+def _get_manifest_index(command):
+    try:
+        return list(_command_manifest).index(command)
+    except ValueError:
+        return len(_command_manifest)
+
+
+def get_full_command_name(short_name, parent_command=_command_anchor):
+    return "{}.{}".format(parent_command, short_name)
+
+
+def get_short_command_name(command):
+    return command.split(".")[-1]
+
+
+def get_command_help(command):
+    """
+    Get the help string of a command without importing the command module.
+    """
+    return _command_manifest[command][1]
+
+
+def get_sub_command_names(parent_command=_command_anchor):
+    """
+    Get the names of the direct sub commands without importing the command modules.
+    """
+    return [k for k in _command_manifest if _is_direct_sub_command(k, parent_command)]
+
+
+def load_command(command):
+    """
+    Import the module of a command that is listed within the manifest (if not done yet).
+    """
+    if command not in _command_registry and command in _command_manifest:
+        importlib.import_module(_command_manifest[command][0])
+
 
 def get_command(command):
+    load_command(command)
     return _command_registry.get(command)
 
 
 def get_sub_commands(parent_command=_command_anchor):
-    level = len(parent_command.split("."))
-    sub_command_prefix = "{}.".format(parent_command)
-    return {k: v for (k, v) in _command_registry.items()
-            if k.startswith(sub_command_prefix)
-            if len(k.split(".")) == level + 1}
+    for command in get_sub_command_names(parent_command):
+        load_command(command)
+
+    sub_commands = sorted((k for k in _command_registry if _is_direct_sub_command(k, parent_command)),
+                          key=_get_manifest_index)
+    return {k: _command_registry[k] for k in sub_commands}
 
 
 class CommandFactory(type):
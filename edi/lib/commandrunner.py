@@ -23,18 +23,22 @@ import os
 import logging
 import tempfile
 import yaml
-import jinja2
 import stat
+import subprocess
 from codecs import open
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from edi.lib.buildahhelpers import run_buildah_unshare
 from edi.lib.artifact import ArtifactType, Artifact
+from edi.lib.artifactcache import ArtifactCache, get_fingerprint
+from edi.lib.profiler import profiled_stage
 from edi.lib.helpers import (chown_to_user, FatalError, get_workdir, get_artifact_dir,
                              create_artifact_dir, print_success)
-from edi.lib.shellhelpers import run, safely_remove_artifacts_folder
+from edi.lib.shellhelpers import run, safely_remove_artifacts_folder, step_log, create_step_log_file
 from edi.lib.configurationparser import remove_passwords
 from edi.lib.yamlhelpers import LiteralString
+from edi.lib.templateengine import TemplateEngine
 from edi.lib.podmanhelpers import is_image_existing, try_delete_image, untag_image
 
 Command = namedtuple("Command", "script_name, script_content, node_name, resolved_template_path, "
@@ -81,28 +85,156 @@ class CommandRunner:
         create_artifact_dir()
 
         commands = self._get_commands()
+        dependencies = self._get_dependencies(commands)
+        cache = ArtifactCache(max_versions=self.config.get_artifact_cache_versions())
+        fingerprints = self._get_fingerprints(commands, dependencies, cache)
+        max_parallel_commands = self.config.get_max_parallel_commands()
+
+        pending = [command.node_name for command in self._get_execution_order(commands, dependencies)]
+        completed = set()
+        running = dict()
+        failure = None
+
+        with ThreadPoolExecutor(max_workers=max_parallel_commands) as executor:
+            while True:
+                if failure is None:
+                    self._start_ready_commands(commands, dependencies, fingerprints, cache, executor, workdir,
+                                               max_parallel_commands, pending, completed, running)
+
+                if not running:
+                    break
+
+                finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    command = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as error:
+                        if failure is None:
+                            failure = error
+                            if pending:
+                                logging.error(("Command '{}' failed, cancelling the pending commands {} "
+                                               "(the running commands get completed)."
+                                               ).format(command.node_name, ', '.join(pending)))
+                    else:
+                        cache.store(fingerprints[command.node_name], list(command.output_artifacts.values()))
+                        completed.add(command.node_name)
+
+        if failure is not None:
+            raise failure
 
-        for command in commands:
-            if self._are_all_artifacts_available(command.output_artifacts):
-                logging.info(('''Artifacts for command '{}' are already there. '''
-                              '''Delete them to regenerate them.'''
-                              ).format(command.node_name))
-            else:
-                with tempfile.TemporaryDirectory(dir=workdir) as tmpdir:
-                    chown_to_user(tmpdir)
-                    require_root = command.config_node.get('require_root', False)
-
-                    logging.info(("Running command {} located in "
-                                  "{} with dictionary:\n{}"
-                                  ).format(command.node_name, command.resolved_template_path,
-                                           yaml.dump(remove_passwords(command.node_dictionary),
-                                                     default_flow_style=False)))
+        return self._result(commands)
 
-                    command_file = self._flush_command_file(tmpdir, command.script_name, command.script_content)
+    def _start_ready_commands(self, commands, dependencies, fingerprints, cache, executor, workdir,
+                              max_parallel_commands, pending, completed, running):
+        progress = True
+        while progress:
+            progress = False
+            for command in commands:
+                if len(running) >= max_parallel_commands:
+                    return
+
+                if command.node_name not in pending or not dependencies[command.node_name] <= completed:
+                    continue
+
+                pending.remove(command.node_name)
+                progress = True
+                output_artifacts = list(command.output_artifacts.values())
+                if (cache.restore(fingerprints[command.node_name], output_artifacts) and
+                        self._are_all_artifacts_available(command.output_artifacts)):
+                    logging.info('''Artifacts for command '{}' are already there and up to date. '''
+                                 '''Clean them to regenerate them.'''.format(command.node_name))
+                    completed.add(command.node_name)
+                else:
+                    # outdated artifacts must not get modified in place (they might be cached)
+                    self._remove_artifacts(command)
+                    log_file = create_step_log_file(self._get_step_name(command)) if max_parallel_commands > 1 else None
+                    running[executor.submit(self._execute_command, command, workdir, log_file)] = command
+
+    def _execute_command(self, command, workdir, log_file):
+        with profiled_stage(command.node_name, self.config_section), \
+                tempfile.TemporaryDirectory(dir=workdir) as tmpdir:
+            chown_to_user(tmpdir)
+            require_root = command.config_node.get('require_root', False)
+
+            logging.info(("Running command {} located in "
+                          "{} with dictionary:\n{}"
+                          ).format(command.node_name, command.resolved_template_path,
+                                   yaml.dump(remove_passwords(command.node_dictionary),
+                                             default_flow_style=False)))
+
+            command_file = self._flush_command_file(tmpdir, command.script_name, command.script_content)
+            if log_file:
+                logging.info("The output of command {} gets written to '{}'.".format(command.node_name, log_file))
+                with open(log_file, mode='w') as log:
+                    try:
+                        self._run_command(command_file, require_root, stdout=log, stderr=subprocess.STDOUT)
+                    except subprocess.CalledProcessError as error:
+                        raise FatalError(("The command '{}' failed with return code {} (see '{}')."
+                                          ).format(command.node_name, error.returncode, log_file))
+            else:
+                with step_log(self._get_step_name(command)):
                     self._run_command(command_file, require_root)
-                    self._post_process_artifacts(command.node_name, command.output_artifacts)
+            self._post_process_artifacts(command.node_name, command.output_artifacts)
+
+    def _get_step_name(self, command):
+        return '{}_{}'.format(self.config_section, command.node_name)
+
+    def _get_dependencies(self, commands):
+        """
+        Determine the commands that each command depends upon: A command either explicitly lists them
+        using depends_on or it implicitly depends upon all preceding commands whose output artifacts
+        it refers to.
+        """
+        command_names = [command.node_name for command in commands]
+        configured_names = self.config.get_config().get(self.config_section, {}).keys()
+        dependencies = dict()
+        for index, command in enumerate(commands):
+            depends_on = command.config_node.get('depends_on')
+            if depends_on is None:
+                dependencies[command.node_name] = {
+                    preceding_command.node_name for preceding_command in commands[:index]
+                    if any(artifact.location in command.script_content
+                           for artifact in preceding_command.output_artifacts.values())}
+                continue
+
+            if type(depends_on) is str:
+                depends_on = [depends_on]
+            if type(depends_on) is not list:
+                raise FatalError('''The depends_on specification in command node '{}' is not a list.'''
+                                 .format(command.node_name))
+
+            for dependency in depends_on:
+                if dependency not in configured_names or dependency == command.node_name:
+                    raise FatalError('''The command node '{}' depends on an invalid command node '{}'.'''
+                                     .format(command.node_name, dependency))
+
+            # skipped commands are not taken into account
+            dependencies[command.node_name] = {dependency for dependency in depends_on
+                                               if dependency in command_names}
+
+        return dependencies
 
-        return self._result(commands)
+    @staticmethod
+    def _get_execution_order(commands, dependencies):
+        """
+        Sort the commands topologically (keeping the configured order wherever possible).
+        """
+        ordered_commands = []
+        ordered_names = set()
+        remaining_commands = commands.copy()
+        while remaining_commands:
+            ready_commands = [command for command in remaining_commands
+                              if dependencies[command.node_name] <= ordered_names]
+            if not ready_commands:
+                raise FatalError('''The command nodes {} have circular dependencies.'''
+                                 .format(', '.join(command.node_name for command in remaining_commands)))
+
+            ordered_commands.append(ready_commands[0])
+            ordered_names.add(ready_commands[0].node_name)
+            remaining_commands.remove(ready_commands[0])
+
+        return ordered_commands
 
     def require_real_root(self):
         commands = self._get_commands()
@@ -150,48 +282,75 @@ class CommandRunner:
 
     def clean(self):
         commands = self._get_commands()
+        cache = ArtifactCache()
         for command in commands:
-            for _, artifact in command.output_artifacts.items():
-                if artifact.type is ArtifactType.PATH:
-                    if not str(get_workdir()) in str(artifact.location):
-                        raise FatalError(('Output artifact {} is not within the current working directory!'
-                                          ).format(artifact.location))
-
-                    if os.path.isfile(artifact.location):
-                        logging.info("Removing '{}'.".format(artifact.location))
-                        os.remove(artifact.location)
-                        print_success("Removed image file artifact {}.".format(artifact.location))
-                    elif os.path.isdir(artifact.location):
-                        safely_remove_artifacts_folder(artifact.location,
-                                                       sudo=self._require_real_root(
-                                                           command.config_node.get('require_root', False)))
-                        print_success("Removed image directory artifact {}.".format(artifact.location))
-                elif artifact.type in [ArtifactType.PODMAN_IMAGE, ArtifactType.PODMAN_IMAGE_ROOT]:
-                    image_name = artifact.location
-                    require_sudo = artifact.type is ArtifactType.PODMAN_IMAGE_ROOT
-                    if is_image_existing(image_name, sudo=require_sudo):
-                        if try_delete_image(image_name, sudo=require_sudo):
-                            print_success(f"Removed podman image {artifact.location}.")
-                        else:
-                            logging.info(f"Podman image '{artifact.location}' is still in use, going to untag it.")
-                            untag_image(image_name, sudo=require_sudo)
-                            print_success(f"Untagged podman image {artifact.location}.")
-                else:
-                    raise FatalError(f"Unhandled removal of artifact type '{artifact.type}'.")
+            self._remove_artifacts(command)
+            cache.forget(list(command.output_artifacts.values()))
+
+    def _get_fingerprints(self, commands, dependencies, cache):
+        """
+        Compute the fingerprint of each command based upon its rendered content, its configuration node,
+        the input artifacts and the fingerprints of the commands it depends upon.
+        Unless a command explicitly lists its dependencies, it gets invalidated by any preceding command
+        (an artifact might also get used without referring to its location).
+        """
+        input_digests = {artifact.name: cache.get_digest(artifact) for artifact in self._input_artifacts}
+        fingerprints = dict()
+        ordered_commands = self._get_execution_order(commands, dependencies)
+        for index, command in enumerate(ordered_commands):
+            if command.config_node.get('depends_on') is None:
+                invalidating_commands = [preceding_command.node_name for preceding_command in ordered_commands[:index]]
+            else:
+                invalidating_commands = dependencies[command.node_name]
+            dependency_fingerprints = sorted(fingerprints[dependency] for dependency in invalidating_commands)
+            fingerprints[command.node_name] = get_fingerprint(self.config_section, command.node_name,
+                                                              command.script_content, command.config_node,
+                                                              input_digests, dependency_fingerprints)
+
+        return fingerprints
+
+    def _remove_artifacts(self, command):
+        for _, artifact in command.output_artifacts.items():
+            if artifact.type is ArtifactType.PATH:
+                if not str(get_workdir()) in str(artifact.location):
+                    raise FatalError(('Output artifact {} is not within the current working directory!'
+                                      ).format(artifact.location))
+
+                if os.path.isfile(artifact.location):
+                    logging.info("Removing '{}'.".format(artifact.location))
+                    os.remove(artifact.location)
+                    print_success("Removed image file artifact {}.".format(artifact.location))
+                elif os.path.isdir(artifact.location):
+                    safely_remove_artifacts_folder(artifact.location,
+                                                   sudo=self._require_real_root(
+                                                       command.config_node.get('require_root', False)))
+                    print_success("Removed image directory artifact {}.".format(artifact.location))
+            elif artifact.type in [ArtifactType.PODMAN_IMAGE, ArtifactType.PODMAN_IMAGE_ROOT]:
+                image_name = artifact.location
+                require_sudo = artifact.type is ArtifactType.PODMAN_IMAGE_ROOT
+                if is_image_existing(image_name, sudo=require_sudo):
+                    if try_delete_image(image_name, sudo=require_sudo):
+                        print_success(f"Removed podman image {artifact.location}.")
+                    else:
+                        logging.info(f"Podman image '{artifact.location}' is still in use, going to untag it.")
+                        untag_image(image_name, sudo=require_sudo)
+                        print_success(f"Untagged podman image {artifact.location}.")
+            else:
+                raise FatalError(f"Unhandled removal of artifact type '{artifact.type}'.")
 
     def result(self):
         commands = self._get_commands()
         return self._result(commands)
 
-    def _run_command(self, command_file, require_root):
+    def _run_command(self, command_file, require_root, **kwargs):
         if require_root == 'fakeroot':
             cmd = ['fakeroot', '--', 'sh', '-c', command_file]
-            run(cmd, log_threshold=logging.INFO)
+            run(cmd, log_threshold=logging.INFO, **kwargs)
         elif require_root == 'unshare':
-            run_buildah_unshare(self.get_project_container_name(), command_file)
+            run_buildah_unshare(self.get_project_container_name(), command_file, **kwargs)
         else:
             cmd = ['sh', '-c', command_file]
-            run(cmd, log_threshold=logging.INFO, sudo=CommandRunner._require_real_root(require_root))
+            run(cmd, log_threshold=logging.INFO, sudo=CommandRunner._require_real_root(require_root), **kwargs)
 
     def _get_commands(self):
         commands = self.config.get_ordered_path_items(self.config_section)
@@ -304,9 +463,7 @@ class CommandRunner:
 
     @staticmethod
     def _render_command_file(input_file, dictionary):
-        with open(input_file, encoding="UTF-8", mode="r") as template_file:
-            template = jinja2.Template(template_file.read())
-            result = template.render(dictionary)
+        result = TemplateEngine().render_file(input_file, dictionary)
 
         filename = os.path.basename(input_file)
         return filename, result
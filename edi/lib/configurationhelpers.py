@@ -20,7 +20,6 @@
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import jinja2
 import yaml
 from codecs import open
 from edi.lib.helpers import FatalError, get_edi_plugin_directory
@@ -108,6 +107,7 @@ class ConfigurationTemplate():
 
     @staticmethod
     def _render_jinja2(path, **kwargs):
+        import jinja2
         dictionary = kwargs
         with open(path, encoding="UTF-8", mode="r") as template_file:
             template = jinja2.Template(template_file.read(), trim_blocks=True, lstrip_blocks=True)
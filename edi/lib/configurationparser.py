@@ -23,21 +23,23 @@ import yaml
 import collections
 import copy
 import hashlib
-from jinja2 import Template
 import os
 from contextlib import contextmanager
 from os.path import dirname, abspath, basename, splitext, isfile, join
 import logging
+from pwd import getpwnam
 from edi.lib.helpers import (get_user, get_user_group, get_user_gid, get_user_uid, get_workdir,
-                             get_hostname, get_edi_plugin_directory, FatalError)
+                             get_hostname, get_edi_plugin_directory, get_artifact_dir, chown_to_user,
+                             which, FatalError)
 from edi.lib.proxyhelpers import ProxySetup
 from edi.lib.sshkeyhelpers import get_user_ssh_pub_keys
 from edi.lib.versionhelpers import get_edi_version, get_stripped_version
 from edi.lib.shellhelpers import get_user_home_directory, get_current_display, get_debian_architecture
 from edi.lib.lxchelpers import get_lxd_version
-from packaging.version import Version
 from edi.lib.urlhelpers import obfuscate_url_password
 from edi.lib.yamlhelpers import annotated_yaml_load
+from edi.lib.templateengine import TemplateEngine
+from edi.lib.archivehelpers import get_supported_compressions
 
 
 def remove_passwords(dictionary):
@@ -55,28 +57,215 @@ def remove_passwords(dictionary):
     return obfuscated_dictionary
 
 
+class HostFacts:
+    """
+    Caches the host specific facts of the load time dictionary.
+
+    Gathering these facts requires several subprocesses (ssh, lxd, dpkg, gsettings, ...).
+    The facts are memoized per process and can optionally be persisted to a cache file
+    within the artifacts directory. The cache is keyed on all the inputs that affect the facts.
+    The proxy settings might contain credentials and therefore never get persisted.
+    """
+    _cache = dict()
+    _persisted = set()
+    _cache_file_name = '.edi_host_facts.yml'
+    _max_persisted_entries = 4
+
+    _environment_variables = ['USER', 'SUDO_USER', 'PATH', 'DISPLAY',
+                              'http_proxy', 'https_proxy', 'ftp_proxy', 'all_proxy', 'no_proxy',
+                              'HTTP_PROXY', 'HTTPS_PROXY', 'FTP_PROXY', 'ALL_PROXY', 'NO_PROXY']
+    _executables = ['ssh', 'lxd', 'dpkg', 'gsettings']
+    _system_files = [os.path.join(os.sep, 'etc', 'passwd'), os.path.join(os.sep, 'etc', 'ssh', 'ssh_config')]
+    _user_files = ['.ssh', os.path.join('.ssh', 'config'), os.path.join('.config', 'dconf', 'user')]
+    _proxy_facts = ['edi_host_http_proxy', 'edi_host_https_proxy', 'edi_host_ftp_proxy', 'edi_host_socks_proxy',
+                    'edi_host_no_proxy']
+
+    def __init__(self, clear_cache=False):
+        if clear_cache:
+            HostFacts._cache = dict()
+            HostFacts._persisted = set()
+
+    def get(self, config_type=1, persist=False):
+        """
+        Get the host facts.
+        :param config_type: The configuration type (the lxd version is only gathered for type 1).
+        :param persist: If True, the facts get read from or written to the cache file.
+        :return: A dictionary containing the host facts.
+        """
+        fingerprint = self._get_fingerprint(config_type)
+
+        facts = HostFacts._cache.get(fingerprint)
+
+        if facts is None and persist:
+            facts = self._read_cache_file().get(fingerprint)
+            if facts is not None:
+                logging.debug("Retrieved host facts from '{}'.".format(self._get_cache_file()))
+                facts.update(self._gather_proxy_facts())
+                HostFacts._persisted.add(fingerprint)
+
+        if facts is None:
+            facts = self._gather(config_type)
+
+        if persist and fingerprint not in HostFacts._persisted:
+            self._write_cache_file(fingerprint, facts)
+            HostFacts._persisted.add(fingerprint)
+
+        HostFacts._cache[fingerprint] = facts
+        return copy.deepcopy(facts)
+
+    @staticmethod
+    def _gather(config_type):
+        facts = dict()
+        facts["edi_current_user_ssh_pub_keys"] = get_user_ssh_pub_keys()
+        facts["edi_current_user_host_home_directory"] = get_user_home_directory(get_user())
+        facts.update(HostFacts._gather_proxy_facts())
+        if config_type == 1:
+            facts["edi_lxd_version"] = get_lxd_version()
+        facts["edi_current_display"] = get_current_display()
+        facts["edi_host_architecture"] = get_debian_architecture()
+        return facts
+
+    @staticmethod
+    def _gather_proxy_facts():
+        facts = dict()
+        proxy_setup = ProxySetup()
+        facts["edi_host_http_proxy"] = proxy_setup.get('http_proxy', default='')
+        facts["edi_host_https_proxy"] = proxy_setup.get('https_proxy', default='')
+        facts["edi_host_ftp_proxy"] = proxy_setup.get('ftp_proxy', default='')
+        facts["edi_host_socks_proxy"] = proxy_setup.get('all_proxy', default='')
+        facts["edi_host_no_proxy"] = proxy_setup.get('no_proxy', default='')
+        return facts
+
+    @classmethod
+    def _get_fingerprint(cls, config_type):
+        def get_mtime(path):
+            try:
+                return os.stat(path).st_mtime_ns
+            except OSError:
+                return None
+
+        def get_revision(path):
+            # a snap application is a symlink to the snap binary: use the revision of the snap instead
+            if os.path.basename(os.path.realpath(path)) == 'snap':
+                try:
+                    return os.readlink(os.path.join(os.sep, 'snap', os.path.basename(path), 'current'))
+                except OSError:
+                    return None
+            return get_mtime(path)
+
+        user = get_user()
+        try:
+            user_home = getpwnam(user).pw_dir
+        except KeyError:
+            user_home = ''
+
+        inputs = dict()
+        inputs['config_type'] = config_type
+        inputs['uid'] = os.getuid()
+        inputs['user'] = user
+        inputs['hostname'] = get_hostname()
+        inputs['environment'] = {key: os.environ.get(key) for key in cls._environment_variables}
+        executables = dict()
+        for executable in cls._executables:
+            path = which(executable)
+            executables[executable] = (path, get_revision(path) if path else None)
+        inputs['executables'] = executables
+        files = [os.path.join(user_home, f) for f in cls._user_files] + cls._system_files
+        inputs['files'] = {f: get_mtime(f) for f in files}
+        inputs['ssh_keys'] = cls._get_ssh_key_digests(os.path.join(user_home, '.ssh'))
+
+        return hashlib.sha256(yaml.dump(inputs).encode()).hexdigest()
+
+    @staticmethod
+    def _get_ssh_key_digests(ssh_directory):
+        """
+        Get the digests of the public keys and the names of the other files within the ssh directory
+        (a replaced key does not necessarily modify the time stamp of the directory).
+        """
+        try:
+            file_names = sorted(os.listdir(ssh_directory))
+        except OSError:
+            return None
+
+        digests = dict()
+        for file_name in file_names:
+            path = os.path.join(ssh_directory, file_name)
+            digests[file_name] = None
+            if file_name.endswith('.pub') and os.path.isfile(path):
+                try:
+                    with open(path, mode='rb') as f:
+                        digests[file_name] = hashlib.sha256(f.read()).hexdigest()
+                except OSError:
+                    pass
+        return digests
+
+    @classmethod
+    def _get_cache_file(cls):
+        return os.path.join(get_artifact_dir(), cls._cache_file_name)
+
+    @classmethod
+    def _read_cache_file(cls):
+        cache_file = cls._get_cache_file()
+        if not os.path.isfile(cache_file):
+            return dict()
+
+        try:
+            with open(cache_file, encoding='utf-8', mode='r') as f:
+                content = yaml.safe_load(f.read())
+        except (OSError, yaml.YAMLError) as error:
+            logging.warning("Ignoring unreadable host facts cache '{}' ({}).".format(cache_file, error))
+            return dict()
+
+        if not isinstance(content, dict):
+            return dict()
+
+        return content
+
+    @classmethod
+    def _write_cache_file(cls, fingerprint, facts):
+        entries = cls._read_cache_file()
+        entries.pop(fingerprint, None)
+        entries[fingerprint] = facts
+        # also strip the proxy settings from the entries written by a former edi version
+        entries = {key: {name: value for name, value in entry.items() if name not in cls._proxy_facts}
+                   for key, entry in entries.items() if isinstance(entry, dict)}
+        while len(entries) > cls._max_persisted_entries:
+            entries.pop(next(iter(entries)))
+
+        cache_file = cls._get_cache_file()
+        try:
+            if not os.path.isdir(os.path.dirname(cache_file)):
+                os.mkdir(os.path.dirname(cache_file))
+                chown_to_user(os.path.dirname(cache_file))
+            with open(cache_file, encoding='utf-8', mode='w') as f:
+                f.write(yaml.dump(entries, default_flow_style=False))
+            chown_to_user(cache_file)
+        except OSError as error:
+            logging.warning("Failed to write host facts cache '{}' ({}).".format(cache_file, error))
+
+
 def get_base_dictionary(config_type=1):
     base_dict = {}
+    host_facts = HostFacts().get(config_type, persist=ConfigurationParser.cache_host_facts())
     current_user_name = get_user()
     base_dict["edi_current_user_name"] = current_user_name
     base_dict["edi_current_user_group_name"] = get_user_group()
-    base_dict["edi_current_user_ssh_pub_keys"] = get_user_ssh_pub_keys()
+    base_dict["edi_current_user_ssh_pub_keys"] = host_facts["edi_current_user_ssh_pub_keys"]
     base_dict["edi_current_user_uid"] = get_user_uid()
     base_dict["edi_current_user_gid"] = get_user_gid()
-    base_dict["edi_current_user_host_home_directory"] = get_user_home_directory(current_user_name)
+    base_dict["edi_current_user_host_home_directory"] = host_facts["edi_current_user_host_home_directory"]
     base_dict["edi_current_user_target_home_directory"] = "/home/{}".format(current_user_name)
     base_dict["edi_host_hostname"] = get_hostname()
     base_dict["edi_edi_plugin_directory"] = get_edi_plugin_directory()
-    proxy_setup = ProxySetup()
-    base_dict["edi_host_http_proxy"] = proxy_setup.get('http_proxy', default='')
-    base_dict["edi_host_https_proxy"] = proxy_setup.get('https_proxy', default='')
-    base_dict["edi_host_ftp_proxy"] = proxy_setup.get('ftp_proxy', default='')
-    base_dict["edi_host_socks_proxy"] = proxy_setup.get('all_proxy', default='')
-    base_dict["edi_host_no_proxy"] = proxy_setup.get('no_proxy', default='')
+    base_dict["edi_host_http_proxy"] = host_facts["edi_host_http_proxy"]
+    base_dict["edi_host_https_proxy"] = host_facts["edi_host_https_proxy"]
+    base_dict["edi_host_ftp_proxy"] = host_facts["edi_host_ftp_proxy"]
+    base_dict["edi_host_socks_proxy"] = host_facts["edi_host_socks_proxy"]
+    base_dict["edi_host_no_proxy"] = host_facts["edi_host_no_proxy"]
     base_dict["edi_edi_version"] = get_edi_version()
     if config_type == 1:
-        base_dict["edi_lxd_version"] = get_lxd_version()
-    base_dict["edi_current_display"] = get_current_display()
+        base_dict["edi_lxd_version"] = host_facts["edi_lxd_version"]
+    base_dict["edi_current_display"] = host_facts["edi_current_display"]
     return base_dict
 
 
@@ -101,6 +290,7 @@ class ConfigurationParser:
         'edi_configure_remote_target': False,
         'edi_debug_mode': False,
         'edi_start_at_task': "",
+        'edi_cache_host_facts': False,
     }
 
     @staticmethod
@@ -119,6 +309,10 @@ class ConfigurationParser:
     def get_start_task():
         return ConfigurationParser.command_context.get('edi_start_at_task')
 
+    @staticmethod
+    def cache_host_facts():
+        return ConfigurationParser.command_context.get('edi_cache_host_facts')
+
     def get_context_suffix(self):
         if self.create_distributable_image():
             return '_di'
@@ -190,7 +384,23 @@ class ConfigurationParser:
         return self._get_bootstrap_item("additional_packages", default_packages)
 
     def get_compression(self):
-        return self._get_general_item("edi_compression", "xz")
+        compression = self._get_general_item("edi_compression", "xz")
+        if compression not in get_supported_compressions():
+            raise FatalError(('''The value of 'edi_compression' must be one of {}.'''
+                              ).format(', '.join(get_supported_compressions())))
+        return compression
+
+    def get_compression_threads(self):
+        threads = self._get_general_item("edi_compression_threads", 0)
+        if type(threads) is not int or threads < 0:
+            raise FatalError('''The value of 'edi_compression_threads' must be a non negative integer.''')
+        return threads
+
+    def get_compression_level(self):
+        level = self._get_general_item("edi_compression_level", None)
+        if level is not None and type(level) is not int:
+            raise FatalError('''The value of 'edi_compression_level' must be an integer.''')
+        return level
 
     def get_lxc_stop_timeout(self):
         timeout = self._get_general_item("edi_lxc_stop_timeout", 120)
@@ -198,6 +408,101 @@ class ConfigurationParser:
             raise FatalError('''The value of 'edi_lxc_stop_timeout' must be an integer.''')
         return timeout
 
+    def get_artifact_cache_versions(self):
+        versions = self._get_general_item("edi_artifact_cache_versions", 4)
+        if type(versions) is not int or versions < 0:
+            raise FatalError('''The value of 'edi_artifact_cache_versions' must be a non negative integer.''')
+        return versions
+
+    def get_bootstrap_cache_size(self):
+        cache_size = self._get_general_item("edi_bootstrap_cache_size", 0)
+        if type(cache_size) is not int or cache_size < 0:
+            raise FatalError('''The value of 'edi_bootstrap_cache_size' must be a non negative integer.''')
+        return cache_size
+
+    def get_max_parallel_commands(self):
+        max_parallel_commands = self._get_general_item("edi_max_parallel_commands", 1)
+        if type(max_parallel_commands) is not int or max_parallel_commands < 1:
+            raise FatalError('''The value of 'edi_max_parallel_commands' must be a positive integer.''')
+        return max_parallel_commands
+
+    def get_doc_changelog_workers(self):
+        workers = self._get_general_item("edi_doc_changelog_workers", 0)
+        if type(workers) is not int or workers < 0:
+            raise FatalError('''The value of 'edi_doc_changelog_workers' must be a non negative integer.''')
+        return workers
+
+    def get_doc_changelog_cache_size(self):
+        cache_size = self._get_general_item("edi_doc_changelog_cache_size", 100)
+        if type(cache_size) is not int or cache_size < 0:
+            raise FatalError('''The value of 'edi_doc_changelog_cache_size' must be a non negative integer.''')
+        return cache_size
+
+    def get_doc_max_parallel_steps(self):
+        max_parallel_steps = self._get_general_item("edi_doc_max_parallel_steps", 0)
+        if type(max_parallel_steps) is not int or max_parallel_steps < 0:
+            raise FatalError('''The value of 'edi_doc_max_parallel_steps' must be a non negative integer.''')
+        return max_parallel_steps
+
+    def get_aggregate_playbooks(self):
+        aggregate_playbooks = self._get_general_item("edi_aggregate_playbooks", False)
+        if type(aggregate_playbooks) is not bool:
+            raise FatalError('''The value of 'edi_aggregate_playbooks' must be a boolean.''')
+        return aggregate_playbooks
+
+    def get_ansible_config(self):
+        """
+        Get the settings that override the ansible.cfg generated by edi.
+        :return: A dictionary of sections containing the overridden settings or None if the generation is disabled.
+        """
+        ansible_config = self._get_general_item("edi_ansible_config", False)
+        if ansible_config is True:
+            return {}
+        elif ansible_config is False:
+            return None
+
+        if (not isinstance(ansible_config, dict) or
+                not all(isinstance(section, dict) for section in ansible_config.values())):
+            raise FatalError(('''The value of 'edi_ansible_config' must be a boolean or a dictionary '''
+                              '''of sections containing key value pairs.'''))
+        return ansible_config
+
+    def get_buildah_connection(self):
+        buildah_connection = self._get_general_item("edi_buildah_connection", "buildah")
+        if buildah_connection not in ["buildah", "chroot"]:
+            raise FatalError('''The value of 'edi_buildah_connection' must be either 'buildah' or 'chroot'.''')
+        return buildah_connection
+
+    def get_project_layer_cache(self):
+        layer_cache = self._get_general_item("edi_project_layer_cache", False)
+        if type(layer_cache) is not bool:
+            raise FatalError('''The value of 'edi_project_layer_cache' must be a boolean.''')
+        if layer_cache and self.get_aggregate_playbooks():
+            raise FatalError(("The settings 'edi_project_layer_cache' and 'edi_aggregate_playbooks' can not be "
+                              "combined (a layer gets committed after each separately executed playbook)."))
+        return layer_cache
+
+    def get_lxd_rest_api(self):
+        rest_api = self._get_general_item("edi_lxd_rest_api", True)
+        if type(rest_api) is not bool:
+            raise FatalError('''The value of 'edi_lxd_rest_api' must be a boolean.''')
+        return rest_api
+
+    def get_lxc_max_snapshots(self):
+        max_snapshots = self._get_general_item("edi_lxc_max_snapshots", 0)
+        if type(max_snapshots) is not int or max_snapshots < 0:
+            raise FatalError('''The value of 'edi_lxc_max_snapshots' must be a non negative integer.''')
+        if max_snapshots and self.get_aggregate_playbooks():
+            raise FatalError(("The settings 'edi_lxc_max_snapshots' and 'edi_aggregate_playbooks' can not be "
+                              "combined (a snapshot gets taken after each separately executed playbook)."))
+        return max_snapshots
+
+    def get_lxc_split_image(self):
+        split_image = self._get_general_item("edi_lxc_split_image", False)
+        if type(split_image) is not bool:
+            raise FatalError('''The value of 'edi_lxc_split_image' must be a boolean.''')
+        return split_image
+
     def get_lxc_bridge_interface_name(self):
         return self._get_general_item("edi_lxc_bridge_interface_name", "lxdbr0")
 
@@ -283,6 +588,7 @@ class ConfigurationParser:
         return self.base_config_file
 
     def _verify_version_compatibility(self):
+        from packaging.version import Version
         current_version = get_edi_version()
         required_version = str(self._get_general_item('edi_required_minimal_edi_version', current_version))
         if Version(get_stripped_version(current_version)) < Version(get_stripped_version(required_version)):
@@ -294,8 +600,10 @@ class ConfigurationParser:
         return ConfigurationParser._configurations.get(self.config_id, {})
 
     def _parse_jina2_file(self, config_file):
-        template = Template(config_file.read())
-        return template.render(self._get_load_time_dictionary())
+        if os.path.isfile(config_file.name):
+            return TemplateEngine().render_file(config_file.name, self._get_load_time_dictionary())
+        else:
+            return TemplateEngine().render_string(config_file.read(), self._get_load_time_dictionary())
 
     def _get_base_config(self, config_file):
         return annotated_yaml_load(self._parse_jina2_file(config_file), config_file.name) or {}
@@ -389,7 +697,8 @@ class ConfigurationParser:
         load_dict["edi_project_plugin_directory"] = self.get_project_plugin_directory()
         load_dict['edi_log_level'] = logging.getLevelName(logging.getLogger().getEffectiveLevel())
         load_dict['edi_configuration_name'] = self.get_configuration_name()
-        load_dict['edi_host_architecture'] = get_debian_architecture()
+        load_dict['edi_host_architecture'] = HostFacts().get(
+            self.config_type, persist=self.cache_host_facts())['edi_host_architecture']
         load_dict.update(ConfigurationParser.command_context)
         return load_dict
 
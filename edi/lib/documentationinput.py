@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import posixpath
+import shutil
+import tarfile
+import tempfile
+import uuid
+from contextlib import contextmanager
+from edi.lib.artifact import Artifact, ArtifactType
+from edi.lib.helpers import FatalError, chown_to_user, get_workdir
+from edi.lib.archivehelpers import open_tar_stream
+
+
+_documentation_directory = 'usr/share/doc'
+_build_setup_files = ['build.yml', 'packages.yml', 'packages-baseline.yml']
+_changelog_files = ['changelog.Debian.gz', 'changelog.gz']
+_container_types = [ArtifactType.BUILDAH_CONTAINER, ArtifactType.PODMAN_IMAGE]
+
+
+def parse_raw_input(raw_input):
+    """
+    Split the raw input of the documentation into its type and its location.
+    Containers and images are specified as buildah-container:NAME or podman-image:NAME.
+    :return: A tuple (ArtifactType, location).
+    """
+    if not os.path.exists(raw_input):
+        for artifact_type in _container_types:
+            prefix = '{}:'.format(artifact_type.value)
+            if raw_input.startswith(prefix) and len(raw_input) > len(prefix):
+                return artifact_type, raw_input[len(prefix):]
+
+    return ArtifactType.PATH, raw_input
+
+
+@contextmanager
+def documentation_input(raw_input):
+    """
+    Provide the raw input of the documentation (the content of /usr/share/doc) as a directory.
+
+    The raw input can be a directory, a (compressed) root file system archive, a buildah container
+    or a podman image. The files needed by the documentation steps (edi/*.yml and the changelogs)
+    of an archive, a container or an image get extracted into a temporary directory.
+    """
+    artifact_type, location = parse_raw_input(raw_input)
+    if artifact_type == ArtifactType.PATH and os.path.isdir(location):
+        yield location
+        return
+
+    with tempfile.TemporaryDirectory(dir=get_workdir()) as tempdir:
+        if artifact_type == ArtifactType.PATH:
+            archive = location
+        else:
+            # the archive gets written by the current user
+            chown_to_user(tempdir)
+            archive = os.path.join(tempdir, 'documentation.tar')
+            _archive_container_documentation(artifact_type, location, archive)
+
+        rootfs = os.path.join(tempdir, 'rootfs')
+        os.mkdir(rootfs)
+        logging.info("Extracting the documentation input from '{}'.".format(raw_input))
+        try:
+            extract_documentation_files(archive, rootfs)
+        except tarfile.TarError as error:
+            raise FatalError("Unable to read the documentation input from '{}':\n{}".format(raw_input, error))
+
+        yield os.path.join(rootfs, _documentation_directory)
+
+
+def extract_documentation_files(archive, target):
+    """
+    Extract the files needed by the documentation steps from a root file system archive.
+
+    The archive gets read within a single pass. Only the members whose names are listed within
+    the member name index get extracted. Symbolic links get recreated below the target directory
+    and links pointing outside of the root file system get skipped.
+    """
+    symbolic_links = []
+    hard_links = []
+    with open_tar_stream(archive) as tar:
+        for member in tar:
+            name = _normalize_member_name(member.name)
+            if not name or not _is_documentation_file(name, member):
+                continue
+
+            if member.isfile():
+                target_file = _prepare_target(target, name)
+                with tar.extractfile(member) as source, open(target_file, mode='wb') as destination:
+                    shutil.copyfileobj(source, destination)
+            elif member.issym():
+                symbolic_links.append((name, member.linkname))
+            elif member.islnk():
+                hard_links.append((name, _normalize_member_name(member.linkname)))
+
+    # links get created after all files got written (no file gets written through a link)
+    for name, link_target in hard_links:
+        if link_target and os.path.isfile(os.path.join(target, link_target)):
+            os.link(os.path.join(target, link_target), _prepare_target(target, name))
+
+    for name, link_target in symbolic_links:
+        _create_symbolic_link(target, name, link_target)
+
+
+def _normalize_member_name(name):
+    normalized_name = posixpath.normpath(name.lstrip('/'))
+    if normalized_name == '.' or normalized_name == '..' or normalized_name.startswith('../'):
+        return None
+    return normalized_name
+
+
+def _is_documentation_file(name, member):
+    prefix = '{}/'.format(_documentation_directory)
+    if not name.startswith(prefix):
+        return False
+
+    parts = name[len(prefix):].split('/')
+    if len(parts) == 1:
+        # documentation directory of a package that links to the one of another package
+        return member.issym()
+    elif len(parts) == 2:
+        return parts[1] in _changelog_files or (parts[0] == 'edi' and parts[1] in _build_setup_files)
+    else:
+        return False
+
+
+def _prepare_target(target, name):
+    target_path = os.path.join(target, name)
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    if os.path.lexists(target_path) and not os.path.isdir(target_path):
+        os.remove(target_path)
+    return target_path
+
+
+def _create_symbolic_link(target, name, link_target):
+    if link_target.startswith('/'):
+        resolved_target = _normalize_member_name(link_target)
+    else:
+        resolved_target = _normalize_member_name(posixpath.join(posixpath.dirname(name), link_target))
+
+    if not resolved_target:
+        logging.debug("Skipping link '{}' that points outside of the root file system.".format(name))
+        return
+
+    link_path = _prepare_target(target, name)
+    os.symlink(os.path.relpath(os.path.join(target, resolved_target), os.path.dirname(link_path)), link_path)
+
+
+def _archive_container_documentation(artifact_type, location, archive):
+    from edi.lib.buildahhelpers import archive_container_files, create_container, delete_container
+
+    find_arguments = ['-mindepth', '1', '-maxdepth', '2',
+                      '(', '-type', 'l',
+                      '-o', '-path', './{}/edi/*.yml'.format(_documentation_directory)]
+    for changelog_file in _changelog_files:
+        find_arguments.extend(['-o', '-name', changelog_file])
+    find_arguments.append(')')
+
+    if artifact_type == ArtifactType.BUILDAH_CONTAINER:
+        archive_container_files(location, _documentation_directory, archive, find_arguments)
+        return
+
+    container_name = 'edi-documentation-{}'.format(uuid.uuid4().hex[:8])
+    create_container(container_name, Artifact(name='documentation_input', location=location, type=artifact_type))
+    try:
+        archive_container_files(container_name, _documentation_directory, archive, find_arguments)
+    finally:
+        delete_container(container_name)
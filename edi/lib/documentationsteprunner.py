@@ -23,92 +23,38 @@ import logging
 import tempfile
 import yaml
 import os
-import re
 import jinja2
 import shutil
 import traceback
-import gzip
-from dateutil import parser
-from debian.changelog import Changelog
-from debian.debian_support import Version
+from concurrent.futures import ProcessPoolExecutor
 from edi.lib.helpers import print_success, FatalError
 from edi.lib.helpers import get_workdir
 from edi.lib.configurationparser import remove_passwords
-
-
-class ChangesAnnotator():
-    def __init__(self, package):
-        self._pattern_lookup = [
-            # level 0: author, empty line or fallback
-            [('author', r'^[ ]{2}\[[ ]*', self._trim_author, []),
-             ('empty_line', r'^$', self._nop, []),
-             ('list_item', r'.*', self._report_parser_warning, [])],
-            # level 1: list item, list item continuation or empty line
-            [('list_item', r'^[ ]{2}[*+-] ', self._trim_list_item, []),
-             ('list_item_continuation', r'^[ ]{2,4}[^[]', self._trim_list_item_continuation,
-              ['list_item', 'list_item_continuation'])],
-            # level 2: sub list item, sub list item continuation or empty line
-            [('sub_list_item', r'^[ ]{3,4}[*+-] ', ChangesAnnotator._trim_list_item, []),
-             ('sub_list_item_continuation', r'^[ ]{5,6}', ChangesAnnotator._trim_list_item_continuation,
-              ['sub_list_item', 'sub_list_item_continuation'])],
-            # level 3: sub sub list item, sub sub list item continuation or empty line
-            [('sub_sub_list_item', r'^[ ]{6}[*+-] ', self._trim_list_item, []),
-             ('sub_sub_list_item_continuation', r'^[ ]{8}', ChangesAnnotator._trim_list_item_continuation,
-              ['sub_sub_list_item', 'sub_sub_list_item_continuation'])],
-            # level 5: sentinel
-            [],
-        ]
-        self._current_level = 0
-        self._package = package
-
-    def annotate(self, changes):
-        annotated_changes = list()
-        self._current_level = 0
-
-        for change in changes:
-            match_found = False
-            for level in range(self._current_level + 1, -1, -1):
-                for annotation, expression, modification, compatibility in self._pattern_lookup[level]:
-                    if re.match(expression, change):
-                        match_found = True
-                        self._current_level = level
-                        current_change = modification(change)
-
-                        if annotated_changes and annotated_changes[-1][0] in compatibility:
-                            previous_annotation, previous_change = annotated_changes[-1]
-                            annotated_changes[-1] = (previous_annotation, " ".join([previous_change, current_change]))
-                        else:
-                            annotated_changes.append((annotation, current_change))
-                        break
-
-                    if level == self._current_level + 1:
-                        break
-
-                if match_found:
-                    break
-
-        return annotated_changes
-
-    @staticmethod
-    def _trim_author(text):
-        return re.sub(r'^[ ]*\[(.*)\]$', r'\1', text).strip()
-
-    @staticmethod
-    def _trim_list_item(text):
-        return re.sub(r'^[ ]*[*+-] (.*)$', r'\1', text)
-
-    @staticmethod
-    def _trim_list_item_continuation(text):
-        return text.strip()
-
-    @staticmethod
-    def _nop(text):
-        return text
-
-    def _report_parser_warning(self, text):
-        logging.warning("For package '{}': Failed to parse '{}' at level {}!".format(
-            self._package, text, self._current_level))
-        return text
+from edi.lib.templateengine import TemplateEngine
+from edi.lib.packageindex import PackageIndex
+from edi.lib.changelogextractor import ChangelogExtractor, parse_date
+from edi.lib.changelogcache import ChangelogCache
+
+
+def render_documentation_step(template_path, parameters, chunks, output_path):
+    """
+    Render all chunks of a documentation step into a file.
+    Hint: This function gets executed within a worker process if the steps get rendered concurrently.
+    :param template_path: The path of the Jinja2 template.
+    :param parameters: The (augmented) parameters of the documentation step.
+    :param chunks: A list of (first_chunk, last_chunk, packages) tuples.
+    :param output_path: The file that receives the rendered step.
+    """
+    try:
+        template = TemplateEngine().get_template(template_path)
+    except jinja2.TemplateError as te:
+        raise FatalError("Encountered template error while processing '{}':\n{}".format(template_path,
+                                                                                        str(te)))
+
+    with open(output_path, encoding="UTF-8", mode="w") as outfile:
+        for first_chunk, last_chunk, packages in chunks:
+            DocumentationStepRunner._render_chunk(template, template_path, parameters, outfile,
+                                                  first_chunk, last_chunk, packages)
 
 
 class DocumentationStepRunner():
@@ -120,11 +66,17 @@ class DocumentationStepRunner():
         self.build_setup = dict()
         self.installed_packages = list()
         self.baseline_versions = dict()
+        self.package_index = PackageIndex([], {})
+        self.changelog_extractor = ChangelogExtractor(raw_input, self.package_index)
 
     def fetch_artifact_setup(self):
         self.build_setup = self._get_build_setup()
         self.installed_packages = self._get_installed_packages()
         self.baseline_versions = self._get_baseline_versions()
+        self.package_index = PackageIndex(self.installed_packages, self.baseline_versions)
+        changelog_cache = ChangelogCache(self.config.get_doc_changelog_cache_size() * 1024 * 1024)
+        self.changelog_extractor = ChangelogExtractor(self.raw_input, self.package_index,
+                                                      self.config.get_doc_changelog_workers(), changelog_cache)
 
     def augment_step_parameters(self, parameters):
         augmented_parameters = parameters.copy()
@@ -141,35 +93,59 @@ class DocumentationStepRunner():
 
     def run_all(self):
         self.fetch_artifact_setup()
+        self._extract_changelogs()
 
         workdir = get_workdir()
         applied_documentation_steps = []
         with tempfile.TemporaryDirectory(dir=workdir) as tempdir:
-            temp_output_file_paths = set()
-            for name, path, parameters, raw_node in self._get_documentation_steps():
+            # each step gets rendered into its own file
+            step_directory = tempfile.mkdtemp(dir=tempdir)
+            step_output_paths = dict()
+            jobs = []
+            for index, (name, path, parameters, raw_node) in enumerate(self._get_documentation_steps()):
                 output_file = self._get_output_file(name, raw_node)
-                temp_output_path = os.path.join(tempdir, output_file)
-                temp_output_file_paths.add(temp_output_path)
-                with open(temp_output_path, encoding="UTF-8", mode="a") as output:
-                    augmented_parameters = self.augment_step_parameters(parameters)
+                step_output_path = os.path.join(step_directory, '{}.step'.format(index))
+                step_output_paths.setdefault(output_file, []).append(step_output_path)
+                augmented_parameters = self.augment_step_parameters(parameters)
 
-                    logging.info(("Running documentation step {} located in "
-                                  "{} with parameters:\n{}\n"
-                                  "Writing output to {}."
-                                  ).format(name, path,
-                                           yaml.dump(remove_passwords(augmented_parameters),
-                                                     default_flow_style=False),
-                                           os.path.join(self.rendered_output, output_file)))
+                logging.info(("Running documentation step {} located in "
+                              "{} with parameters:\n{}\n"
+                              "Writing output to {}."
+                              ).format(name, path,
+                                       yaml.dump(remove_passwords(augmented_parameters),
+                                                 default_flow_style=False),
+                                       os.path.join(self.rendered_output, output_file)))
 
-                    self._run_documentation_step(path, augmented_parameters, output)
-                    applied_documentation_steps.append(name)
+                jobs.append((path, augmented_parameters, self._get_chunks(augmented_parameters), step_output_path))
+                applied_documentation_steps.append(name)
+
+            self._render_steps(jobs)
+
+            # steps that write to the same output file get assembled in the order of the steps
+            for output_file, paths in step_output_paths.items():
+                temp_output_path = os.path.join(tempdir, output_file)
+                with open(temp_output_path, mode='wb') as output:
+                    for step_output_path in paths:
+                        with open(step_output_path, mode='rb') as step_output:
+                            shutil.copyfileobj(step_output, output)
 
-            for temp_output_file_path in temp_output_file_paths:
-                shutil.move(temp_output_file_path, os.path.join(self.rendered_output,
-                                                                os.path.basename(temp_output_file_path)))
+                shutil.move(temp_output_path, os.path.join(self.rendered_output, os.path.basename(temp_output_path)))
 
         return applied_documentation_steps
 
+    def _render_steps(self, jobs):
+        max_workers = min(self.config.get_doc_max_parallel_steps() or os.cpu_count() or 1, len(jobs))
+        if max_workers <= 1:
+            for job in jobs:
+                render_documentation_step(*job)
+            return
+
+        logging.debug("Rendering {} documentation steps using {} processes.".format(len(jobs), max_workers))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(render_documentation_step, *job) for job in jobs]
+            for future in futures:
+                future.result()
+
     def clean(self):
         for name, _, _, raw_node in self._get_documentation_steps():
             file = self._get_output_file(name, raw_node)
@@ -265,14 +241,8 @@ class DocumentationStepRunner():
         return file
 
     def _get_documentation_step_packages(self, parameters):
-        installed_packages = set([self._get_package_value('package', package) for package in self.installed_packages])
-        include_packages = set(parameters.get('edi_doc_include_packages', installed_packages))
-        step_packages = installed_packages.intersection(include_packages)
-        exclude_packages = set(parameters.get('edi_doc_exclude_packages', []))
-        step_packages = step_packages - exclude_packages
-        step_package_list = [package for package in self.installed_packages
-                             if self._get_package_value('package', package) in step_packages]
-        return step_package_list
+        return self.package_index.select(parameters.get('edi_doc_include_packages'),
+                                         parameters.get('edi_doc_exclude_packages'))
 
     @staticmethod
     def _get_replacements(parameters):
@@ -282,138 +252,68 @@ class DocumentationStepRunner():
         return replacements
 
     @staticmethod
-    def _apply_replacements(string_list, replacements):
-        result = []
-        for item in string_list:
-            for replacement in replacements:
-                p = replacement.get('pattern', '')
-                r = replacement.get('replacement', '')
-                try:
-                    item = re.sub(p, r, item)
-                except Exception as e:
-                    raise FatalError(("Failed to apply regular expression:\n"
-                                      "pattern: {}\nreplacement: {}:\nmessage: {}").format(p, r, str(e)))
+    def _get_chunk_size(parameters):
+        chunk_size = parameters.get('edi_doc_chunk_size', 1)
+        if type(chunk_size) is not int or chunk_size < 1:
+            raise FatalError("'edi_doc_chunk_size' should be a positive integer.")
+        return chunk_size
 
-            result. append(item)
+    @staticmethod
+    def _get_changelog_baseline_date(parameters):
+        return parse_date(parameters.get('edi_doc_changelog_baseline', 'Thu, 01 Jan 1970 00:00:00 +0000'))
 
-        return result
+    def _extract_changelogs(self):
+        # the changelogs of all documentation steps get extracted at once (and in parallel)
+        for _, _, parameters, _ in self._get_documentation_steps():
+            augmented_parameters = self.augment_step_parameters(parameters)
+            if not augmented_parameters.get('edi_doc_include_changelog', False):
+                continue
 
-    def _add_changelog(self, package, baseline_date, replacements):
-        # TODO: evaluate baseline by package
-        package_changelog_path = None
-        package_name = self._get_package_value('package', package)
-        if os.path.isfile(os.path.join(self.raw_input, package_name, 'changelog.Debian.gz')):
-            package_changelog_path = os.path.join(self.raw_input, package_name, 'changelog.Debian.gz')
-        elif os.path.isfile(os.path.join(self.raw_input, package_name, 'changelog.gz')):
-            package_changelog_path = os.path.join(self.raw_input, package_name, 'changelog.gz')
-        else:
-            logging.warning("No changelog found for package '{}'.".format(package_name))
-
-        if package_changelog_path:
-            with gzip.open(package_changelog_path) as fh:
-                try:
-                    changelog = Changelog(fh)
-                except UnicodeDecodeError as e:
-                    raise FatalError("Failed to parse changelog of {}:\n{}".format(package_name, str(e)))
-
-                if not changelog.package or not changelog.date or not changelog.author:
-                    logging.warning("The changelog of package '{}' is incomplete.".format(package_name))
-                    return
-
-                package_dict = dict()
-                package_dict['author'] = changelog.author
-                package_dict['date'] = changelog.date
-                package_dict['short_date'] = self._parse_date(changelog.date).strftime("%d. %B %Y")
-                package_dict['version'] = str(changelog.get_version())
-                package_dict['package'] = changelog.package
-
-                change_blocks = list()
-                for change_block in changelog:
-                    changeblock_date = self._parse_date(change_block.date)
-
-                    if changeblock_date <= baseline_date:
-                        break
-
-                    if change_block.version <= Version(self.baseline_versions.get(package_name, '0.0.0')):
-                        break
-
-                    block_dict = dict()
-                    block_dict['author'] = change_block.author
-                    block_dict['date'] = change_block.date
-                    block_dict['short_date'] = changeblock_date.strftime("%d. %B %Y")
-                    block_dict['version'] = str(change_block.version)
-                    block_dict['package'] = change_block.package
-                    block_dict['distributions'] = change_block.distributions
-                    block_dict['urgency'] = change_block.urgency
-                    changes = self._apply_replacements(change_block.changes(), replacements)
-                    block_dict['changes'] = ChangesAnnotator(package_name).annotate(changes)
-                    change_blocks.append(block_dict)
-
-                package_dict['change_blocks'] = change_blocks
-
-                package['changelog'] = package_dict
+            baseline_date = self._get_changelog_baseline_date(augmented_parameters)
+            replacements = self._get_replacements(augmented_parameters)
+            for package in self._get_documentation_step_packages(augmented_parameters):
+                self.changelog_extractor.add(package.get_name(), baseline_date, replacements)
 
-    @staticmethod
-    def _parse_date(date_string):
-        try:
-            return parser.parse(date_string)
-        except Exception as e:
-            raise FatalError("Failed to parse date string '{}':\n{}".format(date_string, str(e)))
+        self.changelog_extractor.run()
 
-    def _run_documentation_step(self, template_path, parameters, outfile):
+    def _get_chunks(self, parameters):
         step_packages = self._get_documentation_step_packages(parameters)
         step_replacements = self._get_replacements(parameters)
+        chunk_size = self._get_chunk_size(parameters)
 
         if not step_packages:
-            context = parameters.copy()
-            context['edi_doc_first_chunk'] = True
-            context['edi_doc_last_chunk'] = True
-            self._render_chunk(template_path, context, outfile)
-        else:
-            add_changelog = parameters.get('edi_doc_include_changelog', False)
-            baseline_date = self._parse_date(parameters.get('edi_doc_changelog_baseline',
-                                                            'Thu, 01 Jan 1970 00:00:00 +0000'))
-            # chunk size is currently 1
-            first_package = self._get_package_value('package', step_packages[0])
-            last_package = self._get_package_value('package', step_packages[-1])
-
-            for package in step_packages:
-                context = parameters.copy()
-                name = self._get_package_value('package', package)
-                if name == first_package:
-                    context['edi_doc_first_chunk'] = True
-                else:
-                    context['edi_doc_first_chunk'] = False
-                if name == last_package:
-                    context['edi_doc_last_chunk'] = True
-                else:
-                    context['edi_doc_last_chunk'] = False
-
-                package_context = package.copy()
-                package_context['baseline_version'] = self.baseline_versions.get(name, "0.0.0")
-
-                if add_changelog:
-                    self._add_changelog(package_context, baseline_date, step_replacements)
-
-                context['edi_doc_packages'] = [package_context]
-
-                self._render_chunk(template_path, context, outfile)
+            return [(True, True, None)]
+
+        chunks = []
+        add_changelog = parameters.get('edi_doc_include_changelog', False)
+        baseline_date = self._get_changelog_baseline_date(parameters)
+        for start in range(0, len(step_packages), chunk_size):
+            chunk = list(step_packages[start:start + chunk_size])
+            if add_changelog:
+                chunk = [package.with_changelog(self.changelog_extractor.get(package.get_name(), baseline_date,
+                                                                             step_replacements))
+                         for package in chunk]
+
+            chunks.append((start == 0, start + chunk_size >= len(step_packages), chunk))
+
+        return chunks
 
     @staticmethod
-    def _render_chunk(template_path, context, outfile):
-        try:
-            template_loader = jinja2.FileSystemLoader(searchpath=os.path.dirname(template_path))
-            environment = jinja2.Environment(loader=template_loader)
-            template_file = os.path.basename(template_path)
-            template = environment.get_template(template_file)
-        except jinja2.TemplateError as te:
-            raise FatalError("Encountered template error while processing '{}':\n{}".format(template_path,
-                                                                                            str(te)))
+    def _render_chunk(template, template_path, parameters, outfile, first_chunk, last_chunk, packages=None):
+        # the parameters and the package records get shared among all chunks instead of getting copied
+        chunk_values = {'edi_doc_first_chunk': first_chunk, 'edi_doc_last_chunk': last_chunk}
+        if packages is not None:
+            chunk_values['edi_doc_packages'] = packages
+
         try:
             if logging.getLogger().isEnabledFor(logging.DEBUG):
                 logging.debug("Rendering chunk with context:")
-                logging.debug(yaml.dump(context, default_flow_style=False))
-            outfile.write(template.render(context))
+                debug_context = dict(parameters, **chunk_values)
+                if packages is not None:
+                    debug_context['edi_doc_packages'] = [package.to_dict() for package in packages]
+                logging.debug(yaml.dump(debug_context, default_flow_style=False))
+            # stream the rendered chunk into the output file instead of assembling it in memory
+            outfile.writelines(template.generate(parameters, **chunk_values))
         except Exception:
             raise FatalError("Failed to render '{}':\n{}".format(template_path,
                                                                  traceback.format_exc(limit=-1)))
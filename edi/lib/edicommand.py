@@ -22,13 +22,18 @@
 from edi.lib.commandfactory import CommandFactory
 from edi.lib.configurationparser import ConfigurationParser
 import argparse
+import functools
 import os
 import logging
 import yaml
 from functools import partial
 from edi.lib.helpers import FatalError
 from edi.lib.shellhelpers import run
+from edi.lib.artifactcache import get_file_digest, get_directory_digest
+from edi.lib.archivehelpers import get_archive_extension, get_compress_program
 from edi.lib.commandfactory import get_sub_commands, get_command
+from edi.lib.profiler import profiled_stage
+from edi.lib.lxchelpers import LxdBackend
 
 
 def compose_command_name(current_class):
@@ -40,12 +45,26 @@ def compose_command_name(current_class):
                               current_class.__name__.lower())
 
 
+def _profiled_run(run_method):
+    @functools.wraps(run_method)
+    def wrapper(self, *args, **kwargs):
+        with profiled_stage(self._get_command_name(), 'command'):
+            return run_method(self, *args, **kwargs)
+    return wrapper
+
+
 class EdiCommand(metaclass=CommandFactory):
 
     def __init__(self):
         self.clean_depth = 0
         self.config = None
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # record the resource consumption of each command (see edi --profile)
+        if '_run' in cls.__dict__:
+            cls._run = _profiled_run(cls.__dict__['_run'])
+
     def clean(self, config_file):
         pass
 
@@ -70,6 +89,7 @@ class EdiCommand(metaclass=CommandFactory):
 
     def _setup_parser(self, config_file, config_type=1):
         self.config = ConfigurationParser(config_file, config_type)
+        LxdBackend.enable_rest_api(self.config.get_lxd_rest_api())
 
     @classmethod
     def _get_command_name(cls):
@@ -165,6 +185,18 @@ class EdiCommand(metaclass=CommandFactory):
     def _dump(introspection_result):
         return yaml.dump(introspection_result, default_flow_style=False, width=1000)
 
+    def _get_plugin_digests(self, sections):
+        digests = dict()
+        for section in sections:
+            for name, path, _, _ in self.config.get_ordered_path_items(section):
+                if section == 'playbooks':
+                    # a playbook also depends on its roles, task files, templates and files
+                    digest = get_directory_digest(os.path.dirname(path))
+                else:
+                    digest = get_file_digest(path)
+                digests['{}.{}'.format(section, name)] = digest
+        return digests
+
     def _print(self, method):
         print(self._dump(method()))
 
@@ -175,18 +207,22 @@ class EdiCommand(metaclass=CommandFactory):
                               "Use 'sudo edi ...'."
                               ).format(self._get_short_command_name()))
 
-    def _pack_image(self, tempdir, datadir, name="result"):
+    def _pack_image(self, tempdir, datadir, name="result", sudo=True):
         # advanced options such as numeric-owner are not supported by
         # python tarfile library - therefore we use the tar command line tool
-        tempresult = "{0}.tar.{1}".format(name,
-                                          self.config.get_compression())
+        compression = self.config.get_compression()
+        tempresult = "{0}.{1}".format(name, get_archive_extension(compression))
         archive_path = os.path.join(tempdir, tempresult)
 
         cmd = ["tar", "--numeric-owner", "--xattrs", "--selinux", "--acls"]
+        compress_program = get_compress_program(compression, self.config.get_compression_threads(),
+                                                self.config.get_compression_level())
+        if compress_program:
+            cmd.append("--use-compress-program={}".format(compress_program))
         cmd.extend(["-C", datadir])
         cmd.extend(["-acf", archive_path])
         cmd.extend(os.listdir(datadir))
-        run(cmd, sudo=True, log_threshold=logging.INFO)
+        run(cmd, sudo=sudo, log_threshold=logging.INFO)
         return archive_path
 
     @staticmethod
@@ -156,3 +156,21 @@ def create_artifact_dir():
         logging.info('''Creating artifact directory '{}'.'''.format(directory))
         os.mkdir(directory)
         chown_to_user(directory)
+
+
+def create_user_directory(directory):
+    """
+    Create a directory including its missing parents and hand them over to the current user.
+    """
+    missing_directories = []
+    while not os.path.isdir(directory):
+        missing_directories.append(directory)
+        directory = os.path.dirname(directory)
+
+    for missing_directory in reversed(missing_directories):
+        try:
+            os.mkdir(missing_directory)
+        except FileExistsError:
+            # concurrently created by another thread or process
+            continue
+        chown_to_user(missing_directory)
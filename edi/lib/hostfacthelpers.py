@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+import glob
+import logging
+import os
+import platform
+import re
+import shlex
+import sys
+from pwd import getpwnam
+
+
+# machine name (uname -m) to Debian architecture for 64 bit user lands
+_debian_architectures_64 = {
+    'x86_64': 'amd64',
+    'amd64': 'amd64',
+    'aarch64': 'arm64',
+    'arm64': 'arm64',
+    'ppc64le': 'ppc64el',
+    's390x': 's390x',
+    'riscv64': 'riscv64',
+    'mips64': 'mips64el',
+    'loongarch64': 'loong64',
+}
+
+# machine name (uname -m) to Debian architecture for 32 bit user lands
+# Hint: armv7l/armv6l are ambiguous (armhf versus armel) and therefore not listed.
+_debian_architectures_32 = {
+    'i386': 'i386',
+    'i486': 'i386',
+    'i586': 'i386',
+    'i686': 'i386',
+    'x86_64': 'i386',
+}
+
+# default identity files of OpenSSH in the order reported by ssh -G
+_default_ssh_identity_files = ['~/.ssh/id_rsa', '~/.ssh/id_ecdsa', '~/.ssh/id_ecdsa_sk', '~/.ssh/id_ed25519',
+                               '~/.ssh/id_ed25519_sk', '~/.ssh/id_xmss', '~/.ssh/id_dsa']
+
+_system_ssh_config = os.path.join(os.sep, 'etc', 'ssh', 'ssh_config')
+
+
+class AmbiguousFact(Exception):
+    """Raised internally if a fact can not be determined without a subprocess."""
+    pass
+
+
+def get_environment_variable(name, default=None):
+    return os.environ.get(name, default)
+
+
+def get_user_home_directory(username):
+    """
+    Get the home directory of a user using the password database.
+    :param username: The name of the user.
+    :return: The home directory or None if the user is unknown.
+    """
+    try:
+        return getpwnam(username).pw_dir
+    except KeyError:
+        return None
+
+
+def get_debian_architecture():
+    """
+    Derive the Debian architecture of the host from the machine name and the user land word size.
+    :return: The Debian architecture (e.g. amd64) or None if the answer is ambiguous.
+    """
+    machine = platform.machine().lower()
+    if sys.maxsize > 2**32:
+        return _debian_architectures_64.get(machine)
+    else:
+        return _debian_architectures_32.get(machine)
+
+
+def get_ssh_identity_files(user_home):
+    """
+    Get the identity files that ssh would use for an arbitrary host (equivalent to ssh -G).
+    :param user_home: The home directory of the user.
+    :return: A list of identity files (unexpanded) or None if the answer is ambiguous.
+    """
+    identity_files = []
+    user_ssh_directory = os.path.join(user_home, '.ssh')
+    try:
+        _parse_ssh_config(os.path.join(user_ssh_directory, 'config'), user_ssh_directory, user_home, True,
+                          identity_files)
+        _parse_ssh_config(_system_ssh_config, os.path.dirname(_system_ssh_config), user_home, True,
+                          identity_files)
+    except AmbiguousFact as reason:
+        logging.debug("Unable to natively determine the ssh identity files: {}".format(reason))
+        return None
+
+    if identity_files:
+        return identity_files
+    else:
+        return _default_ssh_identity_files.copy()
+
+
+def _parse_ssh_config(config_file, include_directory, user_home, applies, identity_files):
+    if not os.path.isfile(config_file):
+        return
+
+    try:
+        with open(config_file, encoding='utf-8', mode='r') as f:
+            lines = f.readlines()
+    except (OSError, UnicodeDecodeError) as error:
+        raise AmbiguousFact("failed to read '{}' ({})".format(config_file, error))
+
+    for line in lines:
+        keyword, arguments = _split_ssh_config_line(line, config_file)
+        if not keyword:
+            continue
+        elif keyword == 'host':
+            applies = arguments == ['*']
+        elif keyword == 'match':
+            applies = arguments == ['all']
+        elif keyword == 'include':
+            for argument in arguments:
+                pattern = os.path.join(include_directory, re.sub(r'^~', user_home, argument))
+                for included_file in sorted(glob.glob(pattern)):
+                    _parse_ssh_config(included_file, include_directory, user_home, applies, identity_files)
+        elif keyword == 'identityfile':
+            if not applies:
+                raise AmbiguousFact("conditional IdentityFile in '{}'".format(config_file))
+            for argument in arguments:
+                if '%' in argument or '${' in argument:
+                    raise AmbiguousFact("IdentityFile with tokens in '{}'".format(config_file))
+                if argument.lower() == 'none':
+                    raise AmbiguousFact("IdentityFile none in '{}'".format(config_file))
+                if argument not in identity_files:
+                    identity_files.append(argument)
+
+
+def _split_ssh_config_line(line, config_file):
+    stripped_line = line.strip()
+    if not stripped_line or stripped_line.startswith('#'):
+        return None, []
+
+    keyword, remainder = re.match(r'^([^\s=]+)\s*=?\s*(.*)$', stripped_line).groups()
+    try:
+        arguments = shlex.split(remainder, comments=True)
+    except ValueError as error:
+        raise AmbiguousFact("failed to parse '{}' in '{}' ({})".format(stripped_line, config_file, error))
+
+    return keyword.lower(), arguments
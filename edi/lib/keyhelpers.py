@@ -19,8 +19,6 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
-import requests
-import gnupg
 import os
 from edi.lib.helpers import FatalError
 from edi.lib.shellhelpers import gpg_agent
@@ -29,6 +27,7 @@ from edi.lib.proxyhelpers import ProxySetup
 
 def fetch_repository_key(key_url):
     if key_url:
+        import requests
         key_req = requests.get(key_url, proxies=ProxySetup().get_requests_dict())
         if key_req.status_code != 200:
             raise FatalError(("Unable to fetch repository key '{0}'"
@@ -41,6 +40,7 @@ def fetch_repository_key(key_url):
 
 def build_keyring(tempdir, keyring_file, key_data):
     if key_data:
+        import gnupg
         keyring_file_path = os.path.join(tempdir, keyring_file)
         with gpg_agent(str(tempdir)):
             gpg = gnupg.GPG(gnupghome=tempdir, keyring=keyring_file_path)
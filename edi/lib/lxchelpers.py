@@ -19,14 +19,18 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import subprocess
 import yaml
 import logging
 import hashlib
-from packaging.version import Version
+import http.client
+import time
+from contextlib import contextmanager
 from edi.lib.helpers import FatalError
 from edi.lib.versionhelpers import get_stripped_version
 from edi.lib.shellhelpers import run, Executables, require, is_running_in_user_namespace
+from edi.lib.lxdrestclient import LxdRestClient, LxdRestError, UnsupportedDownload, find_lxd_socket, quote_name
 
 
 lxd_install_hint = "'sudo apt install lxd' or 'sudo snap install lxd'"
@@ -36,7 +40,74 @@ def lxc_exec():
     return Executables.get('lxc')
 
 
+class LxdBackend:
+    """
+    Select the way edi talks to LXD: The REST API of the local unix socket is
+    preferred and the lxc command line client is used as a fallback or if the
+    REST API got disabled (see edi_lxd_rest_api).
+    """
+    _cache = dict()
+    _rest_api_enabled = True
+
+    def __init__(self, clear_cache=False):
+        if clear_cache:
+            LxdBackend._cache = dict()
+
+    @staticmethod
+    def enable_rest_api(enabled):
+        if enabled == LxdBackend._rest_api_enabled:
+            return
+
+        client = LxdBackend._cache.pop('rest_client', None)
+        if client:
+            client.close()
+        LxdBackend._rest_api_enabled = enabled
+
+    @staticmethod
+    def get_rest_client():
+        """
+        :return: A LxdRestClient or None if the lxc command line client shall be used.
+        """
+        if not LxdBackend._rest_api_enabled:
+            return None
+
+        if 'rest_client' not in LxdBackend._cache:
+            LxdBackend._cache['rest_client'] = LxdBackend._connect()
+
+        return LxdBackend._cache['rest_client']
+
+    @staticmethod
+    def _connect():
+        socket_path = find_lxd_socket()
+        if not socket_path or is_running_in_user_namespace():
+            return None
+
+        client = LxdRestClient(socket_path)
+        try:
+            client.get('/1.0')
+        except (OSError, http.client.HTTPException, LxdRestError) as error:
+            logging.debug("Using lxc instead of the LXD socket {} ({}).".format(socket_path, error))
+            client.close()
+            return None
+
+        logging.debug("Talking to LXD using the socket {}.".format(socket_path))
+        return client
+
+
+def _is_not_found(error):
+    return error.status_code == http.client.NOT_FOUND
+
+
+def _is_timeout(error):
+    message = error.message.lower()
+    return any(indicator in message for indicator in ['timeout', 'timed out', 'deadline exceeded'])
+
+
 def get_lxd_version():
+    client = LxdBackend.get_rest_client()
+    if client:
+        return client.get('/1.0').get('environment', {}).get('server_version', '0.0.0')
+
     if not Executables.has('lxd') or is_running_in_user_namespace():
         return '0.0.0'
 
@@ -65,6 +136,7 @@ class LxdVersion:
         if LxdVersion._check_done:
             return
 
+        from packaging.version import Version
         if Version(get_stripped_version(get_lxd_version())) < Version(LxdVersion._required_minimal_version):
             raise FatalError(('The current lxd installation ({}) does not meet the minimal requirements (>={}).\n'
                               'Please update your lxd installation using snaps or xenial-backports!'
@@ -73,39 +145,226 @@ class LxdVersion:
             LxdVersion._check_done = True
 
 
+class LxdStateSnapshot:
+    """
+    Answer LXD state queries (containers, images, profiles and networks) from
+    one bulk query per category instead of querying every item individually.
+    The snapshot is only used within a lxd_state_snapshot context and the
+    affected categories get invalidated by the mutating calls of edi.
+    """
+    _cache = dict()
+    _active_contexts = 0
+    _queries = {
+        'containers': ['list', '--format=json'],
+        'images': ['image', 'list', '--format=json'],
+        'profiles': ['profile', 'list', '--format=json'],
+        'networks': ['network', 'list', '--format=json'],
+    }
+    _rest_queries = {
+        'containers': '/1.0/containers',
+        'images': '/1.0/images',
+        'profiles': '/1.0/profiles',
+        'networks': '/1.0/networks',
+    }
+
+    def __init__(self, clear_cache=False):
+        if clear_cache:
+            LxdStateSnapshot._cache = dict()
+
+    @staticmethod
+    def is_active():
+        return LxdStateSnapshot._active_contexts > 0
+
+    @staticmethod
+    def get(category):
+        """
+        Get the snapshot of a category.
+        :param category: containers, images, profiles or networks.
+        :return: A list of items or None if no snapshot is available.
+        """
+        if not LxdStateSnapshot.is_active():
+            return None
+
+        if category not in LxdStateSnapshot._cache:
+            LxdStateSnapshot._cache[category] = LxdStateSnapshot._query(category)
+
+        return LxdStateSnapshot._cache[category]
+
+    @staticmethod
+    def invalidate(*categories):
+        for category in categories:
+            LxdStateSnapshot._cache.pop(category, None)
+
+    @staticmethod
+    def _query(category):
+        client = LxdBackend.get_rest_client()
+        if client:
+            return client.get(LxdStateSnapshot._rest_queries[category], recursion=1) or []
+
+        cmd = [lxc_exec()]
+        cmd.extend(LxdStateSnapshot._queries[category])
+        result = run(cmd, check=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            # older lxc clients do not support json output for all categories
+            logging.debug("Falling back to individual queries for lxc {}.".format(category))
+            return None
+
+        try:
+            return yaml.safe_load(result.stdout) or []
+        except yaml.YAMLError as exc:
+            raise FatalError("Unable to parse lxc output ({}).".format(exc))
+
+
+@contextmanager
+def lxd_state_snapshot():
+    """
+    Answer the LXD state queries within this context from a LxdStateSnapshot.
+    The context can be nested. The snapshot gets dropped when leaving the outermost context.
+    """
+    LxdStateSnapshot._active_contexts += 1
+    try:
+        yield
+    finally:
+        LxdStateSnapshot._active_contexts -= 1
+        if not LxdStateSnapshot.is_active():
+            LxdStateSnapshot(clear_cache=True)
+
+
+def _get_snapshot_item(category, name):
+    for item in LxdStateSnapshot.get(category):
+        if item.get('name') == name:
+            return item
+    return None
+
+
+def _get_rest_item(client, path):
+    try:
+        return client.get(path)
+    except LxdRestError as error:
+        if _is_not_found(error):
+            return None
+        raise
+
+
+def _get_image_fingerprint(client, name):
+    alias = _get_rest_item(client, '/1.0/images/aliases/{}'.format(quote_name(name)))
+    if alias:
+        return alias.get('target')
+
+    image = _get_rest_item(client, '/1.0/images/{}'.format(quote_name(name)))
+    if image:
+        return image.get('fingerprint')
+
+    return None
+
+
+def _is_matching_image(image, name):
+    if image.get('fingerprint', '').startswith(name):
+        return True
+
+    aliases = [alias.get('name') for alias in image.get('aliases') or []]
+    return name in aliases
+
+
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def is_in_image_store(name):
+    images = LxdStateSnapshot.get('images')
+    if images is not None:
+        return any(_is_matching_image(image, name) for image in images)
+
+    client = LxdBackend.get_rest_client()
+    if client:
+        return _get_image_fingerprint(client, name) is not None
+
     cmd = [lxc_exec(), "image", "show", "local:{}".format(name)]
     result = run(cmd, check=False, stderr=subprocess.PIPE)
     return result.returncode == 0
 
 
 @require('lxc', lxd_install_hint, LxdVersion.check)
-def import_image(image, image_name):
-    cmd = [lxc_exec(), "image", "import", image, "local:", "--alias", image_name]
+def import_image(image, image_name, rootfs=None):
+    """
+    Import an image into the LXD image store.
+    :param image: The unified image or the metadata tarball of a split image.
+    :param image_name: The alias of the imported image.
+    :param rootfs: The rootfs tarball of a split image (None for a unified image).
+    """
+    LxdStateSnapshot.invalidate('images')
+    client = LxdBackend.get_rest_client()
+    if client and os.path.isfile(image) and (rootfs is None or os.path.isfile(rootfs)):
+        with open(image, mode='rb') as image_file:
+            if rootfs:
+                with open(rootfs, mode='rb') as rootfs_file:
+                    operation = client.upload_multipart('/1.0/images',
+                                                        [('metadata', image_file), ('rootfs', rootfs_file)],
+                                                        headers={'X-LXD-public': '0'})
+            else:
+                operation = client.upload('/1.0/images', image_file, headers={'X-LXD-public': '0'})
+        fingerprint = operation.get('metadata', {}).get('fingerprint')
+        client.post('/1.0/images/aliases', {'name': image_name, 'target': fingerprint, 'description': ''})
+        return
+
+    cmd = [lxc_exec(), "image", "import", image]
+    if rootfs:
+        cmd.append(rootfs)
+    cmd.extend(["local:", "--alias", image_name])
     run(cmd)
 
 
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def export_image(image_name, image_without_extension):
+    client = LxdBackend.get_rest_client()
+    if client:
+        fingerprint = _get_image_fingerprint(client, image_name)
+        if not fingerprint:
+            raise FatalError("The image '{}' is not available within the image store.".format(image_name))
+        try:
+            client.download('/1.0/images/{}/export'.format(fingerprint), image_without_extension)
+            return
+        except UnsupportedDownload as error:
+            logging.debug("Falling back to lxc for the export of {} ({}).".format(image_name, error))
+
     cmd = [lxc_exec(), "image", "export", image_name, image_without_extension]
     run(cmd)
 
 
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def publish_container(container_name, image_name):
+    LxdStateSnapshot.invalidate('images')
+    client = LxdBackend.get_rest_client()
+    if client:
+        client.post('/1.0/images', {'source': {'type': 'container', 'name': container_name},
+                                    'aliases': [{'name': image_name}]})
+        return
+
     cmd = [lxc_exec(), "publish", container_name, "--alias", image_name]
     run(cmd)
 
 
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def delete_image(name):
+    LxdStateSnapshot.invalidate('images')
+    client = LxdBackend.get_rest_client()
+    if client:
+        fingerprint = _get_image_fingerprint(client, name)
+        if not fingerprint:
+            raise FatalError("The image '{}' is not available within the image store.".format(name))
+        client.delete('/1.0/images/{}'.format(fingerprint))
+        return
+
     cmd = [lxc_exec(), "image", "delete", "local:{}".format(name)]
     run(cmd)
 
 
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def is_container_existing(name):
+    if LxdStateSnapshot.get('containers') is not None:
+        return _get_snapshot_item('containers', name) is not None
+
+    client = LxdBackend.get_rest_client()
+    if client:
+        return _get_rest_item(client, '/1.0/containers/{}'.format(quote_name(name))) is not None
+
     cmd = [lxc_exec(), "info", name]
     result = run(cmd, check=False, stderr=subprocess.PIPE)
     return result.returncode == 0
@@ -113,6 +372,15 @@ def is_container_existing(name):
 
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def is_container_running(name):
+    if LxdStateSnapshot.get('containers') is not None:
+        container = _get_snapshot_item('containers', name)
+        return container is not None and container.get("status", "") == "Running"
+
+    client = LxdBackend.get_rest_client()
+    if client:
+        container = _get_rest_item(client, '/1.0/containers/{}'.format(quote_name(name)))
+        return container is not None and container.get("status", "") == "Running"
+
     cmd = [lxc_exec(), "list", "--format=json", "^{}$".format(name)]
     result = run(cmd, stdout=subprocess.PIPE)
 
@@ -138,6 +406,13 @@ def is_container_running(name):
 
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def is_bridge_available(bridge_name):
+    if LxdStateSnapshot.get('networks') is not None:
+        return _get_snapshot_item('networks', bridge_name) is not None
+
+    client = LxdBackend.get_rest_client()
+    if client:
+        return _get_rest_item(client, '/1.0/networks/{}'.format(quote_name(bridge_name))) is not None
+
     cmd = [lxc_exec(), "network", "list", "--format=json"]
     result = run(cmd, stdout=subprocess.PIPE)
 
@@ -154,12 +429,32 @@ def is_bridge_available(bridge_name):
 
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def create_bridge(bridge_name):
+    LxdStateSnapshot.invalidate('networks')
+    client = LxdBackend.get_rest_client()
+    if client:
+        client.post('/1.0/networks', {'name': bridge_name, 'config': {}})
+        return
+
     cmd = [lxc_exec(), "network", "create", bridge_name]
     run(cmd)
 
 
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def launch_container(image, name, profiles):
+    LxdStateSnapshot.invalidate('containers')
+    client = LxdBackend.get_rest_client()
+    if client:
+        container = {'name': name, 'source': {'type': 'image', 'alias': image}}
+        if profiles:
+            container['profiles'] = profiles
+        try:
+            client.post('/1.0/containers', container)
+            _change_container_state(client, name, 'start')
+        except LxdRestError as error:
+            raise FatalError(('''Launching image '{}' failed with the following message:\n{}'''
+                              ).format(image, error.message))
+        return
+
     cmd = [lxc_exec(), "launch", "local:{}".format(image), name]
     for profile in profiles:
         cmd.extend(["-p", profile])
@@ -169,8 +464,19 @@ def launch_container(image, name, profiles):
                           ).format(image, result.stderr))
 
 
+def _change_container_state(client, name, action, timeout=-1, force=False):
+    client.put('/1.0/containers/{}/state'.format(quote_name(name)),
+               {'action': action, 'timeout': timeout, 'force': force})
+
+
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def start_container(name):
+    LxdStateSnapshot.invalidate('containers')
+    client = LxdBackend.get_rest_client()
+    if client:
+        _change_container_state(client, name, 'start')
+        return
+
     cmd = [lxc_exec(), "start", name]
 
     run(cmd, log_threshold=logging.INFO)
@@ -178,6 +484,20 @@ def start_container(name):
 
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def stop_container(name, timeout=120):
+    LxdStateSnapshot.invalidate('containers')
+    client = LxdBackend.get_rest_client()
+    if client:
+        start_time = time.monotonic()
+        try:
+            _change_container_state(client, name, 'stop', timeout=timeout)
+        except LxdRestError as error:
+            if not _is_timeout(error) and time.monotonic() - start_time < timeout:
+                raise
+            logging.warning(("Timeout ({} seconds) expired while stopping container {}.\n"
+                             "Forcing container shutdown!").format(timeout, name))
+            _change_container_state(client, name, 'stop', force=True)
+        return
+
     cmd = [lxc_exec(), "stop", name]
 
     try:
@@ -192,19 +512,125 @@ def stop_container(name, timeout=120):
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def delete_container(name):
     # needs to be stopped first!
+    LxdStateSnapshot.invalidate('containers')
+    client = LxdBackend.get_rest_client()
+    if client:
+        client.delete('/1.0/containers/{}'.format(quote_name(name)))
+        return
+
     cmd = [lxc_exec(), "delete", name]
 
     run(cmd, log_threshold=logging.INFO)
 
 
+@require('lxc', lxd_install_hint, LxdVersion.check)
+def get_container_snapshots(name):
+    """
+    Get the names of the snapshots of a container ordered by their creation time.
+    """
+    client = LxdBackend.get_rest_client()
+    if client:
+        snapshots = client.get('/1.0/containers/{}/snapshots'.format(quote_name(name)), recursion=1) or []
+    else:
+        cmd = [lxc_exec(), "list", "--format=json", name]
+        result = run(cmd, stdout=subprocess.PIPE)
+        try:
+            containers = yaml.safe_load(result.stdout) or []
+        except yaml.YAMLError as exc:
+            raise FatalError("Unable to parse lxc output ({}).".format(exc))
+        snapshots = next((container.get('snapshots') or [] for container in containers
+                          if container.get('name') == name), [])
+
+    ordered_snapshots = sorted(snapshots, key=lambda snapshot: snapshot.get('created_at', ''))
+    # depending on the LXD version the name is prefixed with the container name
+    return [snapshot.get('name', '').split('/')[-1] for snapshot in ordered_snapshots]
+
+
+@require('lxc', lxd_install_hint, LxdVersion.check)
+def create_container_snapshot(name, snapshot):
+    LxdStateSnapshot.invalidate('containers')
+    client = LxdBackend.get_rest_client()
+    if client:
+        client.post('/1.0/containers/{}/snapshots'.format(quote_name(name)), {'name': snapshot, 'stateful': False})
+        return
+
+    cmd = [lxc_exec(), "snapshot", name, snapshot]
+    run(cmd, log_threshold=logging.INFO)
+
+
+@require('lxc', lxd_install_hint, LxdVersion.check)
+def restore_container_snapshot(name, snapshot):
+    LxdStateSnapshot.invalidate('containers')
+    client = LxdBackend.get_rest_client()
+    if client:
+        client.put('/1.0/containers/{}'.format(quote_name(name)), {'restore': snapshot})
+        return
+
+    cmd = [lxc_exec(), "restore", name, snapshot]
+    run(cmd, log_threshold=logging.INFO)
+
+
+@require('lxc', lxd_install_hint, LxdVersion.check)
+def delete_container_snapshot(name, snapshot):
+    LxdStateSnapshot.invalidate('containers')
+    client = LxdBackend.get_rest_client()
+    if client:
+        client.delete('/1.0/containers/{}/snapshots/{}'.format(quote_name(name), quote_name(snapshot)))
+        return
+
+    cmd = [lxc_exec(), "delete", "{}/{}".format(name, snapshot)]
+    run(cmd, log_threshold=logging.INFO)
+
+
+@require('lxc', lxd_install_hint, LxdVersion.check)
+def get_container_config_item(name, key):
+    """
+    Get a configuration item (e.g. a user.* key) of a container.
+    :return: The value of the item or None if the item is not set.
+    """
+    client = LxdBackend.get_rest_client()
+    if client:
+        container = client.get('/1.0/containers/{}'.format(quote_name(name)))
+        return (container.get('config') or {}).get(key)
+
+    cmd = [lxc_exec(), "config", "get", name, key]
+    result = run(cmd, stdout=subprocess.PIPE)
+    return result.stdout.strip() or None
+
+
+@require('lxc', lxd_install_hint, LxdVersion.check)
+def set_container_config_item(name, key, value):
+    LxdStateSnapshot.invalidate('containers')
+    client = LxdBackend.get_rest_client()
+    if client:
+        client.patch('/1.0/containers/{}'.format(quote_name(name)), {'config': {key: value}})
+        return
+
+    cmd = [lxc_exec(), "config", "set", name, key, value]
+    run(cmd, log_threshold=logging.INFO)
+
+
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def apply_profiles(name, profiles):
+    LxdStateSnapshot.invalidate('containers', 'profiles')
+    client = LxdBackend.get_rest_client()
+    if client:
+        client.patch('/1.0/containers/{}'.format(quote_name(name)), {'profiles': profiles})
+        return
+
     cmd = [lxc_exec(), 'profile', 'apply', name, ','.join(profiles)]
     run(cmd)
 
 
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def is_profile_existing(name):
+    if LxdStateSnapshot.get('profiles') is not None:
+        return _get_snapshot_item('profiles', name) is not None
+
+    client = LxdBackend.get_rest_client()
+    if client:
+        return _get_rest_item(client, '/1.0/profiles/{}'.format(quote_name(name))) is not None
+
     cmd = [lxc_exec(), "profile", "show", name]
     result = run(cmd, check=False, stderr=subprocess.PIPE)
     return result.returncode == 0
@@ -212,6 +638,15 @@ def is_profile_existing(name):
 
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def get_profile_description(name):
+    if LxdStateSnapshot.get('profiles') is not None:
+        profile = _get_snapshot_item('profiles', name)
+        return profile.get('description', '') if profile else ''
+
+    client = LxdBackend.get_rest_client()
+    if client:
+        profile = _get_rest_item(client, '/1.0/profiles/{}'.format(quote_name(name)))
+        return profile.get('description', '') if profile else ''
+
     cmd = [lxc_exec(), "profile", "show", name]
     result = run(cmd, check=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     if result.returncode == 0:
@@ -233,22 +668,39 @@ def write_lxc_profile(profile_text):
     profile_content = yaml.dump(profile_yaml,
                                 default_flow_style=False)
 
+    client = LxdBackend.get_rest_client()
+
     if not is_profile_existing(ext_profile_name):
-        create_cmd = [lxc_exec(), "profile", "create", ext_profile_name]
-        run(create_cmd)
+        LxdStateSnapshot.invalidate('profiles')
+        if client:
+            client.post('/1.0/profiles', {'name': ext_profile_name})
+        else:
+            create_cmd = [lxc_exec(), "profile", "create", ext_profile_name]
+            run(create_cmd)
         new_profile = True
 
     if get_profile_description(ext_profile_name) == "":
-        edit_cmd = [lxc_exec(), "profile", "edit", ext_profile_name]
-        run(edit_cmd, input=profile_content)
+        LxdStateSnapshot.invalidate('profiles')
+        if client:
+            client.put('/1.0/profiles/{}'.format(quote_name(ext_profile_name)),
+                       {'config': profile_yaml.get('config') or {},
+                        'description': profile_yaml.get('description', ''),
+                        'devices': profile_yaml.get('devices') or {}})
+        else:
+            edit_cmd = [lxc_exec(), "profile", "edit", ext_profile_name]
+            run(edit_cmd, input=profile_content)
 
     return ext_profile_name, new_profile
 
 
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def get_server_image_compression_algorithm():
-    cmd = [lxc_exec(), 'config', 'get', 'images.compression_algorithm']
-    algorithm = run(cmd, stdout=subprocess.PIPE).stdout.strip('\n')
+    client = LxdBackend.get_rest_client()
+    if client:
+        algorithm = client.get('/1.0').get('config', {}).get('images.compression_algorithm')
+    else:
+        cmd = [lxc_exec(), 'config', 'get', 'images.compression_algorithm']
+        algorithm = run(cmd, stdout=subprocess.PIPE).stdout.strip('\n')
     if not algorithm:
         return 'gzip'
     else:
@@ -261,6 +713,7 @@ def get_file_extension_from_image_compression_algorithm(algorithm):
         'gzip': '.tar.gz',
         'lzma': '.tar.lzma',
         'xz': '.tar.xz',
+        'zstd': '.tar.zst',
         'none': '.tar',
     }
 
@@ -274,6 +727,15 @@ def get_file_extension_from_image_compression_algorithm(algorithm):
 
 @require('lxc', lxd_install_hint, LxdVersion.check)
 def get_container_profiles(name):
+    if LxdStateSnapshot.get('containers') is not None:
+        container = _get_snapshot_item('containers', name)
+        if container is not None:
+            return container.get('profiles', [])
+
+    client = LxdBackend.get_rest_client()
+    if client:
+        return client.get('/1.0/containers/{}'.format(quote_name(name))).get('profiles', [])
+
     cmd = [lxc_exec(), 'config', 'show', name]
     result = run(cmd, stdout=subprocess.PIPE)
     return yaml.safe_load(result.stdout).get('profiles', [])
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+import http.client
+import json
+import logging
+import os
+import re
+import socket
+import uuid
+from urllib.parse import quote, urlencode
+from edi.lib.helpers import FatalError
+
+
+_lxd_socket_candidates = [os.path.join(os.sep, 'var', 'snap', 'lxd', 'common', 'lxd', 'unix.socket'),
+                          os.path.join(os.sep, 'var', 'lib', 'lxd', 'unix.socket')]
+
+# LXD operation status codes
+_operation_running = 103
+_operation_success = 200
+
+
+class LxdRestError(FatalError):
+    """Exception raised if the LXD daemon reports an error.
+
+    Attributes:
+        message -- explanation of the error
+        status_code -- the HTTP status code or the LXD error code
+    """
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UnsupportedDownload(Exception):
+    """Raised if a download can not be streamed into a single file."""
+    pass
+
+
+def find_lxd_socket():
+    """
+    Find the unix socket of the local LXD daemon.
+    :return: The path of the socket or None if there is no accessible socket.
+    """
+    lxd_dir = os.environ.get('LXD_DIR')
+    if lxd_dir:
+        candidates = [os.path.join(lxd_dir, 'unix.socket')]
+    else:
+        candidates = _lxd_socket_candidates
+
+    for candidate in candidates:
+        if os.path.exists(candidate) and os.access(candidate, os.R_OK | os.W_OK):
+            return candidate
+
+    return None
+
+
+def quote_name(name):
+    return quote(name, safe='')
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout, blocksize):
+        super().__init__('lxd', timeout=timeout, blocksize=blocksize)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class LxdRestClient:
+    """
+    Talks to the LXD daemon using the REST API on its unix socket.
+    The connection gets reused for subsequent requests, asynchronous
+    operations get awaited and image bodies get streamed.
+    """
+    _chunk_size = 1024 * 1024
+    _operation_wait_timeout = 30
+    _retryable_methods = ('GET', 'HEAD')
+
+    def __init__(self, socket_path, timeout=120):
+        self.socket_path = socket_path
+        self._connection = _UnixHTTPConnection(socket_path, timeout, LxdRestClient._chunk_size)
+
+    def close(self):
+        self._connection.close()
+
+    def get(self, path, **params):
+        return self.request('GET', path, params=params)
+
+    def post(self, path, data):
+        return self.request('POST', path, data=data)
+
+    def put(self, path, data):
+        return self.request('PUT', path, data=data)
+
+    def patch(self, path, data):
+        return self.request('PATCH', path, data=data)
+
+    def delete(self, path):
+        return self.request('DELETE', path)
+
+    def request(self, method, path, data=None, params=None):
+        """
+        Send a request and wait for the resulting operation (if any).
+        :return: The metadata of the response or of the completed operation.
+        """
+        body = None
+        headers = {}
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+
+        # a request that modifies the state of LXD must not get sent twice
+        response = self._send(method, self._get_url(path, params), body, headers,
+                              retry=method in LxdRestClient._retryable_methods)
+        return self._get_metadata(response, path)
+
+    def upload(self, path, file, headers=None):
+        """
+        Stream the content of an open binary file to the LXD daemon.
+        :return: The metadata of the completed operation.
+        """
+        upload_headers = {'Content-Type': 'application/octet-stream',
+                          'Content-Length': str(os.fstat(file.fileno()).st_size)}
+        upload_headers.update(headers or {})
+        response = self._send('POST', path, file, upload_headers, retry=False)
+        return self._get_metadata(response, path)
+
+    def upload_multipart(self, path, files, headers=None):
+        """
+        Stream several open binary files as multipart form (e.g. the metadata and the rootfs of a split image).
+        :param files: A list of (field name, open binary file) tuples.
+        :return: The metadata of the completed operation.
+        """
+        boundary = uuid.uuid4().hex
+        parts = []
+        for field_name, file in files:
+            part_header = ('--{}\r\nContent-Disposition: form-data; name="{}"; filename="{}"\r\n'
+                           'Content-Type: application/octet-stream\r\n\r\n'
+                           ).format(boundary, field_name, os.path.basename(file.name)).encode()
+            parts.append((part_header, file))
+        trailer = '--{}--\r\n'.format(boundary).encode()
+
+        content_length = len(trailer)
+        for part_header, file in parts:
+            content_length += len(part_header) + os.fstat(file.fileno()).st_size + len(b'\r\n')
+
+        def stream_body():
+            for header, part_file in parts:
+                yield header
+                while True:
+                    chunk = part_file.read(LxdRestClient._chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+                yield b'\r\n'
+            yield trailer
+
+        upload_headers = {'Content-Type': 'multipart/form-data; boundary={}'.format(boundary),
+                          'Content-Length': str(content_length)}
+        upload_headers.update(headers or {})
+        response = self._send('POST', path, stream_body(), upload_headers, retry=False)
+        return self._get_metadata(response, path)
+
+    def download(self, path, target_without_extension):
+        """
+        Stream a file (e.g. an exported image) from the LXD daemon into a local file.
+        The file extension reported by the LXD daemon gets appended to the target.
+        The target only shows up once the download is complete.
+        :return: The path of the downloaded file.
+        """
+        try:
+            response = self._get_response('GET', path, None, {}, retry=True)
+        except (OSError, http.client.HTTPException) as error:
+            self._connection.close()
+            raise FatalError("Failed to download {} from LXD ({}).".format(path, error))
+
+        if response.status != http.client.OK:
+            self._get_metadata(self._read_json(response), path)
+
+        if response.getheader('Content-Type', '').startswith('multipart/'):
+            # split images consist of multiple files
+            self._connection.close()
+            raise UnsupportedDownload("Multipart download of {} is not supported.".format(path))
+
+        target = '{}{}'.format(target_without_extension,
+                               self._get_file_extension(response.getheader('Content-Disposition', '')))
+        partial_target = '{}.part'.format(target)
+        try:
+            with open(partial_target, mode='wb') as target_file:
+                while True:
+                    chunk = response.read(LxdRestClient._chunk_size)
+                    if not chunk:
+                        break
+                    target_file.write(chunk)
+            if response.length:
+                # reading in chunks does not detect a connection that got closed prematurely
+                raise http.client.IncompleteRead(b'', response.length)
+        except (OSError, http.client.HTTPException) as error:
+            self._connection.close()
+            if os.path.exists(partial_target):
+                os.remove(partial_target)
+            raise FatalError("Failed to download {} from LXD ({}).".format(path, error))
+
+        os.rename(partial_target, target)
+        return target
+
+    def wait_for_operation(self, operation):
+        """
+        Poll an asynchronous operation until it is completed.
+        :return: The metadata of the operation.
+        """
+        while True:
+            response = self._send('GET', '{}/wait?timeout={}'.format(operation, LxdRestClient._operation_wait_timeout),
+                                  None, {}, retry=True)
+            metadata = self._get_metadata(response, operation)
+            status_code = metadata.get('status_code')
+            if status_code == _operation_running:
+                continue
+            elif status_code != _operation_success:
+                raise LxdRestError("LXD operation {} failed: {}".format(operation, metadata.get('err', '')),
+                                   status_code)
+            return metadata
+
+    def _send(self, method, url, body, headers, retry):
+        return self._read_json(self._get_response(method, url, body, headers, retry))
+
+    def _get_response(self, method, url, body, headers, retry):
+        try:
+            self._connection.request(method, url, body=body, headers=headers)
+            return self._connection.getresponse()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            # the LXD daemon closed the reused connection
+            self._connection.close()
+            if not retry:
+                raise
+            self._connection.request(method, url, body=body, headers=headers)
+            return self._connection.getresponse()
+
+    @staticmethod
+    def _read_json(response):
+        content = response.read()
+        try:
+            return json.loads(content.decode())
+        except ValueError as error:
+            raise LxdRestError("Unable to parse the response of LXD ({}).".format(error), response.status)
+
+    def _get_metadata(self, response, path):
+        response_type = response.get('type')
+        if response_type == 'error':
+            raise LxdRestError("LXD request for {} failed: {}".format(path, response.get('error', '')),
+                               response.get('error_code'))
+        elif response_type == 'async':
+            operation = response.get('operation')
+            logging.debug("Waiting for LXD operation {}.".format(operation))
+            return self.wait_for_operation(operation)
+        else:
+            return response.get('metadata')
+
+    @staticmethod
+    def _get_url(path, params):
+        if params:
+            return '{}?{}'.format(path, urlencode(params))
+        else:
+            return path
+
+    @staticmethod
+    def _get_file_extension(content_disposition):
+        match = re.search(r'filename="?([^";]+)"?', content_disposition)
+        if not match:
+            return ''
+
+        file_name = match.group(1)
+        if '.' in file_name:
+            return file_name[file_name.index('.'):]
+        else:
+            return ''
@@ -21,6 +21,7 @@
 
 import subprocess
 import logging
+from edi.lib.profiler import Profiler, run_profiled
 
 
 def run_mockable(*popenargs, **kwargs):
@@ -30,6 +31,9 @@ def run_mockable(*popenargs, **kwargs):
     :param kwargs: pass through to subprocess.run
     :return: passes back the result of subprocess.run()
     """
+    if Profiler.is_enabled():
+        return run_profiled(*popenargs, **kwargs)
+
     return subprocess.run(*popenargs, **kwargs)
 
 
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+from edi.lib.helpers import FatalError
+
+
+class PackageRecord(dict):
+    """
+    Dictionary of an installed package including its baseline version (and optionally its changelog).
+
+    The record gets built once per package and shared among all documentation steps. Within Jinja2
+    templates it behaves like the original dictionary (e.g. package.version, package['version'] or
+    package|tojson).
+    """
+    __slots__ = ('_name',)
+
+    def __init__(self, package, name, baseline_version, changelog=None):
+        super().__init__(package)
+        self._name = name
+        self['baseline_version'] = baseline_version
+        if changelog is not None:
+            self['changelog'] = changelog
+
+    def get_name(self):
+        return self._name
+
+    def get_baseline_version(self):
+        return self['baseline_version']
+
+    def with_changelog(self, changelog):
+        """
+        Get a record of the same package that includes the changelog.
+        """
+        return PackageRecord(self, self._name, self['baseline_version'], changelog)
+
+    def to_dict(self):
+        return dict(self)
+
+
+class PackageIndex:
+    """
+    Index of the installed packages that gets built once per documentation run.
+
+    The index offers the lookup of packages and baseline versions by name and
+    remembers the package selections of the documentation steps (steps that
+    include and exclude the same packages share the selection).
+    """
+
+    def __init__(self, installed_packages, baseline_versions):
+        """
+        :param installed_packages: The list of package dictionaries (in the order of packages.yml).
+        :param baseline_versions: A dictionary mapping the package names to their baseline version.
+        """
+        self._records = []
+        self._by_name = dict()
+        for package in installed_packages:
+            name = self._get_name(package)
+            record = PackageRecord(package, name, baseline_versions.get(name, "0.0.0"))
+            self._records.append(record)
+            self._by_name.setdefault(name, []).append(record)
+
+        self._baseline_versions = baseline_versions
+        self._selections = dict()
+
+    def __len__(self):
+        return len(self._records)
+
+    def get_records(self, name):
+        return self._by_name.get(name, [])
+
+    def get_baseline_version(self, name):
+        return self._baseline_versions.get(name, "0.0.0")
+
+    def select(self, include_packages=None, exclude_packages=None):
+        """
+        Select the installed packages that are included and not excluded.
+        :param include_packages: A list of package names or None to include all installed packages.
+        :param exclude_packages: A list of package names or None.
+        :return: A tuple of package records in the order of the installed packages.
+        """
+        key = (frozenset(include_packages) if include_packages is not None else None,
+               frozenset(exclude_packages or []))
+        selection = self._selections.get(key)
+        if selection is None:
+            included, excluded = key
+            selection = tuple(record for record in self._records
+                              if (included is None or record.get_name() in included) and
+                              record.get_name() not in excluded)
+            self._selections[key] = selection
+
+        return selection
+
+    @staticmethod
+    def _get_name(package):
+        name = package.get('package')
+        if not name:
+            raise FatalError("Missing '{}' key in dictionary of package ({}).".format('package', package))
+        return name
@@ -20,47 +20,81 @@
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
 import click
+import configparser
+import json
 import os
 import logging
 import subprocess
 import tempfile
 import yaml
 from codecs import open
-from edi.lib.helpers import chown_to_user, FatalError
+from edi.lib.helpers import chown_to_user, FatalError, create_user_directory
 from edi.lib.helpers import print_error, get_user, get_workdir
-from edi.lib.shellhelpers import run, require
+from edi.lib.shellhelpers import run, require, step_log, get_user_home_directory
+from edi.lib.buildahhelpers import run_in_mounted_container
 from edi.lib.sharedfoldercoordinator import SharedFolderCoordinator
 from edi.lib.configurationparser import remove_passwords
+from edi.lib.profiler import profiled_stage
+from edi.lib.artifactcache import get_fingerprint, get_directory_digest
 
 
-class PlaybookRunner:
+def get_default_ansible_config():
+    """
+    Get the performance related Ansible settings that edi applies if the generated ansible.cfg is enabled.
+    The ssh connections get multiplexed using a persistent control path.
+    """
+    ansible_cache_directory = os.path.join(get_user_home_directory(get_user()), '.cache', 'edi', 'ansible')
+    return {
+        'defaults': {
+            'forks': max(5, os.cpu_count() or 1),
+        },
+        'ssh_connection': {
+            'pipelining': True,
+            'ssh_args': '-o ControlMaster=auto -o ControlPersist=300s',
+            'control_path_dir': os.path.join(ansible_cache_directory, 'cp'),
+        },
+    }
+
 
+class PlaybookRunner:
     def __init__(self, config, target, connection):
         self.config = config
         self.target = target
         self.connection = connection
         self.config_section = 'playbooks'
+        self._ansible_config_file = None
 
-    def run_all(self):
+    def run_all(self, skip=0, playbook_done=None):
+        """
+        Run the playbooks.
+        :param skip: The number of leading playbooks that have already been applied to the target.
+        :param playbook_done: Optional callback that gets invoked with the index and the name of every
+                              completed playbook (not available if the playbooks get aggregated).
+        :return: The names of the applied playbooks.
+        """
         workdir = get_workdir()
 
         applied_playbooks = []
         with tempfile.TemporaryDirectory(dir=workdir) as tempdir:
             chown_to_user(tempdir)
             inventory = self._write_inventory_file(tempdir)
+            collected_playbooks = self._get_playbooks()[skip:]
 
-            collected_playbooks = self._get_playbooks()
+            if self._has_own_ansible_config([path for _, path, _ in collected_playbooks]):
+                self._ansible_config_file = None
+            else:
+                self._ansible_config_file = self._write_ansible_config_file(tempdir)
+
+            if len(collected_playbooks) > 1 and self.config.get_aggregate_playbooks():
+                assert playbook_done is None
+                return self._run_aggregated_playbooks(tempdir, inventory, collected_playbooks)
 
             if len(collected_playbooks) > 1 and self.config.get_start_task():
-                raise FatalError("The -s/--start-at-task feature is currently only available for configurations "
-                                 "that contain just one playbook!")
+                raise FatalError("The -s/--start-at-task feature is only available for configurations "
+                                 "that contain just one playbook or that set 'edi_aggregate_playbooks'!")
 
-            for name, path, extra_vars, in collected_playbooks:
-                logging.info(("Running playbook {} located in "
-                              "{} with extra vars:\n{}"
-                              ).format(name, path,
-                                       yaml.dump(remove_passwords(extra_vars),
-                                                 default_flow_style=False)))
+            for index, (name, path, extra_vars) in enumerate(collected_playbooks, start=skip):
+                self._log_playbook(name, path, extra_vars)
 
                 extra_vars_file = os.path.join(tempdir, ("extra_vars_{}"
                                                          ).format(name))
@@ -68,11 +102,81 @@ class PlaybookRunner:
                     f.write(yaml.dump(extra_vars))
 
                 ansible_user = extra_vars.get("edi_config_management_user_name")
-                self._run_playbook(path, inventory, extra_vars_file, ansible_user)
+                with profiled_stage(name, self.config_section), \
+                        step_log('{}_{}'.format(self.config_section, name)):
+                    self._run_playbook(path, inventory, extra_vars_file, ansible_user)
                 applied_playbooks.append(name)
+                if playbook_done:
+                    playbook_done(index, name)
 
         return applied_playbooks
 
+    def _run_aggregated_playbooks(self, tempdir, inventory, playbooks):
+        """
+        Run all playbooks within a single ansible-playbook process using a wrapper playbook.
+        The variables that are common to all playbooks get passed as extra vars. The remaining
+        variables get written unaltered (and therefore with their original types) to the vars of the
+        corresponding import_playbook statement. Unlike facts, these vars only apply to the imported
+        playbook (and they override the play vars of it).
+        """
+        user_names = {extra_vars.get("edi_config_management_user_name") for _, _, extra_vars in playbooks}
+        if len(user_names) > 1:
+            raise FatalError(("The playbooks can only get aggregated if they use the same "
+                              "'edi_config_management_user_name'!"))
+
+        common_vars = self._get_common_vars([extra_vars for _, _, extra_vars in playbooks])
+
+        wrapper_playbook = []
+        for name, path, extra_vars in playbooks:
+            self._log_playbook(name, path, extra_vars)
+            playbook_vars = {key: value for key, value in extra_vars.items() if key not in common_vars}
+            imported_playbook = {'name': name, 'import_playbook': os.path.abspath(path)}
+            if playbook_vars:
+                imported_playbook['vars'] = playbook_vars
+            wrapper_playbook.append(imported_playbook)
+
+        wrapper_playbook_file = os.path.join(tempdir, "playbooks.yml")
+        with open(wrapper_playbook_file, encoding='utf-8', mode='w') as f:
+            f.write(yaml.dump(wrapper_playbook))
+        chown_to_user(wrapper_playbook_file)
+
+        extra_vars_file = os.path.join(tempdir, "extra_vars")
+        with open(extra_vars_file, encoding='utf-8', mode='w') as f:
+            f.write(yaml.dump(common_vars))
+
+        ansible_user = user_names.pop()
+        with profiled_stage('aggregated', self.config_section), \
+                step_log('{}_aggregated'.format(self.config_section)):
+            self._run_playbook(wrapper_playbook_file, inventory, extra_vars_file, ansible_user)
+
+        return [name for name, _, _ in playbooks]
+
+    @staticmethod
+    def _get_common_vars(extra_vars_list):
+        first, others = extra_vars_list[0], extra_vars_list[1:]
+        return {key: value for key, value in first.items()
+                if all(key in extra_vars and extra_vars[key] == value for extra_vars in others)}
+
+    @staticmethod
+    def _log_playbook(name, path, extra_vars):
+        logging.info(("Running playbook {} located in "
+                      "{} with extra vars:\n{}"
+                      ).format(name, path,
+                               yaml.dump(remove_passwords(extra_vars),
+                                         default_flow_style=False)))
+
+    def get_fingerprints(self, base_fingerprint):
+        """
+        Get a chained fingerprint per playbook: Each fingerprint covers the content of the playbook
+        directory, the extra vars and the fingerprint of the preceding playbook (or the base fingerprint).
+        """
+        fingerprints = []
+        fingerprint = base_fingerprint
+        for name, path, extra_vars in self._get_playbooks():
+            fingerprint = get_fingerprint(fingerprint, name, get_directory_digest(os.path.dirname(path)), extra_vars)
+            fingerprints.append(fingerprint)
+        return fingerprints
+
     def _get_playbooks(self):
         augmented_list = []
         playbook_list = self.config.get_ordered_path_items(self.config_section)
@@ -114,6 +218,10 @@ class PlaybookRunner:
         cmd.extend(["--connection", self.connection])
         cmd.extend(["--inventory", inventory])
         cmd.extend(["--extra-vars", "@{}".format(extra_vars)])
+        if self.connection == "chroot":
+            # the target is a buildah container that gets mounted for the whole run
+            chroot_vars = {'ansible_host': "{{ lookup('env', 'edi_project_container_root') }}"}
+            cmd.extend(["--extra-vars", json.dumps(chroot_vars)])
         if self.connection == "ssh":
             cmd.extend(["--user", ansible_user])
         cmd.append(playbook)
@@ -122,10 +230,15 @@ class PlaybookRunner:
 
         ansible_env = os.environ.copy()
         ansible_env['ANSIBLE_REMOTE_TEMP'] = '/tmp/ansible-{}'.format(get_user())
+        if self._ansible_config_file:
+            ansible_env['ANSIBLE_CONFIG'] = self._ansible_config_file
 
         while True:
             try:
-                run(cmd, env=ansible_env, log_threshold=logging.INFO)
+                if self.connection == "chroot":
+                    run_in_mounted_container(self.target, cmd, env=ansible_env)
+                else:
+                    run(cmd, env=ansible_env, log_threshold=logging.INFO)
                 break
             except subprocess.CalledProcessError as error:
                 if self.config.debug_mode():
@@ -141,6 +254,53 @@ class PlaybookRunner:
                 else:
                     raise error
 
+    @staticmethod
+    def _has_own_ansible_config(playbooks):
+        """
+        An explicitly specified ANSIBLE_CONFIG or an ansible.cfg next to a playbook takes precedence.
+        """
+        if os.environ.get('ANSIBLE_CONFIG'):
+            return True
+
+        return any(os.path.isfile(os.path.join(os.path.dirname(os.path.abspath(playbook)), 'ansible.cfg'))
+                   for playbook in playbooks)
+
+    def _write_ansible_config_file(self, tempdir):
+        """
+        Write the default Ansible settings merged with the settings of the project
+        configuration (a setting with the value null gets removed).
+        """
+        overrides = self.config.get_ansible_config()
+        if overrides is None:
+            return None
+
+        settings = get_default_ansible_config()
+        for section, section_overrides in overrides.items():
+            section_settings = settings.setdefault(section, {})
+            for key, value in section_overrides.items():
+                if value is None:
+                    section_settings.pop(key, None)
+                else:
+                    section_settings[key] = value
+
+        ansible_config = configparser.RawConfigParser()
+        for section, section_settings in settings.items():
+            ansible_config[section] = {key: str(value) for key, value in section_settings.items()}
+
+        directories = [settings.get('ssh_connection', {}).get('control_path_dir')]
+        if settings.get('defaults', {}).get('fact_caching') == 'jsonfile':
+            directories.append(settings['defaults'].get('fact_caching_connection'))
+        for directory in directories:
+            if directory:
+                create_user_directory(os.path.expanduser(str(directory)))
+
+        ansible_config_file = os.path.join(tempdir, "ansible.cfg")
+        with open(ansible_config_file, encoding='utf-8', mode='w') as f:
+            ansible_config.write(f)
+        chown_to_user(ansible_config_file)
+        logging.debug("Generated Ansible configuration:\n{}".format(settings))
+        return ansible_config_file
+
     def _write_inventory_file(self, tempdir):
         inventory_file = os.path.join(tempdir, "inventory")
         with open(inventory_file, encoding='utf-8', mode='w') as f:
@@ -22,7 +22,6 @@
 import subprocess
 import yaml
 import logging
-from packaging.version import Version
 from edi.lib.helpers import FatalError
 from edi.lib.versionhelpers import get_stripped_version
 from edi.lib.shellhelpers import run, Executables, require
@@ -61,6 +60,7 @@ class PodmanVersion:
         if PodmanVersion._check_done:
             return
 
+        from packaging.version import Version
         if Version(get_stripped_version(get_podman_version())) < Version(PodmanVersion._required_minimal_version):
             raise FatalError(('The current podman installation ({}) does not meet the minimal requirements (>={}).\n'
                               'Please update your podman installation!'
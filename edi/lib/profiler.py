@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import resource
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Profiler:
+    """
+    Records the wall time, the CPU time, the peak RSS and the written bytes of the edi stages
+    (commands, playbooks, postprocessing commands, ...) and of every subprocess.
+
+    The recording is disabled by default and gets enabled by the --profile flag.
+    """
+    _enabled = False
+    _events = []
+    _origin = 0.0
+    _lock = threading.Lock()
+    _report_file_name = 'edi_profile.json'
+    _trace_file_name = 'edi_profile.trace.json'
+
+    def __init__(self, clear_cache=False):
+        if clear_cache:
+            Profiler._enabled = False
+            Profiler._events = []
+
+    @staticmethod
+    def enable():
+        Profiler._enabled = True
+        Profiler._events = []
+        Profiler._origin = time.perf_counter()
+
+    @staticmethod
+    def is_enabled():
+        return Profiler._enabled
+
+    @staticmethod
+    def get_events():
+        with Profiler._lock:
+            return list(Profiler._events)
+
+    @staticmethod
+    def record(name, category, start, wall_time, cpu_time=None, peak_rss=None, bytes_written=None, **details):
+        """
+        Record a stage or a subprocess.
+        :param start: The perf_counter value at the beginning of the stage.
+        :param wall_time: The duration in seconds.
+        :param cpu_time: The consumed user and system time in seconds.
+        :param peak_rss: The peak resident set size in bytes.
+        :param bytes_written: The number of bytes written to the storage layer.
+        """
+        event = {'name': name, 'category': category,
+                 'start': round(start - Profiler._origin, 6), 'wall_time': round(wall_time, 6),
+                 'cpu_time': None if cpu_time is None else round(cpu_time, 6),
+                 'peak_rss': peak_rss, 'bytes_written': bytes_written,
+                 'pid': os.getpid(), 'thread': threading.get_ident()}
+        event.update(details)
+        with Profiler._lock:
+            Profiler._events.append(event)
+
+    @staticmethod
+    def write_report(directory):
+        """
+        Write the timing report (json) and a Chrome trace event file (chrome://tracing or Perfetto).
+        :return: The paths of the report and of the trace file.
+        """
+        events = Profiler.get_events()
+        report_file = os.path.join(directory, Profiler._report_file_name)
+        with open(report_file, encoding='utf-8', mode='w') as f:
+            json.dump({'events': events}, f, indent=2)
+
+        thread_ids = dict()
+        trace_events = []
+        for event in events:
+            thread_id = thread_ids.setdefault(event['thread'], len(thread_ids) + 1)
+            arguments = {key: value for key, value in event.items()
+                         if key not in ['name', 'category', 'start', 'wall_time', 'pid', 'thread']}
+            trace_events.append({'name': event['name'], 'cat': event['category'], 'ph': 'X',
+                                 'ts': int(event['start'] * 1000000), 'dur': int(event['wall_time'] * 1000000),
+                                 'pid': event['pid'], 'tid': thread_id, 'args': arguments})
+
+        trace_file = os.path.join(directory, Profiler._trace_file_name)
+        with open(trace_file, encoding='utf-8', mode='w') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+
+        return report_file, trace_file
+
+
+def _get_written_bytes():
+    try:
+        with open('/proc/self/io', mode='r') as f:
+            for line in f:
+                if line.startswith('write_bytes:'):
+                    return int(line.split(':')[1])
+    except OSError:
+        pass
+    return None
+
+
+@contextmanager
+def profiled_stage(name, category='stage'):
+    """
+    Record the resource consumption of a stage (including the subprocesses that it runs).
+    The CPU time and the written bytes of concurrently running stages get attributed to each of them.
+    """
+    if not Profiler.is_enabled():
+        yield
+        return
+
+    start = time.perf_counter()
+    self_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    written_before = _get_written_bytes()
+    try:
+        yield
+    finally:
+        wall_time = time.perf_counter() - start
+        self_after = resource.getrusage(resource.RUSAGE_SELF)
+        children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        written_after = _get_written_bytes()
+        cpu_time = ((self_after.ru_utime + self_after.ru_stime - self_before.ru_utime - self_before.ru_stime) +
+                    (children_after.ru_utime + children_after.ru_stime -
+                     children_before.ru_utime - children_before.ru_stime))
+        bytes_written = (children_after.ru_oublock - children_before.ru_oublock) * 512
+        if written_before is not None and written_after is not None:
+            bytes_written += written_after - written_before
+        peak_rss = max(self_after.ru_maxrss, children_after.ru_maxrss) * 1024
+        Profiler.record(name, category, start, wall_time, cpu_time, peak_rss, bytes_written)
+
+
+def run_profiled(popenargs, input=None, timeout=None, check=False, **kwargs):
+    """
+    Equivalent of subprocess.run() that records the resource consumption of the subprocess.
+    The subprocess gets reaped using os.wait4() in order to get the resource usage of exactly this child.
+    A timeout can not be combined with os.wait4(): in that case the resource consumption is the difference
+    of the resource usage of the terminated children before and after the call and the peak RSS is unknown.
+    """
+    start = time.perf_counter()
+    if timeout is not None:
+        return _run_profiled_with_timeout(popenargs, start, input=input, timeout=timeout, check=check, **kwargs)
+
+    if input is not None:
+        kwargs['stdin'] = subprocess.PIPE
+
+    return_code = None
+    usage = None
+    try:
+        with subprocess.Popen(popenargs, **kwargs) as process:
+            try:
+                stdout, stderr = _communicate(process, input)
+                _, status, usage = os.wait4(process.pid, 0)
+            except BaseException:
+                process.kill()
+                raise
+            process.returncode = return_code = _get_exit_code(status)
+
+        if check and return_code:
+            raise subprocess.CalledProcessError(return_code, process.args, output=stdout, stderr=stderr)
+        return subprocess.CompletedProcess(process.args, return_code, stdout, stderr)
+    finally:
+        wall_time = time.perf_counter() - start
+        if usage:
+            Profiler.record(subprocess.list2cmdline(popenargs), 'subprocess', start, wall_time,
+                            usage.ru_utime + usage.ru_stime, usage.ru_maxrss * 1024, usage.ru_oublock * 512,
+                            return_code=return_code)
+        else:
+            Profiler.record(subprocess.list2cmdline(popenargs), 'subprocess', start, wall_time,
+                            return_code=return_code)
+
+
+def _run_profiled_with_timeout(popenargs, start, **kwargs):
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return_code = None
+    try:
+        result = subprocess.run(popenargs, **kwargs)
+        return_code = result.returncode
+        return result
+    except subprocess.CalledProcessError as error:
+        return_code = error.returncode
+        raise
+    finally:
+        wall_time = time.perf_counter() - start
+        children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_time = (children_after.ru_utime + children_after.ru_stime -
+                    children_before.ru_utime - children_before.ru_stime)
+        bytes_written = (children_after.ru_oublock - children_before.ru_oublock) * 512
+        Profiler.record(subprocess.list2cmdline(popenargs), 'subprocess', start, wall_time, cpu_time,
+                        None, bytes_written, return_code=return_code)
+
+
+def _communicate(process, input):
+    """
+    Feed the input to the process and collect its output without reaping it (unlike Popen.communicate()).
+    """
+    output = {}
+
+    def read(name, pipe):
+        with pipe:
+            output[name] = pipe.read()
+
+    def write(pipe):
+        with pipe:
+            try:
+                if input is not None:
+                    pipe.write(input)
+            except BrokenPipeError:
+                pass
+
+    threads = []
+    if process.stdin:
+        threads.append(threading.Thread(target=write, args=(process.stdin,)))
+    for name in ('stdout', 'stderr'):
+        pipe = getattr(process, name)
+        if pipe:
+            threads.append(threading.Thread(target=read, args=(name, pipe)))
+
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return output.get('stdout'), output.get('stderr')
+
+
+def _get_exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
@@ -20,7 +20,6 @@
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from jinja2 import Template
 from edi.lib.helpers import FatalError
 from edi.lib.shellhelpers import run, require
 from edi.lib.lxchelpers import lxc_exec, lxd_install_hint, LxdVersion
@@ -28,6 +27,7 @@ import os
 import logging
 import subprocess
 from edi.lib.yamlhelpers import normalize_yaml
+from edi.lib.templateengine import TemplateEngine
 
 
 profile_privileged = """
@@ -130,7 +130,8 @@ class SharedFolderCoordinator():
             return []
 
         if self._config.get_ordered_raw_items('shared_folders'):
-            return [(normalize_yaml(Template(profile_privileged).render({})), 'zzz_privileged', 'builtin', {})]
+            profile_text = TemplateEngine().render_string(profile_privileged, {})
+            return [(normalize_yaml(profile_text), 'zzz_privileged', 'builtin', {})]
         else:
             return []
 
@@ -145,12 +146,12 @@ class SharedFolderCoordinator():
         shared_folders = self._config.get_ordered_raw_items('shared_folders')
         if shared_folders:
             profiles = self.get_pre_config_profiles()
-            template = Template(profile_shared_folder)
             for name, content, node_dict in shared_folders:
                 for item in ['folder', 'mountpoint']:
                     node_dict['shared_folder_{}'.format(item)] = self._get_mandatory_item(name, content, item)
                 node_dict['shared_folder_name'] = name
-                profiles.append((normalize_yaml(template.render(node_dict)),
+                profile_text = TemplateEngine().render_string(profile_shared_folder, node_dict)
+                profiles.append((normalize_yaml(profile_text),
                                  'zzz_{}'.format(name), 'builtin', node_dict))
 
             return profiles
@@ -19,37 +19,45 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
 import logging
+import select
 import subprocess
+import sys
 import os
 import re
+import threading
+import time
 from pwd import getpwuid
 from shutil import rmtree
 from tempfile import mkdtemp
 from contextlib import contextmanager
-from edi.lib.helpers import get_user, get_artifact_dir, FatalError, which
-from edi.lib import mockablerun
+from edi.lib.helpers import get_user, get_artifact_dir, create_artifact_dir, chown_to_user, FatalError, which
+from edi.lib import mockablerun, hostfacthelpers
 
 _ADAPTIVE = -42
 
+# number of output lines that get kept for error reports
+_tail_line_count = 100
+
+_step_log = threading.local()
+
 
 def run(popenargs, sudo=False, input=None, timeout=None, check=True, universal_newlines=True,
         stdout=_ADAPTIVE, log_threshold=logging.DEBUG,
         **kwargs):
     """
     Small wrapper around subprocess.run().
+    By default (stdout=_ADAPTIVE) the output goes straight to the terminal if it gets logged (using
+    log_threshold) and no step is active. Otherwise it gets streamed with bounded memory: stdout gets
+    forwarded line by line to the logger and only the last lines of it get kept and attached to the
+    CalledProcessError if the command fails. Within a step (see step_log) stderr gets forwarded to the
+    terminal as well and the whole output gets appended to the log file of the step.
+    Use stdout=subprocess.PIPE to get the output within the returned CompletedProcess.
     """
 
     assert type(popenargs) is list
 
-    subprocess_stdout = stdout
-
-    if subprocess_stdout == _ADAPTIVE:
-        if mockablerun.is_logging_enabled_for(log_threshold):
-            subprocess_stdout = None
-        else:
-            subprocess_stdout = subprocess.PIPE
-
     all_args = list()
     if not sudo and os.getuid() == 0 and not is_running_in_user_namespace():
         current_user = get_user()
@@ -63,15 +71,189 @@ def run(popenargs, sudo=False, input=None, timeout=None, check=True, universal_n
 
     logging.log(log_threshold, "Running command: {0}".format(all_args))
 
-    result = mockablerun.run_mockable(all_args, input=input, timeout=timeout, check=check,
-                                      universal_newlines=universal_newlines,
-                                      stdout=subprocess_stdout, **kwargs)
+    if stdout != _ADAPTIVE:
+        result = mockablerun.run_mockable(all_args, input=input, timeout=timeout, check=check,
+                                          universal_newlines=universal_newlines,
+                                          stdout=stdout, **kwargs)
+
+        if (mockablerun.is_logging_enabled_for(log_threshold) and
+                stdout is subprocess.PIPE):
+            logging.log(log_threshold, result.stdout)
+
+        return result
+
+    step_log_file = get_step_log_file()
+    if not step_log_file and mockablerun.is_logging_enabled_for(log_threshold):
+        # nothing needs to be captured: keep the terminal (e.g. for progress bars and prompts)
+        return mockablerun.run_mockable(all_args, input=input, timeout=timeout, check=check,
+                                        universal_newlines=universal_newlines, stdout=None, **kwargs)
+
+    streamer = OutputStreamer(log_threshold, step_log_file,
+                              stream_stderr=bool(step_log_file) and 'stderr' not in kwargs)
+    try:
+        result = mockablerun.run_mockable(all_args, input=input, timeout=timeout, check=check,
+                                          universal_newlines=universal_newlines,
+                                          **streamer.start(), **kwargs)
+        streamer.stop()
+        return result
+    except subprocess.CalledProcessError as error:
+        streamer.stop()
+        if error.output is None:
+            error.output = streamer.get_tail()
+        raise
+    finally:
+        streamer.stop()
+
+
+class OutputStreamer:
+    """
+    Streams the output of a subprocess through non-blocking pipes while the subprocess is running.
+
+    Only a bounded number of trailing lines of the output gets kept for error reports.
+    The full output gets appended to a log file (if any).
+    """
+    # time that the forwarding continues after the subprocess terminated (e.g. a daemon holds the pipe)
+    _drain_timeout = 1.0
+
+    def __init__(self, log_threshold=logging.DEBUG, log_file=None, stream_stderr=True):
+        self.log_threshold = log_threshold
+        self.log_file = log_file
+        self.stream_stderr = stream_stderr
+        self._tail = collections.deque(maxlen=_tail_line_count)
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._log = None
+        self._pipes = []
+        self._threads = []
+
+    def start(self):
+        """
+        Start forwarding the output.
+        :return: The stdout (and stderr) keyword arguments for subprocess.run().
+        """
+        if self.log_file:
+            self._log = open(self.log_file, mode='ab')
+
+        subprocess_kwargs = {'stdout': self._add_pipe(self._forward_to_logger)}
+        if self.stream_stderr:
+            subprocess_kwargs['stderr'] = self._add_pipe(self._forward_to_stderr)
+        return subprocess_kwargs
+
+    def stop(self):
+        """
+        Stop forwarding the output as soon as all the pending output got processed.
+        """
+        for read_fd, write_fd in self._pipes:
+            os.close(write_fd)
+        self._done.set()
+        for thread in self._threads:
+            thread.join()
+        for read_fd, _ in self._pipes:
+            os.close(read_fd)
+        self._pipes = []
+        self._threads = []
+
+        if self._log:
+            self._log.close()
+            self._log = None
+
+    def get_tail(self):
+        with self._lock:
+            return ''.join(self._tail)
+
+    def _add_pipe(self, forward):
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        self._pipes.append((read_fd, write_fd))
+        thread = threading.Thread(target=self._pump, args=(read_fd, forward), daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return write_fd
+
+    def _pump(self, read_fd, forward):
+        pending = b''
+        deadline = None
+        while True:
+            if self._done.is_set():
+                # e.g. a daemon spawned by the subprocess still holds (and writes to) the pipe
+                if deadline is None:
+                    deadline = time.monotonic() + OutputStreamer._drain_timeout
+                elif time.monotonic() > deadline:
+                    break
+
+            readable, _, _ = select.select([read_fd], [], [], 0.1)
+            if readable:
+                try:
+                    chunk = os.read(read_fd, 65536)
+                except BlockingIOError:
+                    continue
+                if not chunk:
+                    break
+                lines = (pending + chunk).split(b'\n')
+                pending = lines.pop()
+                for line in lines:
+                    self._process_line(line + b'\n', forward)
+            elif self._done.is_set():
+                break
+
+        if pending:
+            self._process_line(pending, forward)
+
+    def _process_line(self, line, forward):
+        text = line.decode(errors='replace')
+        with self._lock:
+            self._tail.append(text)
+            if self._log:
+                self._log.write(line)
+        forward(text)
+
+    def _forward_to_logger(self, text):
+        logging.log(self.log_threshold, text.rstrip('\n'))
+
+    @staticmethod
+    def _forward_to_stderr(text):
+        sys.stderr.write(text)
+        sys.stderr.flush()
+
 
-    if (mockablerun.is_logging_enabled_for(log_threshold) and
-            subprocess_stdout is subprocess.PIPE):
-        logging.log(log_threshold, result.stdout)
+def get_step_log_file():
+    """
+    Get the log file of the step that is currently executed by this thread.
+    :return: The path of the log file or None if there is no active step.
+    """
+    return getattr(_step_log, 'log_file', None)
+
+
+def create_step_log_file(name):
+    """
+    Create an empty log file for a processing step within the artifacts directory.
+    :return: The path of the log file.
+    """
+    create_artifact_dir()
+    log_directory = os.path.join(get_artifact_dir(), '.edi_logs')
+    if not os.path.isdir(log_directory):
+        os.makedirs(log_directory, exist_ok=True)
+        chown_to_user(log_directory)
 
-    return result
+    log_file = os.path.join(log_directory, '{}.log'.format(name))
+    with open(log_file, mode='w'):
+        pass
+    chown_to_user(log_file)
+    return log_file
+
+
+@contextmanager
+def step_log(name):
+    """
+    Append the full output of the commands that get executed by the current thread to a step log file
+    (artifacts/.edi_logs/NAME.log).
+    """
+    previous_log_file = get_step_log_file()
+    _step_log.log_file = create_step_log_file(name)
+    try:
+        yield _step_log.log_file
+    finally:
+        _step_log.log_file = previous_log_file
 
 
 def is_running_in_user_namespace():
@@ -89,14 +271,8 @@ def get_environment_variable(name, default=None):
     # the environment variable HOME is treated differently on Ubuntu and Debian
     # use get_user_home_directory instead
     assert name != 'HOME'
-    cmd = ["printenv", name]
-    # in order to keep environment variables do not drop privileges with sudo -u ...
-    keep_sudo = os.getuid() == 0
-    result = run(cmd, stdout=subprocess.PIPE, check=False, sudo=keep_sudo)
-    if result.returncode == 0:
-        return result.stdout.strip('\n')
-    else:
-        return default
+    # printenv would see the very same environment as the current process
+    return hostfacthelpers.get_environment_variable(name, default)
 
 
 def get_current_display():
@@ -109,12 +285,20 @@ def get_current_display():
 
 
 def get_user_home_directory(username):
+    home_directory = hostfacthelpers.get_user_home_directory(username)
+    if home_directory is not None:
+        return home_directory
+
     cmd = ['getent', 'passwd', username]
     result = run(cmd, stdout=subprocess.PIPE)
     return result.stdout.split(':')[5]
 
 
 def get_debian_architecture():
+    architecture = hostfacthelpers.get_debian_architecture()
+    if architecture is not None:
+        return architecture
+
     cmd = ['dpkg', '--print-architecture']
     return run(cmd, stdout=subprocess.PIPE).stdout.strip('\n')
 
@@ -26,6 +26,7 @@ import subprocess
 import re
 from edi.lib.shellhelpers import run, get_user_home_directory, is_running_in_user_namespace
 import edi.lib.helpers
+from edi.lib import hostfacthelpers
 
 
 def get_user_ssh_pub_keys():
@@ -36,11 +37,13 @@ def get_user_ssh_pub_keys():
     if not edi.lib.helpers.which('ssh') or is_running_in_user_namespace():
         return []
 
-    random_host = ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(10))
-    cmd = ['ssh', '-G', random_host]
-    ssh_config = run(cmd, stdout=subprocess.PIPE).stdout
     user_home = get_user_home_directory(edi.lib.helpers.get_user())
-    identity_files = re.findall(r'^identityfile (.*)$', ssh_config, flags=re.MULTILINE)
+    identity_files = hostfacthelpers.get_ssh_identity_files(user_home)
+    if identity_files is None:
+        random_host = ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(10))
+        cmd = ['ssh', '-G', random_host]
+        ssh_config = run(cmd, stdout=subprocess.PIPE).stdout
+        identity_files = re.findall(r'^identityfile (.*)$', ssh_config, flags=re.MULTILINE)
     ssh_pub_keys = []
     for file in identity_files:
         expanded_file = re.sub(r'^~', user_home, file)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import hashlib
+import logging
+import os
+import threading
+from edi.lib.helpers import create_user_directory, get_user
+from edi.lib.shellhelpers import get_user_home_directory
+
+
+class TemplateEngine:
+    """
+    Process wide service for the rendering of Jinja2 templates.
+
+    One Jinja2 environment gets created per template directory (and option
+    set). The environment keeps the compiled templates in memory and reloads
+    a template as soon as its modification time changes. The compiled
+    templates additionally get persisted within a bytecode cache
+    (~/.cache/edi/templates of the current user) that is shared among
+    subsequent edi invocations.
+    """
+    _environments = {}
+    _string_templates = collections.OrderedDict()
+    _max_string_templates = 128
+    _cache_directory = None
+    _cache_directory_initialized = False
+    _lock = threading.Lock()
+
+    def __init__(self, clear_cache=False):
+        if clear_cache:
+            with TemplateEngine._lock:
+                TemplateEngine._environments = {}
+                TemplateEngine._string_templates = collections.OrderedDict()
+                TemplateEngine._cache_directory = None
+                TemplateEngine._cache_directory_initialized = False
+
+    def get_template(self, path, **options):
+        """
+        Get the compiled template of a file.
+        :param path: The path of the template file.
+        :param options: Additional Jinja2 environment options (e.g. trim_blocks).
+        :return: A Jinja2 template.
+        """
+        environment = self._get_environment(os.path.dirname(os.path.abspath(path)), options)
+        return environment.get_template(os.path.basename(path))
+
+    def render_file(self, path, dictionary, **options):
+        return self.get_template(path, **options).render(dictionary)
+
+    def render_string(self, source, dictionary):
+        """
+        Render a template string. The most recently used templates get kept in memory.
+        """
+        with TemplateEngine._lock:
+            template = TemplateEngine._string_templates.get(source)
+            if template is not None:
+                TemplateEngine._string_templates.move_to_end(source)
+
+        if template is None:
+            template = self._get_environment(None, {}).from_string(source)
+            with TemplateEngine._lock:
+                TemplateEngine._string_templates[source] = template
+                while len(TemplateEngine._string_templates) > TemplateEngine._max_string_templates:
+                    TemplateEngine._string_templates.popitem(last=False)
+
+        return template.render(dictionary)
+
+    def _get_environment(self, search_path, options):
+        option_key = tuple(sorted(options.items()))
+        key = (search_path, option_key)
+        with TemplateEngine._lock:
+            environment = TemplateEngine._environments.get(key)
+            if environment is None:
+                import jinja2
+                loader = jinja2.FileSystemLoader(searchpath=search_path) if search_path else None
+                environment = jinja2.Environment(loader=loader, bytecode_cache=self._get_bytecode_cache(option_key),
+                                                 **options)
+                TemplateEngine._environments[key] = environment
+
+        return environment
+
+    @staticmethod
+    def _get_bytecode_cache(option_key):
+        cache_directory = TemplateEngine._get_cache_directory()
+        if cache_directory is None:
+            return None
+
+        # templates that got compiled with different options must not share their bytecode
+        import jinja2
+        option_digest = hashlib.sha256(repr(option_key).encode()).hexdigest()[:16]
+        return jinja2.FileSystemBytecodeCache(cache_directory, pattern='__edi_{}_%s.cache'.format(option_digest))
+
+    @staticmethod
+    def _get_cache_directory():
+        if not TemplateEngine._cache_directory_initialized:
+            TemplateEngine._cache_directory_initialized = True
+            # root (e.g. sudo edi) must not load bytecode that got written by an unprivileged user
+            running_as_root = os.geteuid() == 0
+            user = 'root' if running_as_root else get_user()
+            cache_directory = os.path.join(get_user_home_directory(user), '.cache', 'edi', 'templates')
+            try:
+                if running_as_root:
+                    os.makedirs(cache_directory, mode=0o700, exist_ok=True)
+                else:
+                    create_user_directory(cache_directory)
+            except OSError as error:
+                logging.debug("Unable to create the template cache directory {}: {}".format(cache_directory, error))
+
+            if running_as_root and os.path.isdir(cache_directory) and os.stat(cache_directory).st_uid != 0:
+                logging.debug("Not using the template cache directory {} since it is not owned by root.".format(
+                    cache_directory))
+            elif os.access(cache_directory, os.W_OK):
+                TemplateEngine._cache_directory = cache_directory
+
+        return TemplateEngine._cache_directory
@@ -20,13 +20,15 @@
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import tarfile
 import pytest
 import edi
 from filecmp import cmp
 from edi.commands.documentationcommands.render import Render
 from edi.lib.helpers import FatalError
 from edi.lib.shellhelpers import run
-from edi.lib.buildahhelpers import buildah_exec
+from edi.lib.buildahhelpers import buildah_exec, create_container, delete_container
+from edi.lib.artifact import Artifact, ArtifactType
 from tests.libtesting.helpers import get_project_root
 
 
@@ -75,3 +77,138 @@ def test_documentation_in_user_namespace(datadir):
            os.path.join(str(datadir), 'all.yml')]
     run(cmd)
     assert os.path.isfile(changelog_file)
+
+
+chunked_configuration = """
+documentation_steps:
+    300_versions:
+        output:
+            file: versions.rst
+        path: documentation_steps/rst/templates/versions.rst.j2
+        parameters:
+            edi_doc_chunk_size: {}
+"""
+
+
+@pytest.mark.parametrize("chunk_size", [3, 100])
+def test_documentation_chunk_size(datadir, chunk_size):
+    # hint: the parsed configurations get cached by file name
+    config_file = os.path.join(str(datadir), 'chunks_{}.yml'.format(chunk_size))
+    with open(config_file, mode='w') as f:
+        f.write(chunked_configuration.format(chunk_size))
+
+    parser = edi._setup_command_line_interface()
+    raw_input = os.path.join(str(datadir), 'raw_input')
+    cli_args = parser.parse_args(['--log', 'WARNING', 'documentation', 'render', raw_input, str(datadir),
+                                  config_file])
+    Render().run_cli(cli_args)
+
+    generated = os.path.join(str(datadir), 'versions.rst')
+    reference = os.path.join(str(datadir), 'expected', 'all', 'versions.rst')
+    assert cmp(generated, reference)
+
+
+def test_invalid_chunk_size(datadir):
+    config_file = os.path.join(str(datadir), 'invalid_chunks.yml')
+    with open(config_file, mode='w') as f:
+        f.write(chunked_configuration.format(0))
+
+    parser = edi._setup_command_line_interface()
+    raw_input = os.path.join(str(datadir), 'raw_input')
+    cli_args = parser.parse_args(['--log', 'WARNING', 'documentation', 'render', raw_input, str(datadir),
+                                  config_file])
+    with pytest.raises(FatalError) as error:
+        Render().run_cli(cli_args)
+
+    assert 'edi_doc_chunk_size' in error.value.message
+
+
+parallel_configuration = """
+general:
+    edi_doc_max_parallel_steps: 3
+
+documentation_steps:
+    100_index:
+        path: documentation_steps/rst/templates/index.rst.j2
+        output:
+            file: combined.rst
+        parameters:
+            edi_doc_include_packages: []
+            toctree_items: ['setup', 'versions', 'changelog']
+    200_versions:
+        output:
+            file: combined.rst
+        path: documentation_steps/rst/templates/versions.rst.j2
+    300_setup:
+        path: documentation_steps/rst/templates/setup.rst.j2
+        output:
+            file: setup.rst
+        parameters:
+            edi_doc_include_packages: []
+"""
+
+
+def test_parallel_documentation_steps(datadir):
+    config_file = os.path.join(str(datadir), 'parallel_steps.yml')
+    with open(config_file, mode='w') as f:
+        f.write(parallel_configuration)
+
+    parser = edi._setup_command_line_interface()
+    raw_input = os.path.join(str(datadir), 'raw_input')
+    cli_args = parser.parse_args(['--log', 'WARNING', 'documentation', 'render', raw_input, str(datadir),
+                                  config_file])
+    Render().run_cli(cli_args)
+
+    expected = ''
+    for file in ['index.rst', 'versions.rst']:
+        with open(os.path.join(str(datadir), 'expected', 'all', file), encoding='UTF-8') as f:
+            expected += f.read()
+
+    with open(os.path.join(str(datadir), 'combined.rst'), encoding='UTF-8') as f:
+        assert f.read() == expected
+
+    assert cmp(os.path.join(str(datadir), 'setup.rst'), os.path.join(str(datadir), 'expected', 'all', 'setup.rst'))
+
+
+def create_rootfs_archive(datadir):
+    archive = os.path.join(str(datadir), 'rootfs.tar')
+    with tarfile.open(archive, mode='w') as tar:
+        tar.add(os.path.join(str(datadir), 'raw_input'), arcname='./usr/share/doc')
+    run(['zstd', '-q', '--rm', archive])
+    return '{}.zst'.format(archive)
+
+
+def render_and_compare(datadir, raw_input, config_name):
+    # hint: the parsed configurations get cached by file name
+    config_file = os.path.join(str(datadir), '{}.yml'.format(config_name))
+    with open(os.path.join(str(datadir), 'all.yml'), mode='r') as source, open(config_file, mode='w') as target:
+        target.write(source.read())
+
+    parser = edi._setup_command_line_interface()
+    cli_args = parser.parse_args(['--log', 'WARNING', 'documentation', 'render', raw_input, str(datadir),
+                                  config_file])
+    Render().run_cli(cli_args)
+
+    for file in ['changelog.rst', 'index.rst', 'setup.rst', 'versions.rst']:
+        generated = os.path.join(str(datadir), file)
+        reference = os.path.join(str(datadir), 'expected', 'all', file)
+        assert cmp(generated, reference)
+
+
+@pytest.mark.filterwarnings("ignore:Unexpected line")
+@pytest.mark.filterwarnings("ignore:Found eof")
+def test_documentation_from_archive(datadir):
+    render_and_compare(datadir, create_rootfs_archive(datadir), 'from_archive')
+
+
+@pytest.mark.filterwarnings("ignore:Unexpected line")
+@pytest.mark.filterwarnings("ignore:Found eof")
+@pytest.mark.requires_buildah
+def test_documentation_from_buildah_container(datadir):
+    container_name = 'edi-test-documentation-{}'.format(os.getpid())
+    archive = create_rootfs_archive(datadir)
+    create_container(container_name, Artifact(name='rootfs', location=archive, type=ArtifactType.PATH))
+    try:
+        render_and_compare(datadir, 'buildah-container:{}'.format(container_name), 'from_container')
+    finally:
+        delete_container(container_name)
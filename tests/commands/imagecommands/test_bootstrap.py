@@ -25,13 +25,14 @@ import os
 import shutil
 import subprocess
 import requests_mock
-from edi.lib import mockablerun
+from edi.lib import mockablerun, bootstrapcache
+from edi.lib.configurationparser import ConfigurationParser
 
 
 _ADAPTIVE = -42
 
 
-def test_bootstrap(config_files, monkeypatch):
+def test_bootstrap(config_files, monkeypatch, tmpdir):
     with open(config_files, "r") as main_file:
         def fakegetuid():
             return 0
@@ -42,6 +43,8 @@ def test_bootstrap(config_files, monkeypatch):
             pass
 
         monkeypatch.setattr(shutil, 'chown', fakechown)
+        monkeypatch.setattr(bootstrapcache, 'get_user_home_directory', lambda _: str(tmpdir))
+        monkeypatch.setattr(ConfigurationParser, 'get_bootstrap_cache_size', lambda _: 100)
 
         def fakerun(*popenargs, **kwargs):
             if get_command(popenargs) == "chroot":
@@ -95,3 +98,22 @@ def test_bootstrap(config_files, monkeypatch):
         bootstrap_cmd2.run(main_file)
         with open(expected_result, mode="r") as same_result:
             assert same_result.read() == previous_result_text
+
+        # a second project with an equivalent bootstrap configuration reuses the shared image
+        bootstrap_cmd3 = Bootstrap()
+        bootstrap_cmd3.clean(main_file)
+        assert not os.path.exists(expected_result)
+        with requests_mock.Mocker() as m:
+            m.get('https://ftp-master.debian.org/keys/archive-key-11.asc', text='key file mockup')
+            bootstrap_cmd3.run(main_file)
+        with open(expected_result, mode="r") as shared_result:
+            assert shared_result.read() == previous_result_text
+
+        # a rotated repository key behind the same url requires a fresh image
+        bootstrap_cmd4 = Bootstrap()
+        bootstrap_cmd4.clean(main_file)
+        with requests_mock.Mocker() as m:
+            m.get('https://ftp-master.debian.org/keys/archive-key-11.asc', text='rotated key file mockup')
+            bootstrap_cmd4.run(main_file)
+        with open(expected_result, mode="r") as fresh_result:
+            assert fresh_result.read() == "fake archive"
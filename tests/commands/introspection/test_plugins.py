@@ -42,7 +42,8 @@ from edi.commands.projectcommands.prepare import Prepare as ProjectPrepare
 from edi.commands.projectcommands.configure import Configure as ProjectConfigure
 from edi.commands.projectcommands.make import Make
 from edi.lib.shellhelpers import mockablerun
-from tests.libtesting.contextmanagers.mocked_executable import mocked_executable, mocked_lxd_version_check
+from tests.libtesting.contextmanagers.mocked_executable import (mocked_executable, mocked_lxd_version_check,
+                                                                mocked_lxd_backend)
 
 
 @pytest.mark.parametrize(("command, command_args, has_templates, "
@@ -66,7 +67,7 @@ from tests.libtesting.contextmanagers.mocked_executable import mocked_executable
 def test_plugins(monkeypatch, config_files, capsys, command, command_args, has_templates,
                  has_profiles, has_playbooks, has_postprocessing_commands):
     with mocked_executable('lxc'):
-        with mocked_lxd_version_check():
+        with mocked_lxd_version_check(), mocked_lxd_backend():
             def fake_lxc_config_command(*popenargs, **kwargs):
                 if 'images.compression_algorithm' in popenargs[0]:
                     return subprocess.CompletedProcess("fakerun", 0, '')
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from codecs import open
+from tests.libtesting.contextmanagers.workspace import workspace
+from tests.libtesting.helpers import suppress_chown_during_debuild
+from edi.commands.lxccommands import export
+from edi.commands.lxccommands.export import Export
+from edi.commands.lxccommands.lxcprepare import Prepare
+from edi.commands.lxccommands.publish import Publish
+
+
+def test_modified_role_invalidates_export(config_files, monkeypatch):
+    suppress_chown_during_debuild(monkeypatch)
+    exported = []
+    cleaned = []
+
+    def fake_export_image(image_name, image_without_extension):
+        exported.append(image_name)
+        with open('{}.tar.gz'.format(image_without_extension), mode='w') as f:
+            f.write('image {}'.format(len(exported)))
+
+    monkeypatch.setattr(export, 'export_image', fake_export_image)
+    monkeypatch.setattr(export, 'get_server_image_compression_algorithm', lambda: 'gzip')
+    monkeypatch.setattr(Prepare, 'fingerprint', lambda _, __: 'a' * 64)
+    monkeypatch.setattr(Publish, 'run', lambda _, __: 'published-image')
+    monkeypatch.setattr(Publish, 'clean_recursive', lambda *args: cleaned.append(args))
+
+    role_file = os.path.join(os.path.dirname(config_files), 'plugins', 'playbooks', 'roles', 'foo', 'tasks',
+                             'main.yml')
+    os.makedirs(os.path.dirname(role_file))
+    with open(role_file, mode='w') as f:
+        f.write('- name: first version')
+
+    with workspace():
+        with open(config_files, 'r') as main_file:
+            result = Export().run(main_file)
+        assert exported == ['published-image']
+
+        # unchanged playbooks: the exported image is up to date
+        with open(config_files, 'r') as main_file:
+            assert Export().run(main_file) == result
+        assert exported == ['published-image']
+
+        # a modified role of a playbook invalidates the exported image
+        with open(role_file, mode='w') as f:
+            f.write('- name: second version')
+        with open(config_files, 'r') as main_file:
+            assert Export().run(main_file) == result
+        assert exported == ['published-image', 'published-image']
+
+    # the published image and the container decide on their own whether they are outdated
+    assert not cleaned
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+from codecs import open
+from tests.libtesting.contextmanagers.workspace import workspace
+from edi.commands.lxccommands import importcmd
+from edi.commands.lxccommands.importcmd import Import
+from edi.commands.lxccommands.lxcprepare import Prepare
+
+
+def test_changed_bootstrap_invalidates_image(config_files, monkeypatch):
+    image_store = set()
+    imported = []
+    deleted = []
+    prepare_fingerprint = {'value': 'a' * 64}
+
+    def fake_import_image(_, image_name, rootfs=None):
+        imported.append(image_name)
+        image_store.add(image_name)
+
+    def fake_delete_image(image_name):
+        deleted.append(image_name)
+        image_store.remove(image_name)
+
+    monkeypatch.setattr(importcmd, 'is_in_image_store', lambda image_name: image_name in image_store)
+    monkeypatch.setattr(importcmd, 'import_image', fake_import_image)
+    monkeypatch.setattr(importcmd, 'delete_image', fake_delete_image)
+    monkeypatch.setattr(Prepare, 'fingerprint', lambda _, __: prepare_fingerprint['value'])
+    monkeypatch.setattr(Prepare, 'run', lambda _, __: 'image.tar.gz')
+    monkeypatch.setattr(Prepare, 'rootfs', lambda _, __: None)
+
+    with workspace(), open(config_files, 'r') as main_file:
+        image_name = Import().run(main_file)
+        assert imported == [image_name]
+        assert not deleted
+
+        # unchanged bootstrap: the image in the store gets reused
+        assert Import().run(main_file) == image_name
+        assert imported == [image_name]
+        assert not deleted
+
+        # changed bootstrap: the outdated image gets replaced
+        prepare_fingerprint['value'] = 'b' * 64
+        assert Import().run(main_file) == image_name
+        assert deleted == [image_name]
+        assert imported == [image_name, image_name]
+        assert image_name in image_store
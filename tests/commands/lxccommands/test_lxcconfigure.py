@@ -28,6 +28,8 @@ from edi.lib.shellhelpers import run, get_debian_architecture
 from edi.lib.helpers import get_artifact_dir
 from edi.lib.configurationparser import get_base_dictionary
 from edi.commands.lxccommands.lxcconfigure import Configure
+from edi.commands.lxccommands import lxcconfigure
+from edi.lib.configurationparser import ConfigurationParser
 from edi.commands.clean import Clean
 from edi.lib.lxchelpers import lxc_exec
 import edi
@@ -155,3 +157,68 @@ def test_build_bullseye_container(capsys, datadir):
 
         delete_command = [lxc_exec(), 'delete', container_name]
         run(delete_command)
+
+
+class FakePlaybookRunner:
+    def __init__(self):
+        self.skipped = None
+
+    @staticmethod
+    def get_fingerprints(_):
+        return ['a' * 64, 'b' * 64, 'c' * 64]
+
+    def run_all(self, skip=0, playbook_done=None):
+        self.skipped = skip
+        for index in range(skip, 3):
+            playbook_done(index, 'playbook_{}'.format(index))
+
+
+@pytest.mark.parametrize("existing_snapshots, marker, expected_restore, expected_skip, expected_snapshots", [
+    ([], None, None, 0, ['edi-playbooks-' + 'b' * 32, 'edi-playbooks-' + 'c' * 32]),
+    (['edi-playbooks-' + 'a' * 32, 'edi-playbooks-' + 'b' * 32, 'edi-playbooks-' + 'x' * 32], 'x' * 64,
+     'edi-playbooks-' + 'b' * 32, 2, ['edi-playbooks-' + 'b' * 32, 'edi-playbooks-' + 'c' * 32]),
+    # a previous run did not complete
+    (['edi-playbooks-' + 'a' * 32, 'edi-playbooks-' + 'b' * 32, 'edi-playbooks-' + 'c' * 32], None,
+     'edi-playbooks-' + 'c' * 32, None, ['edi-playbooks-' + 'b' * 32, 'edi-playbooks-' + 'c' * 32]),
+    # the newer snapshots of outdated playbooks get deleted before the restore
+    (['edi-playbooks-' + 'a' * 32, 'edi-playbooks-' + 'x' * 32, 'edi-playbooks-' + 'y' * 32], 'y' * 64,
+     'edi-playbooks-' + 'a' * 32, 1, ['edi-playbooks-' + 'b' * 32, 'edi-playbooks-' + 'c' * 32]),
+    # the container is already configured with the current playbooks
+    (['edi-playbooks-' + 'a' * 32, 'edi-playbooks-' + 'b' * 32, 'edi-playbooks-' + 'c' * 32], 'c' * 64,
+     None, None, ['edi-playbooks-' + 'b' * 32, 'edi-playbooks-' + 'c' * 32]),
+])
+def test_snapshot_checkpoints(config_files, monkeypatch, existing_snapshots, marker, expected_restore, expected_skip,
+                              expected_snapshots):
+    snapshots = ['snap0'] + existing_snapshots
+    container_config = {'user.edi-playbooks': marker} if marker else {}
+    restored = []
+    launched = []
+
+    def fake_restore_container_snapshot(_, snapshot):
+        # like on zfs, only the most recent snapshot can be restored
+        assert snapshot == snapshots[-1]
+        restored.append(snapshot)
+
+    monkeypatch.setattr(lxcconfigure, 'get_container_snapshots', lambda _: list(snapshots))
+    monkeypatch.setattr(lxcconfigure, 'create_container_snapshot', lambda _, snapshot: snapshots.append(snapshot))
+    monkeypatch.setattr(lxcconfigure, 'restore_container_snapshot', fake_restore_container_snapshot)
+    monkeypatch.setattr(lxcconfigure, 'delete_container_snapshot', lambda _, snapshot: snapshots.remove(snapshot))
+    monkeypatch.setattr(lxcconfigure, 'get_container_config_item', lambda _, key: container_config.get(key))
+    monkeypatch.setattr(lxcconfigure, 'set_container_config_item',
+                        lambda _, key, value: container_config.update({key: value}))
+    monkeypatch.setattr(lxcconfigure.Launch, 'run', lambda _, container_name, __: launched.append(container_name))
+
+    with open(config_files, "r") as main_file:
+        configure = Configure()
+        configure.config = ConfigurationParser(main_file)
+        configure.container_name = 'fake-container'
+        playbook_runner = FakePlaybookRunner()
+
+        configure._run_playbooks_with_snapshots(playbook_runner, 2)
+
+        assert restored == ([expected_restore] if expected_restore else [])
+        # the profiles get re-applied after a restore
+        assert launched == (['fake-container'] if expected_restore else [])
+        assert playbook_runner.skipped == expected_skip
+        assert snapshots == ['snap0'] + expected_snapshots
+        assert container_config == {'user.edi-playbooks': 'c' * 64}
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+from codecs import open
+from tests.libtesting.contextmanagers.workspace import workspace
+from edi.commands.lxccommands import publish
+from edi.commands.lxccommands.publish import Publish
+from edi.commands.lxccommands.lxcprepare import Prepare
+from edi.commands.lxccommands.stop import Stop
+
+
+def test_changed_configuration_replaces_image_only(config_files, monkeypatch):
+    image_store = set()
+    published = []
+    deleted = []
+    cleaned = []
+    prepare_fingerprint = {'value': 'a' * 64}
+
+    def fake_publish_container(container_name, image_name):
+        published.append(image_name)
+        image_store.add(image_name)
+
+    def fake_delete_image(image_name):
+        deleted.append(image_name)
+        image_store.remove(image_name)
+
+    monkeypatch.setattr(publish, 'is_in_image_store', lambda image_name: image_name in image_store)
+    monkeypatch.setattr(publish, 'publish_container', fake_publish_container)
+    monkeypatch.setattr(publish, 'delete_image', fake_delete_image)
+    monkeypatch.setattr(Prepare, 'fingerprint', lambda _, __: prepare_fingerprint['value'])
+    monkeypatch.setattr(Stop, 'run', lambda _, __: 'container')
+    monkeypatch.setattr(Stop, 'clean_recursive', lambda *args: cleaned.append(args))
+
+    with workspace(), open(config_files, 'r') as main_file:
+        image_name = Publish().run(main_file)
+        assert published == [image_name]
+        assert not deleted
+
+        # unchanged configuration: the image in the store gets reused
+        assert Publish().run(main_file) == image_name
+        assert published == [image_name]
+        assert not deleted
+
+        # changed upstream artifacts: only the outdated image gets replaced
+        prepare_fingerprint['value'] = 'b' * 64
+        assert Publish().run(main_file) == image_name
+        assert deleted == [image_name]
+        assert published == [image_name, image_name]
+        assert image_name in image_store
+
+    assert not cleaned
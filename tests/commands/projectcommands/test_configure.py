@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pytest
+from codecs import open
+from edi.commands.projectcommands import configure
+from edi.commands.projectcommands.configure import Configure
+from edi.lib.artifact import Artifact, ArtifactType
+from edi.lib.configurationparser import ConfigurationParser
+
+
+class FakePlaybookRunner:
+    def __init__(self):
+        self.skipped = None
+
+    @staticmethod
+    def get_fingerprints(base_fingerprint):
+        return ['{}-{}'.format(base_fingerprint, index) for index in range(3)]
+
+    def run_all(self, skip=0, playbook_done=None):
+        self.skipped = skip
+        for index in range(skip, 3):
+            playbook_done(index, 'playbook_{}'.format(index))
+
+
+class FakeArtifactCache:
+    @staticmethod
+    def get_digest(_):
+        return 'digest'
+
+
+@pytest.mark.parametrize("container_existing, seal, cached_layers, expected_base, expected_skip", [
+    (False, None, [], 'rootfs', 0),
+    (False, None, ['base', 'base-0'], 'base-0', 1),
+    (True, 'base-1', ['base', 'base-0', 'base-1'], 'base-1', 2),
+    # deleting the seal re-creates the container from the cached layers instead of re-applying the playbooks
+    (True, None, ['base', 'base-0', 'base-1', 'base-2'], 'base-2', None),
+    (True, 'base-2', ['base', 'base-0', 'base-1', 'base-2'], None, None),
+])
+def test_layer_cache(config_files, monkeypatch, tmpdir, container_existing, seal, cached_layers,
+                     expected_base, expected_skip):
+    monkeypatch.chdir(str(tmpdir))
+    playbook_runner = FakePlaybookRunner()
+    rootfs = Artifact(name='edi_bootstrapped_rootfs', location='rootfs', type=ArtifactType.PATH)
+    images = []
+    containers = []
+    created = []
+    deleted_containers = []
+
+    def fake_create_container(container_name, artifact):
+        containers.append(container_name)
+        created.append(artifact.location.split(':')[-1] if artifact.type == ArtifactType.PODMAN_IMAGE
+                       else artifact.location)
+
+    def fake_delete_container(container_name):
+        containers.remove(container_name)
+        deleted_containers.append(container_name)
+
+    monkeypatch.setattr(configure.Prepare, 'run', lambda *_: [rootfs])
+    monkeypatch.setattr(configure, 'PlaybookRunner', lambda *_: playbook_runner)
+    monkeypatch.setattr(configure, 'ArtifactCache', FakeArtifactCache)
+    monkeypatch.setattr(configure, 'get_fingerprint', lambda *_: 'base')
+    monkeypatch.setattr(configure, 'is_container_existing', lambda container_name: container_name in containers)
+    monkeypatch.setattr(configure, 'create_container', fake_create_container)
+    monkeypatch.setattr(configure, 'delete_container', fake_delete_container)
+    monkeypatch.setattr(configure, 'is_image_existing', lambda image: image in images)
+    monkeypatch.setattr(configure, 'commit_container', lambda _, image: images.append(image))
+    monkeypatch.setattr(configure, 'get_repository_images', lambda _: list(images))
+    monkeypatch.setattr(configure, 'delete_image', lambda image: images.remove(image))
+
+    with open(config_files, "r") as main_file:
+        project_configure = Configure()
+        project_configure.config = ConfigurationParser(main_file)
+        container_name = project_configure._get_container_artifact().location
+        repository = project_configure._get_layer_repository()
+        seal_file = project_configure._get_seal_artifact().location
+
+        images.extend(['{}:{}'.format(repository, layer) for layer in cached_layers + ['outdated']])
+        if container_existing:
+            containers.append(container_name)
+        if seal:
+            os.makedirs(os.path.dirname(seal_file), exist_ok=True)
+            with open(seal_file, encoding='utf-8', mode='w') as f:
+                f.write(seal)
+
+        project_configure._run_layered()
+
+        assert containers == [container_name]
+        assert created == ([expected_base] if expected_base else [])
+        assert deleted_containers == ([container_name] if container_existing and expected_base else [])
+        assert playbook_runner.skipped == expected_skip
+        with open(seal_file, encoding='utf-8') as f:
+            assert f.read() == 'base-2'
+
+        if expected_base:
+            # after a successful run only the layers of the current chain remain
+            assert sorted(images) == ['{}:{}'.format(repository, layer)
+                                      for layer in ['base', 'base-0', 'base-1', 'base-2']]
+        else:
+            assert '{}:outdated'.format(repository) in images
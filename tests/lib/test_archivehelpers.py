@@ -19,8 +19,13 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import pytest
-from edi.lib.archivehelpers import decompress
+import edi.lib.shellhelpers
+from edi.lib.archivehelpers import (decompress, get_archive_extension, get_compress_program,
+                                    get_compression_from_archive)
+from edi.lib.helpers import FatalError
+from edi.lib.shellhelpers import Executables
 
 
 @pytest.mark.parametrize('algorithm, compressed_data', [
@@ -37,3 +42,57 @@ def test_decompression(algorithm, compressed_data):
     expected_data = '{0}-file\n'.format(algorithm)
     data = decompress(compressed_data).decode('utf-8')
     assert data == expected_data
+
+
+def fake_executables(monkeypatch, available):
+    def fake_which(executable):
+        if executable in available:
+            return os.path.join(os.sep, 'usr', 'bin', executable)
+        return None
+
+    monkeypatch.setattr(edi.lib.shellhelpers, 'which', fake_which)
+    Executables(clear_cache=True)
+
+
+@pytest.mark.parametrize('compression, extension', [
+    ('gz', 'tar.gz'),
+    ('bz2', 'tar.bz2'),
+    ('xz', 'tar.xz'),
+    ('zstd', 'tar.zst'),
+])
+def test_archive_extension(compression, extension):
+    assert get_archive_extension(compression) == extension
+    assert get_compression_from_archive('/foo/rootfs.{}'.format(extension)) == compression
+
+
+def test_unsupported_compression():
+    with pytest.raises(FatalError) as error:
+        get_archive_extension('lz4')
+    assert 'lz4' in error.value.message
+    assert get_compression_from_archive('rootfs.tar') is None
+
+
+@pytest.mark.parametrize('available, compression, threads, level, expected_program', [
+    (['pigz', 'gzip'], 'gz', 4, None, 'pigz -p4'),
+    (['gzip'], 'gz', 4, 9, 'gzip -9'),
+    (['pbzip2', 'bzip2'], 'bz2', 2, 9, 'pbzip2 -p2 -9'),
+    (['xz'], 'xz', 0, None, 'xz -T0'),
+    (['xz'], 'xz', 3, 6, 'xz -T3 -6'),
+    (['zstd'], 'zstd', 0, 19, 'zstd -T0 -19'),
+    ([], 'zstd', 0, None, None),
+])
+def test_compress_program(monkeypatch, available, compression, threads, level, expected_program):
+    fake_executables(monkeypatch, available)
+    try:
+        assert get_compress_program(compression, threads, level) == expected_program
+    finally:
+        Executables(clear_cache=True)
+
+
+def test_compress_program_all_cores(monkeypatch):
+    fake_executables(monkeypatch, ['pigz'])
+    monkeypatch.setattr(os, 'cpu_count', lambda: 12)
+    try:
+        assert get_compress_program('gz') == 'pigz -p12'
+    finally:
+        Executables(clear_cache=True)
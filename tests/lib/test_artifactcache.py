@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import pytest
+from codecs import open
+from edi.lib.artifact import ArtifactType, Artifact
+from edi.lib.artifactcache import ArtifactCache, get_fingerprint, get_directory_digest
+from edi.lib.helpers import create_artifact_dir, get_artifact_dir
+from tests.libtesting.contextmanagers.workspace import workspace
+from tests.libtesting.helpers import suppress_chown_during_debuild
+
+
+def write_artifact(artifact, content):
+    with open(artifact.location, mode='w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def read_artifact(artifact):
+    with open(artifact.location, mode='r', encoding='utf-8') as f:
+        return f.read()
+
+
+def test_fingerprint():
+    assert get_fingerprint('a', {'x': 1, 'y': [1, 2]}) == get_fingerprint('a', {'y': [1, 2], 'x': 1})
+    assert get_fingerprint('a', {'x': 1}) != get_fingerprint('a', {'x': 2})
+    assert get_fingerprint('a', None) != get_fingerprint('b', None)
+
+
+def test_store_and_restore(monkeypatch):
+    suppress_chown_during_debuild(monkeypatch)
+    with workspace():
+        create_artifact_dir()
+        artifact = Artifact(name='result', location=os.path.join(get_artifact_dir(), 'result.txt'),
+                            type=ArtifactType.PATH)
+        cache = ArtifactCache()
+        fingerprint_a = get_fingerprint('config a')
+        fingerprint_b = get_fingerprint('config b')
+
+        assert not cache.restore(fingerprint_a, [artifact])
+        write_artifact(artifact, 'result a')
+        cache.store(fingerprint_a, [artifact])
+        assert cache.restore(fingerprint_a, [artifact])
+        assert cache.get_digest(artifact) == fingerprint_a
+
+        # a changed configuration invalidates the artifact
+        assert not cache.restore(fingerprint_b, [artifact])
+        os.remove(artifact.location)
+        write_artifact(artifact, 'result b')
+        cache.store(fingerprint_b, [artifact])
+
+        # switching back restores the previous result
+        assert cache.restore(fingerprint_a, [artifact])
+        assert read_artifact(artifact) == 'result a'
+        assert cache.restore(fingerprint_b, [artifact])
+        assert read_artifact(artifact) == 'result b'
+
+        os.remove(artifact.location)
+        assert cache.restore(fingerprint_b, [artifact])
+        assert read_artifact(artifact) == 'result b'
+
+        cache.forget([artifact])
+        os.remove(artifact.location)
+        assert not cache.restore(fingerprint_a, [artifact])
+        assert not cache.restore(fingerprint_b, [artifact])
+
+
+def test_non_file_artifacts(monkeypatch):
+    suppress_chown_during_debuild(monkeypatch)
+    with workspace():
+        create_artifact_dir()
+        folder = Artifact(name='folder', location=os.path.join(get_artifact_dir(), 'folder'), type=ArtifactType.PATH)
+        image = Artifact(name='image', location='edi-image', type=ArtifactType.PODMAN_IMAGE)
+        cache = ArtifactCache()
+        fingerprint = get_fingerprint('config')
+
+        os.mkdir(folder.location)
+        cache.store(fingerprint, [folder, image])
+        assert cache.restore(fingerprint, [folder, image])
+        assert not cache.restore(get_fingerprint('other config'), [folder, image])
+        assert cache.get_digest(image) == fingerprint
+
+        os.rmdir(folder.location)
+        assert not cache.restore(fingerprint, [folder])
+
+
+def test_eviction(monkeypatch):
+    suppress_chown_during_debuild(monkeypatch)
+    with workspace():
+        create_artifact_dir()
+        artifact = Artifact(name='result', location=os.path.join(get_artifact_dir(), 'result.txt'),
+                            type=ArtifactType.PATH)
+        cache = ArtifactCache()
+        fingerprints = [get_fingerprint('config', i) for i in range(6)]
+
+        for i, fingerprint in enumerate(fingerprints):
+            if os.path.isfile(artifact.location):
+                os.remove(artifact.location)
+            write_artifact(artifact, 'result {}'.format(i))
+            os.utime(artifact.location, (i, i))
+            cache.store(fingerprint, [artifact])
+            os.utime(artifact.location, (i, i))
+
+        os.remove(artifact.location)
+        assert not cache.restore(fingerprints[0], [artifact])
+        assert not cache.restore(fingerprints[1], [artifact])
+        assert cache.restore(fingerprints[2], [artifact])
+        assert read_artifact(artifact) == 'result 2'
+
+
+@pytest.mark.parametrize("max_versions", [0, 1, 2])
+def test_configured_versions(monkeypatch, max_versions):
+    suppress_chown_during_debuild(monkeypatch)
+    with workspace():
+        create_artifact_dir()
+        artifact = Artifact(name='result', location=os.path.join(get_artifact_dir(), 'result.txt'),
+                            type=ArtifactType.PATH)
+        cache = ArtifactCache(max_versions=max_versions)
+        fingerprints = [get_fingerprint('config', i) for i in range(3)]
+
+        for i, fingerprint in enumerate(fingerprints):
+            if os.path.isfile(artifact.location):
+                os.remove(artifact.location)
+            write_artifact(artifact, 'result {}'.format(i))
+            os.utime(artifact.location, (i, i))
+            cache.store(fingerprint, [artifact])
+            os.utime(artifact.location, (i, i))
+
+        assert len(cache._get_cached_versions('result.txt')) == max_versions
+        # the current artifact is still recognized as unchanged
+        assert cache.restore(fingerprints[2], [artifact])
+        assert cache.restore(fingerprints[1], [artifact]) == (max_versions > 1)
+
+
+def test_digest_of_unknown_artifact(monkeypatch):
+    suppress_chown_during_debuild(monkeypatch)
+    with workspace() as workdir:
+        input_file = Artifact(name='input', location=os.path.join(workdir, 'input.txt'), type=ArtifactType.PATH)
+        write_artifact(input_file, 'input')
+        cache = ArtifactCache()
+        digest = cache.get_digest(input_file)
+        assert digest == cache.get_digest(input_file)
+        os.utime(input_file.location, (42, 42))
+        assert digest != cache.get_digest(input_file)
+
+
+def test_directory_digest():
+    with workspace() as workdir:
+        os.makedirs(os.path.join(workdir, 'roles', 'foo'))
+        foo = Artifact(name='foo', location=os.path.join(workdir, 'roles', 'foo', 'main.yml'), type=ArtifactType.PATH)
+        write_artifact(foo, 'foo')
+        digest = get_directory_digest(workdir)
+        assert digest == get_directory_digest(workdir)
+
+        os.symlink('foo', os.path.join(workdir, 'roles', 'bar'))
+        link_digest = get_directory_digest(workdir)
+        assert link_digest != digest
+
+        write_artifact(foo, 'bar')
+        assert get_directory_digest(workdir) != link_digest
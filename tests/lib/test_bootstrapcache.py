@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import threading
+import time
+from edi.lib.bootstrapcache import BootstrapCache
+from tests.libtesting.helpers import suppress_chown_during_debuild
+
+
+def create_image(directory, name, size):
+    image = os.path.join(str(directory), name)
+    with open(image, mode='wb') as f:
+        f.write(b'x' * size)
+    return image
+
+
+def test_retrieve_and_add(monkeypatch, tmpdir):
+    suppress_chown_during_debuild(monkeypatch)
+    cache = BootstrapCache(1024 * 1024, cache_directory=os.path.join(str(tmpdir), 'cache'))
+    target = os.path.join(str(tmpdir), 'project', 'bootstrap.tar.gz')
+    os.mkdir(os.path.dirname(target))
+
+    with cache.locked('abc'):
+        assert not cache.retrieve('abc', target)
+        cache.add('abc', create_image(tmpdir, 'image.tar.gz', 100))
+
+    assert cache.retrieve('abc', target)
+    assert os.path.getsize(target) == 100
+    assert os.stat(target).st_ino == os.stat(cache._get_entry('abc')).st_ino
+    assert not cache.retrieve('other', target)
+
+
+def test_disabled_cache(monkeypatch, tmpdir):
+    suppress_chown_during_debuild(monkeypatch)
+    cache_directory = os.path.join(str(tmpdir), 'cache')
+    cache = BootstrapCache(0, cache_directory=cache_directory)
+    with cache.locked('abc'):
+        cache.add('abc', create_image(tmpdir, 'image.tar.gz', 100))
+    assert not cache.retrieve('abc', os.path.join(str(tmpdir), 'target'))
+    assert not os.path.exists(cache_directory)
+
+
+def test_least_recently_used_eviction(monkeypatch, tmpdir):
+    suppress_chown_during_debuild(monkeypatch)
+    cache = BootstrapCache(250, cache_directory=os.path.join(str(tmpdir), 'cache'))
+    target = os.path.join(str(tmpdir), 'target')
+
+    for key in ['a', 'b']:
+        with cache.locked(key):
+            cache.add(key, create_image(tmpdir, key, 100))
+    os.utime(cache._get_entry('a'), (time.time() - 20, time.time() - 20))
+    os.utime(cache._get_entry('b'), (time.time() - 10, time.time() - 10))
+
+    # using 'a' makes 'b' the least recently used entry
+    assert cache.retrieve('a', target)
+    with cache.locked('c'):
+        cache.add('c', create_image(tmpdir, 'c', 100))
+
+    assert cache.retrieve('a', target)
+    assert not cache.retrieve('b', target)
+    assert cache.retrieve('c', target)
+    assert os.path.isfile(os.path.join(cache.cache_directory, 'a.lock'))
+    assert not os.path.exists(os.path.join(cache.cache_directory, 'b.lock'))
+
+
+def test_eviction_keeps_used_lock(monkeypatch, tmpdir):
+    suppress_chown_during_debuild(monkeypatch)
+    cache = BootstrapCache(150, cache_directory=os.path.join(str(tmpdir), 'cache'))
+
+    with cache.locked('a'):
+        cache.add('a', create_image(tmpdir, 'a', 100))
+    os.utime(cache._get_entry('a'), (time.time() - 10, time.time() - 10))
+
+    with cache.locked('a'):
+        # a concurrent edi run evicts 'a' while 'a' is in use
+        with cache.locked('b'):
+            cache.add('b', create_image(tmpdir, 'b', 100))
+        assert not os.path.exists(cache._get_entry('a'))
+        assert os.path.isfile(os.path.join(cache.cache_directory, 'a.lock'))
+
+
+def test_concurrent_creation(monkeypatch, tmpdir):
+    suppress_chown_during_debuild(monkeypatch)
+    cache_directory = os.path.join(str(tmpdir), 'cache')
+    builds = []
+
+    def bootstrap(index):
+        cache = BootstrapCache(1024 * 1024, cache_directory=cache_directory)
+        target = os.path.join(str(tmpdir), 'target{}'.format(index))
+        with cache.locked('abc'):
+            if not cache.retrieve('abc', target):
+                builds.append(index)
+                time.sleep(0.1)
+                cache.add('abc', create_image(tmpdir, 'image{}'.format(index), 100))
+
+    threads = [threading.Thread(target=bootstrap, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    for index in set(range(4)) - set(builds):
+        assert os.path.isfile(os.path.join(str(tmpdir), 'target{}'.format(index)))
+
+
+def test_retrieve_waits_for_eviction(monkeypatch, tmpdir):
+    suppress_chown_during_debuild(monkeypatch)
+    cache = BootstrapCache(1024 * 1024, cache_directory=os.path.join(str(tmpdir), 'cache'))
+    with cache.locked('abc'):
+        cache.add('abc', create_image(tmpdir, 'image.tar.gz', 100))
+
+    results = []
+    retrieval = threading.Thread(target=lambda: results.append(cache.retrieve('abc', str(tmpdir.join('target')))))
+    with cache._lock(BootstrapCache._lock_file_name):
+        retrieval.start()
+        time.sleep(0.1)
+        assert not results
+        # a concurrent eviction removes the entry
+        os.remove(cache._get_entry('abc'))
+    retrieval.join()
+
+    assert results == [False]
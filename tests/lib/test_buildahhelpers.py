@@ -30,7 +30,8 @@ from contextlib import contextmanager
 from edi.lib.artifact import Artifact, ArtifactType
 from edi.lib.helpers import FatalError, chown_to_user
 from edi.lib.buildahhelpers import (is_container_existing, get_buildah_version, BuildahVersion, create_container,
-                                    run_buildah_unshare, delete_container, extract_container_rootfs)
+                                    run_buildah_unshare, delete_container, extract_container_rootfs,
+                                    get_repository_images, _mounted_container_script)
 from edi.lib.shellhelpers import mockablerun
 from tests.libtesting.helpers import get_command, get_sub_command, get_random_string
 from tests.libtesting.contextmanagers.mocked_executable import mocked_executable, mocked_buildah_version_check
@@ -142,7 +143,8 @@ def test_buildah_container_creation(datadir):
         assert 'already exists' in error.value.message
         assert container_name in error.value.message
 
-        result = run_buildah_unshare(container_name, r'cat ${edi_project_container_root}/rootfs_test')
+        result = run_buildah_unshare(container_name, r'cat ${edi_project_container_root}/rootfs_test',
+                                     stdout=subprocess.PIPE)
         assert "nothing here" in result.stdout
 
         delete_container(container_name)
@@ -198,5 +200,68 @@ def test_buildah_container_creation_failure():
 
 @pytest.mark.requires_buildah
 def test_buildah_unshare():
-    result = run_buildah_unshare("","whoami")
+    result = run_buildah_unshare("","whoami", stdout=subprocess.PIPE)
     assert result.stdout.strip() == "root"
+
+
+def test_get_repository_images(monkeypatch):
+    with mocked_executable('buildah', '/here/is/no/buildah'):
+        with mocked_buildah_version_check():
+            def fake_buildah_images_command(*popenargs, **kwargs):
+                if get_command(popenargs).endswith('buildah') and get_sub_command(popenargs) == 'images':
+                    return subprocess.CompletedProcess("fakerun", 0,
+                                                       stdout=("localhost/edi-foo-layers:abc\n"
+                                                               "localhost/edi-foo-layers:def\n"
+                                                               "localhost/edi-foo-layers-bar:abc\n"
+                                                               "docker.io/library/debian:bookworm\n"))
+                else:
+                    return subprocess.run(*popenargs, **kwargs)
+
+            monkeypatch.setattr(mockablerun, 'run_mockable', fake_buildah_images_command)
+            expected_images = ['localhost/edi-foo-layers:abc', 'localhost/edi-foo-layers:def']
+            assert get_repository_images('localhost/edi-foo-layers') == expected_images
+
+
+def test_mounted_container_script(tmpdir):
+    if not os.path.isfile('/etc/resolv.conf') or not os.path.isfile('/etc/hosts'):
+        pytest.skip("The host does not provide the name resolution files.")
+
+    root = os.path.join(str(tmpdir), 'root')
+    fake_bin = os.path.join(str(tmpdir), 'bin')
+    mount_log = os.path.join(str(tmpdir), 'mount.log')
+    for directory in [os.path.join(root, 'etc'), os.path.join(root, 'proc'), os.path.join(root, 'sys'), fake_bin]:
+        os.makedirs(directory)
+    # systemd-resolved turns resolv.conf into a symlink to a file that only exists on a booted system
+    os.symlink('../run/systemd/resolve/stub-resolv.conf', os.path.join(root, 'etc', 'resolv.conf'))
+    with open(os.path.join(root, 'etc', 'hosts'), mode='w') as f:
+        f.write('127.0.0.1 localhost\n')
+
+    for tool in ['mount', 'umount']:
+        with open(os.path.join(fake_bin, tool), mode='w') as f:
+            f.write('#!/bin/sh\necho "{} $*" >> "{}"\n'.format(tool, mount_log))
+        os.chmod(os.path.join(fake_bin, tool), 0o755)
+
+    placeholder = os.path.join(root, 'run', 'systemd', 'resolve', 'stub-resolv.conf')
+    env = dict(os.environ, edi_project_container_root=root, PATH='{}:{}'.format(fake_bin, os.environ['PATH']))
+    result = subprocess.run(['sh', '-c', _mounted_container_script, 'sh', 'test', '-f', placeholder], env=env)
+    assert result.returncode == 0
+
+    with open(mount_log) as f:
+        mounts = f.read().splitlines()
+
+    assert 'mount -t tmpfs -o mode=755,nosuid tmpfs {}/dev'.format(root) in mounts
+    assert 'mount --bind /dev/null {}/dev/null'.format(root) in mounts
+    assert not [m for m in mounts if m.startswith('mount --rbind /dev')]
+    assert 'mount --rbind /proc {}/proc'.format(root) in mounts
+    assert 'mount --bind /etc/resolv.conf {}'.format(placeholder) in mounts
+    assert 'mount --bind /etc/hosts {}/etc/hosts'.format(root) in mounts
+    assert 'umount -R -l {}'.format(placeholder) in mounts
+    assert 'umount -R -l {}/dev'.format(root) in mounts
+
+    # the placeholder and the directories that got created for it are gone
+    assert not os.path.exists(os.path.join(root, 'run'))
+    assert os.path.islink(os.path.join(root, 'etc', 'resolv.conf'))
+
+    # the exit code of the command gets forwarded
+    result = subprocess.run(['sh', '-c', _mounted_container_script, 'sh', 'sh', '-c', 'exit 3'], env=env)
+    assert result.returncode == 3
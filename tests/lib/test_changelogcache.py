@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import pytest
+import edi.lib.changelogextractor
+from edi.lib.changelogcache import ChangelogCache
+from edi.lib.changelogextractor import ChangelogExtractor, parse_date
+from edi.lib.packageindex import PackageIndex
+from tests.libtesting.helpers import get_project_root
+
+
+raw_input = os.path.join(get_project_root(), 'tests', 'data', 'test_documentation', 'raw_input')
+
+package_names = ['sudo', 'python3-apt', 'edi-boot-shim']
+
+
+def extract_all(cache, replacements):
+    index = PackageIndex([{'package': name} for name in package_names], {})
+    baseline_date = parse_date('2019-12-01 00:00:00 GMT')
+    extractor = ChangelogExtractor(raw_input, index, 1, cache)
+    for name in package_names:
+        extractor.add(name, baseline_date, replacements)
+    extractor.run()
+    return [extractor.get(name, baseline_date, replacements) for name in package_names]
+
+
+@pytest.mark.filterwarnings("ignore:Unexpected line")
+@pytest.mark.filterwarnings("ignore:Found eof")
+def test_cached_changelogs(tmpdir, monkeypatch):
+    cache = ChangelogCache(1024 * 1024, str(tmpdir))
+    changelogs = extract_all(cache, [])
+    assert len([f for f in os.listdir(str(tmpdir)) if f.endswith('.json')]) == len(package_names)
+
+    def fail(*_):
+        assert False, "changelog should have been taken from the cache"
+
+    with monkeypatch.context() as m:
+        m.setattr(edi.lib.changelogextractor, 'extract_changelog', fail)
+        assert extract_all(cache, []) == changelogs
+
+    # other replacements result in other cache entries
+    replaced_changelogs = extract_all(cache, [{'pattern': 'e', 'replacement': 'E'}])
+    assert replaced_changelogs != changelogs
+    assert len([f for f in os.listdir(str(tmpdir)) if f.endswith('.json')]) == 2 * len(package_names)
+
+
+@pytest.mark.filterwarnings("ignore:Unexpected line")
+@pytest.mark.filterwarnings("ignore:Found eof")
+def test_eviction(tmpdir):
+    cache = ChangelogCache(1, str(tmpdir))
+    extract_all(cache, [])
+    assert not [f for f in os.listdir(str(tmpdir)) if f.endswith('.json')]
+
+
+def test_disabled_cache():
+    cache = ChangelogCache(0)
+    assert not cache.is_enabled()
+    assert cache.retrieve('foo') is None
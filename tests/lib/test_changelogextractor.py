@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import gzip
+import pytest
+from debian.changelog import Changelog
+from edi.lib.changelogextractor import (ChangelogExtractor, ChangesAnnotator, extract_changelog, parse_date,
+                                        read_changelog, get_changelog_path)
+from edi.lib.packageindex import PackageIndex
+from tests.libtesting.helpers import get_project_root
+
+
+raw_input = os.path.join(get_project_root(), 'tests', 'data', 'test_documentation', 'raw_input')
+
+package_names = ['sudo', 'python3-apt', 'edi-boot-shim', 'swift-lang', 'does-not-exist']
+
+replacements = [{'pattern': '(CVE-[0-9]{4}-[0-9]{4,6})', 'replacement': r'`\1`'}]
+
+
+def get_package_index():
+    return PackageIndex([{'package': name} for name in package_names], {'sudo': '1.8.27-1+deb10u1'})
+
+
+@pytest.mark.filterwarnings("ignore:Unexpected line")
+@pytest.mark.filterwarnings("ignore:Found eof")
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_changelog_extractor(max_workers):
+    baseline_date = parse_date('2019-12-01 00:00:00 GMT')
+    extractor = ChangelogExtractor(raw_input, get_package_index(), max_workers)
+    for name in package_names:
+        extractor.add(name, baseline_date, replacements)
+        # duplicate requests get merged
+        extractor.add(name, baseline_date, list(replacements))
+    extractor.run()
+
+    for name in package_names:
+        expected = extract_changelog(raw_input, name, baseline_date,
+                                     get_package_index().get_baseline_version(name), replacements)
+        assert extractor.get(name, baseline_date, replacements) == expected
+
+    sudo = extractor.get('sudo', baseline_date, replacements)
+    assert sudo['package'] == 'sudo'
+    assert sudo['change_blocks']
+    assert all(block['version'] != '1.8.27-1+deb10u1' for block in sudo['change_blocks'])
+    assert extractor.get('does-not-exist', baseline_date, replacements) is None
+
+
+@pytest.mark.filterwarnings("ignore:Unexpected line")
+@pytest.mark.filterwarnings("ignore:Found eof")
+def test_unregistered_changelog():
+    baseline_date = parse_date('2019-12-01 00:00:00 GMT')
+    extractor = ChangelogExtractor(raw_input, get_package_index(), 2)
+    other_baseline_date = parse_date('2021-01-01 00:00:00 GMT')
+    changelog = extractor.get('sudo', other_baseline_date, [])
+    assert changelog == extract_changelog(raw_input, 'sudo', other_baseline_date, '1.8.27-1+deb10u1', [])
+    assert changelog != extractor.get('sudo', baseline_date, [])
+
+
+def test_changes_annotator():
+    changes = ['',
+               '  [ Jane Doe ]',
+               '  * First change',
+               '    that continues.',
+               '    - Sub change',
+               '']
+    assert ChangesAnnotator('foo').annotate(changes) == [('empty_line', ''),
+                                                         ('author', 'Jane Doe'),
+                                                         ('list_item', 'First change that continues.'),
+                                                         ('sub_list_item', 'Sub change'),
+                                                         ('empty_line', '')]
+
+
+@pytest.mark.filterwarnings("ignore:Unexpected line")
+@pytest.mark.filterwarnings("ignore:Found eof")
+@pytest.mark.parametrize("baseline", ['1970-01-01 00:00:00 GMT', '2019-12-01 00:00:00 GMT', '2030-01-01 00:00:00 GMT'])
+@pytest.mark.parametrize("package_name", ['sudo', 'python3-apt', 'edi-boot-shim'])
+def test_read_changelog(package_name, baseline):
+    baseline_date = parse_date(baseline)
+
+    def is_outdated(change_block):
+        return parse_date(change_block.date) <= baseline_date
+
+    changelog_path = get_changelog_path(raw_input, package_name)
+    with gzip.open(changelog_path) as fh:
+        line_count = len(fh.readlines())
+    with gzip.open(changelog_path) as fh:
+        full_changelog = Changelog(fh)
+
+    consumed_lines = []
+    with gzip.open(changelog_path) as fh:
+        def counting_reader():
+            for line in fh:
+                consumed_lines.append(line)
+                yield line
+        changelog = read_changelog(counting_reader(), is_outdated)
+
+    expected_blocks = []
+    for change_block in full_changelog:
+        expected_blocks.append(change_block)
+        if is_outdated(change_block):
+            # the reader stops as soon as the first outdated block got parsed
+            assert len(consumed_lines) < line_count
+            break
+
+    assert len(changelog) == len(expected_blocks)
+    for block, expected_block in zip(changelog, expected_blocks):
+        assert block.version == expected_block.version
+        assert block.date == expected_block.date
+        assert block.author == expected_block.author
+        assert block.changes() == expected_block.changes()
@@ -21,6 +21,7 @@
 
 from edi.lib.configurationparser import ConfigurationParser
 from edi.lib.commandrunner import CommandRunner
+from edi.lib.artifactcache import ArtifactCache
 from edi.lib.artifact import ArtifactType, Artifact
 from tests.libtesting.contextmanagers.workspace import workspace
 from tests.libtesting.helpers import get_command, suppress_chown_during_debuild
@@ -91,6 +92,50 @@ def test_run_and_clean(config_files, monkeypatch):
             assert not os.path.isdir(first_folder)
 
 
+def test_reuse_of_up_to_date_artifacts(config_files, monkeypatch):
+    executed_commands = []
+
+    def intercept_command_run(*popenargs, **kwargs):
+        if get_command(popenargs) == 'sh':
+            executed_commands.append(os.path.basename(popenargs[0][-1]))
+        return subprocess.run(*popenargs, **kwargs)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', intercept_command_run)
+
+    suppress_chown_during_debuild(monkeypatch)
+
+    with workspace() as workdir:
+        with open(config_files, "r") as main_file:
+            parser = ConfigurationParser(main_file)
+
+            input_file = os.path.join(workdir, 'input.txt')
+            with open(input_file, mode='w', encoding='utf-8') as i:
+                i.write("*input file*\n")
+
+            def get_runner():
+                input_artifact = Artifact(name='edi_input_artifact', location=input_file, type=ArtifactType.PATH)
+                return CommandRunner(parser, 'postprocessing_commands', input_artifact)
+
+            get_runner().run()
+            assert executed_commands
+            all_commands = executed_commands.copy()
+
+            executed_commands.clear()
+            get_runner().run()
+            assert not executed_commands
+
+            # a modified input artifact invalidates all commands
+            with open(input_file, mode='w', encoding='utf-8') as i:
+                i.write("*modified input file*\n")
+            os.utime(input_file, (42, 42))
+            get_runner().run()
+            assert executed_commands == all_commands
+            with open(os.path.join('artifacts', 'last.txt'), mode='r') as result_file:
+                assert "*modified input file*" in result_file.read()
+
+            get_runner().clean()
+
+
 def test_plugin_report(config_files):
     with open(config_files, "r") as main_file:
         parser = ConfigurationParser(main_file)
@@ -142,3 +187,148 @@ def test_output_node_failure(artifact_item, error_message):
     with pytest.raises(FatalError) as error:
         CommandRunner._get_artifact('some_node', 'some_key', artifact_item)
     assert error_message in str(error)
+
+
+def test_dependencies(config_files):
+    with open(config_files, "r") as main_file:
+        parser = ConfigurationParser(main_file)
+        runner = CommandRunner(parser, 'postprocessing_commands', None)
+        commands = runner._get_commands()
+        dependencies = runner._get_dependencies(commands)
+        assert dependencies == {'10_first_command': set(),
+                                '20_second_command': {'10_first_command'},
+                                '40_last_command': {'20_second_command'}}
+
+
+def test_fingerprints_get_chained(config_files):
+    with open(config_files, "r") as main_file, workspace():
+        parser = ConfigurationParser(main_file)
+        runner = CommandRunner(parser, 'postprocessing_commands', None)
+        commands = runner._get_commands()
+        fingerprints = runner._get_fingerprints(commands, runner._get_dependencies(commands), ArtifactCache())
+
+        parser._get_config()['postprocessing_commands']['10_first_command']['parameters']['message'] = 'changed'
+        commands = runner._get_commands()
+        changed_fingerprints = runner._get_fingerprints(commands, runner._get_dependencies(commands),
+                                                        ArtifactCache())
+
+        # the last command does not refer to the artifacts of the first command but it gets invalidated anyway
+        for command in ['10_first_command', '20_second_command', '40_last_command']:
+            assert fingerprints[command] != changed_fingerprints[command]
+
+        # an explicit dependency relaxes the invalidation
+        parser._get_config()['postprocessing_commands']['40_last_command']['depends_on'] = []
+        commands = runner._get_commands()
+        relaxed_fingerprints = runner._get_fingerprints(commands, runner._get_dependencies(commands),
+                                                        ArtifactCache())
+        parser._get_config()['postprocessing_commands']['10_first_command']['parameters']['message'] = 'again'
+        commands = runner._get_commands()
+        assert (runner._get_fingerprints(commands, runner._get_dependencies(commands),
+                                         ArtifactCache())['40_last_command'] ==
+                relaxed_fingerprints['40_last_command'])
+
+
+parallel_config = """
+general:
+    edi_max_parallel_commands: {max_parallel_commands}
+
+postprocessing_commands:
+    10_slow:
+        path: commands/slow
+        output:
+            slow_output: slow.txt
+    20_fast:
+        path: commands/fast
+        output:
+            fast_output: fast.txt
+    30_combine:
+        path: commands/combine
+        output:
+            combined_output: combined.txt
+"""
+
+parallel_commands = {
+    'slow': 'sleep 0.5\necho slow >> "{{ slow_output }}"\necho "$(date +%s%N)" > "{{ slow_output }}.end"\n',
+    'fast': 'echo fast >> "{{ fast_output }}"\necho "$(date +%s%N)" > "{{ fast_output }}.end"\n'
+            '{{ fail_command }}\n',
+    'combine': 'echo "combining"\ncat "{{ slow_output }}" "{{ fast_output }}" > "{{ combined_output }}"\n',
+}
+
+
+def create_parallel_project(workdir, max_parallel_commands):
+    commands_dir = os.path.join(workdir, 'plugins', 'commands')
+    os.makedirs(commands_dir)
+    for name, content in parallel_commands.items():
+        with open(os.path.join(commands_dir, name), mode='w', encoding='utf-8') as f:
+            f.write(content)
+
+    config_file = os.path.join(workdir, 'parallel.yml')
+    with open(config_file, mode='w', encoding='utf-8') as f:
+        f.write(parallel_config.format(max_parallel_commands=max_parallel_commands))
+    return config_file
+
+
+def test_parallel_execution(monkeypatch):
+    suppress_chown_during_debuild(monkeypatch)
+
+    with workspace() as workdir:
+        config_file = create_parallel_project(workdir, 2)
+        with open(config_file, "r") as main_file:
+            parser = ConfigurationParser(main_file)
+            runner = CommandRunner(parser, 'postprocessing_commands', None)
+
+            commands = runner._get_commands()
+            assert runner._get_dependencies(commands) == {'10_slow': set(), '20_fast': set(),
+                                                          '30_combine': {'10_slow', '20_fast'}}
+
+            runner.run()
+
+            with open(os.path.join('artifacts', 'combined.txt'), mode='r') as combined_file:
+                assert combined_file.read() == 'slow\nfast\n'
+
+            # the fast command did not wait for the slow command
+            with open(os.path.join('artifacts', 'slow.txt.end'), mode='r') as slow_end:
+                with open(os.path.join('artifacts', 'fast.txt.end'), mode='r') as fast_end:
+                    assert int(fast_end.read()) < int(slow_end.read())
+
+            # the output of each command goes into a separate log file
+            log_file = os.path.join('artifacts', '.edi_logs', 'postprocessing_commands_30_combine.log')
+            with open(log_file, mode='r') as log:
+                assert 'combining' in log.read()
+
+
+def test_parallel_execution_fail_fast(monkeypatch):
+    suppress_chown_during_debuild(monkeypatch)
+
+    with workspace() as workdir:
+        config_file = create_parallel_project(workdir, 2)
+        with open(config_file, "r") as main_file:
+            parser = ConfigurationParser(main_file)
+            parser._get_config()['postprocessing_commands']['20_fast']['parameters'] = {'fail_command': 'false'}
+            runner = CommandRunner(parser, 'postprocessing_commands', None)
+
+            with pytest.raises(FatalError) as error:
+                runner.run()
+
+            assert '20_fast' in error.value.message
+            assert 'postprocessing_commands_20_fast.log' in error.value.message
+            # the running command completes but the dependent command gets cancelled
+            assert os.path.isfile(os.path.join('artifacts', 'slow.txt'))
+            assert not os.path.isfile(os.path.join('artifacts', 'combined.txt'))
+
+
+def test_circular_dependencies(monkeypatch):
+    suppress_chown_during_debuild(monkeypatch)
+
+    with workspace() as workdir:
+        config_file = create_parallel_project(workdir, 1)
+        with open(config_file, "r") as main_file:
+            parser = ConfigurationParser(main_file)
+            parser._get_config()['postprocessing_commands']['10_slow']['depends_on'] = '30_combine'
+            runner = CommandRunner(parser, 'postprocessing_commands', None)
+
+            with pytest.raises(FatalError) as error:
+                runner.run()
+
+            assert 'circular' in error.value.message
+            assert '10_slow' in error.value.message
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import io
+import os
+import tarfile
+import pytest
+from edi.lib.artifact import ArtifactType
+from edi.lib.documentationinput import documentation_input, extract_documentation_files, parse_raw_input
+from edi.lib.helpers import FatalError
+from edi.lib.shellhelpers import run
+from tests.libtesting.helpers import get_project_root
+
+
+raw_input = os.path.join(get_project_root(), 'tests', 'data', 'test_documentation', 'raw_input')
+
+
+def add_file(tar, name, content):
+    info = tarfile.TarInfo(name)
+    info.size = len(content)
+    tar.addfile(info, io.BytesIO(content))
+
+
+def add_link(tar, name, target, link_type=tarfile.SYMTYPE):
+    info = tarfile.TarInfo(name)
+    info.type = link_type
+    info.linkname = target
+    tar.addfile(info)
+
+
+def create_rootfs_archive(archive, mode='w:gz'):
+    with tarfile.open(archive, mode=mode) as tar:
+        add_file(tar, './etc/hostname', b'foo\n')
+        tar.add(raw_input, arcname='./usr/share/doc')
+        add_link(tar, './usr/share/doc/sudo-ldap', 'sudo')
+        add_link(tar, './usr/share/doc/libfoo', '/usr/share/doc/python3-apt')
+        add_link(tar, './usr/share/doc/evil', '../../../../../etc')
+        add_link(tar, './usr/share/doc/bar/changelog.gz', '/usr/share/doc/sudo/changelog.gz')
+        add_link(tar, './usr/share/doc/baz/changelog.gz', './usr/share/doc/sudo/changelog.gz',
+                 link_type=tarfile.LNKTYPE)
+
+
+def test_parse_raw_input():
+    assert parse_raw_input(raw_input) == (ArtifactType.PATH, raw_input)
+    assert parse_raw_input('buildah-container:foo') == (ArtifactType.BUILDAH_CONTAINER, 'foo')
+    assert parse_raw_input('podman-image:docker.io/library/debian:bookworm') == (ArtifactType.PODMAN_IMAGE,
+                                                                                 'docker.io/library/debian:bookworm')
+    assert parse_raw_input('foo:bar') == (ArtifactType.PATH, 'foo:bar')
+
+
+def test_extract_documentation_files(tmpdir):
+    archive = os.path.join(str(tmpdir), 'rootfs.tar.gz')
+    create_rootfs_archive(archive)
+    target = os.path.join(str(tmpdir), 'rootfs')
+    os.mkdir(target)
+
+    extract_documentation_files(archive, target)
+
+    doc = os.path.join(target, 'usr', 'share', 'doc')
+    for file in ['edi/build.yml', 'edi/packages.yml', 'edi/packages-baseline.yml', 'sudo/changelog.Debian.gz',
+                 'sudo/changelog.gz', 'python3-apt/changelog.gz', 'sudo-ldap/changelog.Debian.gz',
+                 'libfoo/changelog.gz', 'bar/changelog.gz', 'baz/changelog.gz']:
+        assert os.path.isfile(os.path.join(doc, file))
+
+    with open(os.path.join(doc, 'bar', 'changelog.gz'), mode='rb') as f:
+        with open(os.path.join(raw_input, 'sudo', 'changelog.gz'), mode='rb') as reference:
+            assert f.read() == reference.read()
+
+    assert not os.path.exists(os.path.join(doc, 'sudo', 'copyright'))
+    assert not os.path.exists(os.path.join(target, 'etc'))
+    assert not os.path.lexists(os.path.join(doc, 'evil'))
+    for root, _, files in os.walk(target):
+        for file in files:
+            assert os.path.realpath(os.path.join(root, file)).startswith(os.path.realpath(target))
+
+
+@pytest.mark.parametrize("mode, extension", [('w', 'tar'), ('w:xz', 'tar.xz')])
+def test_documentation_input(tmpdir, mode, extension):
+    archive = os.path.join(str(tmpdir), 'rootfs.{}'.format(extension))
+    create_rootfs_archive(archive, mode)
+
+    with documentation_input(archive) as directory:
+        assert os.path.isfile(os.path.join(directory, 'edi', 'packages.yml'))
+        extracted_directory = directory
+    assert not os.path.exists(extracted_directory)
+
+    with documentation_input(raw_input) as directory:
+        assert directory == raw_input
+    assert os.path.isdir(raw_input)
+
+
+@pytest.mark.parametrize("padding", [0, 4096 * 512])
+def test_zstd_documentation_input(tmpdir, padding):
+    archive = os.path.join(str(tmpdir), 'rootfs.tar')
+    create_rootfs_archive(archive, 'w')
+    # pad the archive like tar -b 4096 does: tarfile stops reading at the end-of-archive marker
+    with open(archive, mode='ab') as f:
+        f.write(b'\0' * padding)
+    run(['zstd', '-q', '--rm', archive])
+
+    with documentation_input('{}.zst'.format(archive)) as directory:
+        assert os.path.isfile(os.path.join(directory, 'edi', 'packages.yml'))
+
+
+def test_invalid_documentation_input(tmpdir):
+    archive = os.path.join(str(tmpdir), 'rootfs.tar')
+    with open(archive, mode='w') as f:
+        f.write('no archive')
+
+    with pytest.raises(FatalError) as error:
+        with documentation_input(archive):
+            pass
+
+    assert 'Unable to read' in error.value.message
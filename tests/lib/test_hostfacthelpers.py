@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import pytest
+from codecs import open
+from edi.lib import hostfacthelpers
+from edi.lib.hostfacthelpers import get_ssh_identity_files, get_debian_architecture, get_environment_variable
+
+
+def write_file(file_path, content):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, mode='w', encoding='utf-8') as file:
+        file.write(content)
+
+
+@pytest.fixture
+def ssh_setup(monkeypatch, tmpdir):
+    system_config = os.path.join(str(tmpdir), 'etc', 'ssh', 'ssh_config')
+    monkeypatch.setattr(hostfacthelpers, '_system_ssh_config', system_config)
+    user_home = os.path.join(str(tmpdir), 'home', 'john')
+    os.makedirs(user_home)
+    return user_home, system_config
+
+
+def test_ssh_identity_files_defaults(ssh_setup):
+    user_home, system_config = ssh_setup
+    assert get_ssh_identity_files(user_home) == hostfacthelpers._default_ssh_identity_files
+
+    write_file(system_config, ("Include /no/such/folder/*.conf\n"
+                               "Host *\n"
+                               "    SendEnv LANG LC_*\n"
+                               "    HashKnownHosts yes\n"))
+    assert get_ssh_identity_files(user_home) == hostfacthelpers._default_ssh_identity_files
+
+
+def test_ssh_identity_files_configured(ssh_setup):
+    user_home, system_config = ssh_setup
+    write_file(os.path.join(user_home, '.ssh', 'config'), ("IdentityFile ~/.ssh/bingo\n"
+                                                           "Include extra.conf\n"
+                                                           "Host *\n"
+                                                           "    IdentityFile=\"~/.ssh/bongo key\"\n"))
+    write_file(os.path.join(user_home, '.ssh', 'extra.conf'), "identityfile = ~/.ssh/baz # comment\n")
+    write_file(system_config, "Host *\n    IdentityFile ~/.ssh/bingo\n")
+    assert get_ssh_identity_files(user_home) == ['~/.ssh/bingo', '~/.ssh/baz', '~/.ssh/bongo key']
+
+
+@pytest.mark.parametrize("user_config", [
+    "Host example.com\n    IdentityFile ~/.ssh/bingo\n",
+    "Match exec true\n    IdentityFile ~/.ssh/bingo\n",
+    "IdentityFile ~/.ssh/id_%u\n",
+    "IdentityFile ${HOME}/.ssh/bingo\n",
+    "IdentityFile \"~/.ssh/bingo\n",
+])
+def test_ssh_identity_files_ambiguous(ssh_setup, user_config):
+    user_home, _ = ssh_setup
+    write_file(os.path.join(user_home, '.ssh', 'config'), user_config)
+    assert get_ssh_identity_files(user_home) is None
+
+
+@pytest.mark.parametrize("machine, maxsize, expected_architecture", [
+    ('x86_64', 2**63 - 1, 'amd64'),
+    ('x86_64', 2**31 - 1, 'i386'),
+    ('aarch64', 2**63 - 1, 'arm64'),
+    ('armv7l', 2**31 - 1, None),
+    ('i686', 2**31 - 1, 'i386'),
+])
+def test_get_debian_architecture(monkeypatch, machine, maxsize, expected_architecture):
+    monkeypatch.setattr(hostfacthelpers.platform, 'machine', lambda: machine)
+    monkeypatch.setattr(hostfacthelpers.sys, 'maxsize', maxsize)
+    assert get_debian_architecture() == expected_architecture
+
+
+def test_get_environment_variable(monkeypatch):
+    monkeypatch.setenv('EDI_PYTEST_VARIABLE', 'bingo')
+    assert get_environment_variable('EDI_PYTEST_VARIABLE') == 'bingo'
+    monkeypatch.delenv('EDI_PYTEST_VARIABLE')
+    assert get_environment_variable('EDI_PYTEST_VARIABLE', 'bongo') == 'bongo'
@@ -20,6 +20,8 @@
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import json
+import os
 import subprocess
 import pytest
 from subprocess import CalledProcessError
@@ -29,10 +31,17 @@ from edi.lib.lxchelpers import (get_server_image_compression_algorithm,
                                 get_file_extension_from_image_compression_algorithm, lxc_exec,
                                 get_lxd_version, LxdVersion, is_bridge_available, create_bridge,
                                 is_container_running, get_profile_description, is_profile_existing,
-                                write_lxc_profile)
+                                write_lxc_profile, lxd_state_snapshot, LxdStateSnapshot, is_container_existing,
+                                is_in_image_store, get_container_profiles, stop_container, launch_container,
+                                import_image, get_container_snapshots, create_container_snapshot,
+                                restore_container_snapshot, delete_container_snapshot, get_container_config_item,
+                                set_container_config_item, LxdBackend)
+from edi.lib.lxdrestclient import LxdRestClient
 from edi.lib.shellhelpers import mockablerun, run
 from tests.libtesting.helpers import get_command, get_sub_command, log_during_run
-from tests.libtesting.contextmanagers.mocked_executable import mocked_executable, mocked_lxd_version_check
+from tests.libtesting.contextmanagers.fake_lxd_server import fake_lxd_server, sync_response, async_response
+from tests.libtesting.contextmanagers.mocked_executable import (mocked_executable, mocked_lxd_version_check,
+                                                                mocked_lxd_backend)
 
 
 @pytest.mark.requires_lxc
@@ -43,7 +52,7 @@ def test_get_server_image_compression():
 
 def test_get_server_image_compression_bzip2(monkeypatch):
     with mocked_executable('lxc', '/here/is/no/lxc'):
-        with mocked_lxd_version_check():
+        with mocked_lxd_version_check(), mocked_lxd_backend():
             def fake_lxc_config_command(*popenargs, **kwargs):
                 if get_command(popenargs).endswith('lxc') and get_sub_command(popenargs) == 'config':
                     return subprocess.CompletedProcess("fakerun", 0, stdout='bzip2')
@@ -78,7 +87,7 @@ lxc_info_json = """
 ])
 def test_is_container_running(monkeypatch, container_name, lxc_output, expected_result):
     with mocked_executable('lxc', '/here/is/no/lxc'):
-        with mocked_lxd_version_check():
+        with mocked_lxd_version_check(), mocked_lxd_backend():
             def fake_lxc_info_command(*popenargs, **kwargs):
                 if get_command(popenargs).endswith('lxc') and get_sub_command(popenargs) == 'list':
                     return subprocess.CompletedProcess("fakerun", 0, stdout=lxc_output)
@@ -90,6 +99,195 @@ def test_is_container_running(monkeypatch, container_name, lxc_output, expected_
             assert result == expected_result
 
 
+lxc_list_json = """
+[
+  {
+    "name": "debian-bullseye",
+    "status": "Stopped",
+    "profiles": ["default"]
+  },
+  {
+    "name": "debian-buster",
+    "status": "Running",
+    "profiles": ["default", "edi-privileged"]
+  }
+]
+"""
+
+lxc_image_list_json = """
+[
+  {
+    "fingerprint": "9d8c6a4e3b2f1e0d",
+    "aliases": [{"name": "debian-buster-image", "description": ""}]
+  }
+]
+"""
+
+lxc_profile_list_json = """
+[
+  {
+    "name": "default",
+    "description": "Default LXD profile"
+  }
+]
+"""
+
+
+def test_lxd_state_snapshot(monkeypatch):
+    queries = []
+
+    def fake_lxc_command(*popenargs, **kwargs):
+        if get_command(popenargs).endswith('lxc'):
+            queries.append(popenargs[0][1:])
+            if popenargs[0][1:] == ['list', '--format=json']:
+                return subprocess.CompletedProcess("fakerun", 0, stdout=lxc_list_json)
+            elif popenargs[0][1:] == ['image', 'list', '--format=json']:
+                return subprocess.CompletedProcess("fakerun", 0, stdout=lxc_image_list_json)
+            elif popenargs[0][1:] == ['profile', 'list', '--format=json']:
+                return subprocess.CompletedProcess("fakerun", 0, stdout=lxc_profile_list_json)
+            else:
+                return subprocess.CompletedProcess("fakerun", 0, stdout='')
+        else:
+            return subprocess.run(*popenargs, **kwargs)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', fake_lxc_command)
+
+    with mocked_executable('lxc', '/here/is/no/lxc'):
+        with mocked_lxd_version_check(), mocked_lxd_backend():
+            with lxd_state_snapshot():
+                assert is_container_existing('debian-bullseye')
+                assert not is_container_existing('debian')
+                with lxd_state_snapshot():
+                    assert is_container_running('debian-buster')
+                assert not is_container_running('debian-bullseye')
+                assert get_container_profiles('debian-buster') == ['default', 'edi-privileged']
+                assert queries == [['list', '--format=json']]
+
+                assert is_in_image_store('debian-buster-image')
+                assert is_in_image_store('9d8c6a4e')
+                assert not is_in_image_store('debian-bullseye-image')
+                assert is_profile_existing('default')
+                assert get_profile_description('default') == 'Default LXD profile'
+                assert get_profile_description('edi-privileged') == ''
+                assert len(queries) == 3
+
+                stop_container('debian-buster')
+                assert queries[-1] == ['stop', 'debian-buster']
+                assert is_container_running('debian-buster')
+                assert queries[-1] == ['list', '--format=json']
+                assert len(queries) == 5
+
+            assert not LxdStateSnapshot.is_active()
+            assert LxdStateSnapshot._cache == dict()
+
+
+def test_lxd_state_snapshot_fallback(monkeypatch):
+    queries = []
+
+    def fake_lxc_command(*popenargs, **kwargs):
+        if get_command(popenargs).endswith('lxc'):
+            queries.append(popenargs[0][1:])
+            if get_sub_command(popenargs) == 'profile' and popenargs[0][2] == 'list':
+                return subprocess.CompletedProcess("fakerun", 1, stdout='', stderr='unknown flag: --format')
+            else:
+                return subprocess.CompletedProcess("fakerun", 0, stdout='description: Some description\n')
+        else:
+            return subprocess.run(*popenargs, **kwargs)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', fake_lxc_command)
+
+    with mocked_executable('lxc', '/here/is/no/lxc'):
+        with mocked_lxd_version_check(), mocked_lxd_backend():
+            with lxd_state_snapshot():
+                assert is_profile_existing('foo')
+                assert get_profile_description('foo') == 'Some description'
+                assert queries == [['profile', 'list', '--format=json'], ['profile', 'show', 'foo'],
+                                   ['profile', 'show', 'foo']]
+
+
+def test_rest_backend(monkeypatch):
+    routes = {
+        ('GET', '/1.0/containers/debian-buster'): sync_response({'name': 'debian-buster', 'status': 'Running',
+                                                                'profiles': ['default']}),
+        ('GET', '/1.0/images/aliases/debian-buster-image'): sync_response({'name': 'debian-buster-image',
+                                                                          'target': '9d8c6a4e3b2f1e0d'}),
+        ('POST', '/1.0/containers'): async_response('/1.0/operations/create'),
+        ('GET', '/1.0/operations/create/wait?timeout=30'): sync_response({'status_code': 200}),
+        ('PUT', '/1.0/containers/debian-bookworm/state'): async_response('/1.0/operations/start'),
+        ('GET', '/1.0/operations/start/wait?timeout=30'): sync_response({'status_code': 200}),
+    }
+
+    def no_subprocess(*popenargs, **_):
+        assert False, "Unexpected subprocess {}.".format(popenargs)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', no_subprocess)
+
+    with fake_lxd_server(routes) as server:
+        with mocked_executable('lxc', '/here/is/no/lxc'), mocked_lxd_version_check():
+            with mocked_lxd_backend(LxdRestClient(server.socket_path)):
+                assert is_container_existing('debian-buster')
+                assert is_container_running('debian-buster')
+                assert get_container_profiles('debian-buster') == ['default']
+                assert not is_container_existing('debian-bullseye')
+                assert is_in_image_store('debian-buster-image')
+                assert not is_in_image_store('debian-bullseye-image')
+
+                launch_container('debian-buster-image', 'debian-bookworm', ['default', 'edi-privileged'])
+                _, _, body = server.requests[-4]
+                assert json.loads(body.decode()) == {'name': 'debian-bookworm',
+                                                     'source': {'type': 'image', 'alias': 'debian-buster-image'},
+                                                     'profiles': ['default', 'edi-privileged']}
+                _, path, body = server.requests[-2]
+                assert path == '/1.0/containers/debian-bookworm/state'
+                assert json.loads(body.decode())['action'] == 'start'
+
+                with pytest.raises(FatalError) as error:
+                    launch_container('debian-buster-image', 'debian-trixie', [])
+                assert 'debian-buster-image' in error.value.message
+
+        assert server.connections == 1
+
+
+@pytest.mark.parametrize("rootfs_content", [None, b'rootfs'])
+def test_import_image(monkeypatch, tmpdir, rootfs_content):
+    image = os.path.join(str(tmpdir), 'image.tar.xz')
+    with open(image, mode='wb') as image_file:
+        image_file.write(b'metadata')
+    rootfs = None
+    if rootfs_content:
+        rootfs = os.path.join(str(tmpdir), 'image_rootfs.tar.xz')
+        with open(rootfs, mode='wb') as rootfs_file:
+            rootfs_file.write(rootfs_content)
+
+    routes = {
+        ('POST', '/1.0/images'): async_response('/1.0/operations/upload'),
+        ('GET', '/1.0/operations/upload/wait?timeout=30'): sync_response({'status_code': 200,
+                                                                          'metadata': {'fingerprint': 'abc'}}),
+        ('POST', '/1.0/images/aliases'): sync_response({}),
+    }
+
+    def no_subprocess(*popenargs, **_):
+        assert False, "Unexpected subprocess {}.".format(popenargs)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', no_subprocess)
+
+    with fake_lxd_server(routes) as server:
+        with mocked_executable('lxc', '/here/is/no/lxc'), mocked_lxd_version_check():
+            with mocked_lxd_backend(LxdRestClient(server.socket_path)):
+                import_image(image, 'debian-image', rootfs=rootfs)
+
+        _, _, upload_body = server.requests[0]
+        if rootfs_content:
+            assert b'name="metadata"' in upload_body
+            assert b'name="rootfs"' in upload_body
+            assert rootfs_content in upload_body
+        else:
+            assert upload_body == b'metadata'
+        _, path, alias_body = server.requests[-1]
+        assert path == '/1.0/images/aliases'
+        assert json.loads(alias_body.decode())['target'] == 'abc'
+
+
 @pytest.mark.parametrize("algorithm, expected_extension", [
     ("none", ".tar"),
     ("bzip2", ".tar.bz2"),
@@ -143,7 +341,7 @@ def patch_lxd_get_version(monkeypatch, fake_version):
 
 def test_invalid_version(monkeypatch):
     patch_lxd_get_version(monkeypatch, '2.2.0')
-    with mocked_executable('lxd', '/here/is/no/lxd'):
+    with mocked_executable('lxd', '/here/is/no/lxd'), mocked_lxd_backend():
         with clear_lxd_version_check_cache():
             check_method = LxdVersion.check
 
@@ -157,7 +355,7 @@ def test_invalid_version(monkeypatch):
 
 def test_valid_version(monkeypatch):
     patch_lxd_get_version(monkeypatch, '3.0.0+bingo')
-    with mocked_executable('lxd', '/here/is/no/lxd'):
+    with mocked_executable('lxd', '/here/is/no/lxd'), mocked_lxd_backend():
         with clear_lxd_version_check_cache():
             LxdVersion.check()
 
@@ -168,7 +366,7 @@ def test_is_bridge_available():
     assert not is_bridge_available(bridge_name)
     create_bridge(bridge_name)
     assert is_bridge_available(bridge_name)
-    with pytest.raises(CalledProcessError):
+    with pytest.raises((CalledProcessError, FatalError)):
         create_bridge(bridge_name)
     cmd = [lxc_exec(), "network", "delete", bridge_name]
     run(cmd)
@@ -209,3 +407,129 @@ def test_write_profile(monkeypatch, do_log):
     assert "Some description" == get_profile_description(profile_name)
     run([lxc_exec(), "profile", "delete", profile_name])
     assert not is_profile_existing(profile_name)
+
+
+def test_container_snapshots_rest(monkeypatch):
+    routes = {
+        ('GET', '/1.0/containers/debian-buster/snapshots?recursion=1'): sync_response([
+            {'name': 'debian-buster/edi-2', 'created_at': '2026-10-18T10:05:00Z'},
+            {'name': 'debian-buster/edi-1', 'created_at': '2026-10-18T10:00:00Z'},
+        ]),
+        ('POST', '/1.0/containers/debian-buster/snapshots'): async_response('/1.0/operations/snapshot'),
+        ('GET', '/1.0/operations/snapshot/wait?timeout=30'): sync_response({'status_code': 200}),
+        ('PUT', '/1.0/containers/debian-buster'): async_response('/1.0/operations/restore'),
+        ('GET', '/1.0/operations/restore/wait?timeout=30'): sync_response({'status_code': 200}),
+        ('DELETE', '/1.0/containers/debian-buster/snapshots/edi-1'): async_response('/1.0/operations/delete'),
+        ('GET', '/1.0/operations/delete/wait?timeout=30'): sync_response({'status_code': 200}),
+        ('GET', '/1.0/containers/debian-buster'): sync_response({'name': 'debian-buster',
+                                                                 'config': {'user.edi-playbooks': 'abc'}}),
+        ('PATCH', '/1.0/containers/debian-buster'): sync_response({}),
+    }
+
+    def no_subprocess(*popenargs, **_):
+        assert False, "Unexpected subprocess {}.".format(popenargs)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', no_subprocess)
+
+    with fake_lxd_server(routes) as server:
+        with mocked_executable('lxc', '/here/is/no/lxc'), mocked_lxd_version_check():
+            with mocked_lxd_backend(LxdRestClient(server.socket_path)):
+                assert get_container_snapshots('debian-buster') == ['edi-1', 'edi-2']
+
+                create_container_snapshot('debian-buster', 'edi-3')
+                _, path, body = server.requests[-2]
+                assert path == '/1.0/containers/debian-buster/snapshots'
+                assert json.loads(body.decode()) == {'name': 'edi-3', 'stateful': False}
+
+                restore_container_snapshot('debian-buster', 'edi-2')
+                _, path, body = server.requests[-2]
+                assert path == '/1.0/containers/debian-buster'
+                assert json.loads(body.decode()) == {'restore': 'edi-2'}
+
+                delete_container_snapshot('debian-buster', 'edi-1')
+                method, path, _ = server.requests[-2]
+                assert (method, path) == ('DELETE', '/1.0/containers/debian-buster/snapshots/edi-1')
+
+                assert get_container_config_item('debian-buster', 'user.edi-playbooks') == 'abc'
+                assert get_container_config_item('debian-buster', 'user.foo') is None
+
+                set_container_config_item('debian-buster', 'user.edi-playbooks', 'def')
+                method, path, body = server.requests[-1]
+                assert (method, path) == ('PATCH', '/1.0/containers/debian-buster')
+                assert json.loads(body.decode()) == {'config': {'user.edi-playbooks': 'def'}}
+
+
+def test_container_snapshots_cli(monkeypatch):
+    commands = []
+
+    def fake_lxc_command(*popenargs, **kwargs):
+        if get_command(popenargs).endswith('lxc'):
+            commands.append(popenargs[0][1:])
+            if get_sub_command(popenargs) == 'list':
+                return subprocess.CompletedProcess("fakerun", 0, stdout=json.dumps([
+                    {'name': 'debian-buster-2', 'snapshots': None},
+                    {'name': 'debian-buster', 'snapshots': [{'name': 'snap0', 'created_at': '2026-10-18T10:00:00Z'},
+                                                            {'name': 'edi-1', 'created_at': '2026-10-18T11:00:00Z'}]},
+                ]))
+            elif popenargs[0][1:3] == ['config', 'get']:
+                return subprocess.CompletedProcess("fakerun", 0, stdout='abc\n')
+            else:
+                return subprocess.CompletedProcess("fakerun", 0, stdout='')
+        else:
+            return subprocess.run(*popenargs, **kwargs)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', fake_lxc_command)
+
+    with mocked_executable('lxc', '/here/is/no/lxc'):
+        with mocked_lxd_version_check(), mocked_lxd_backend():
+            assert get_container_config_item('debian-buster', 'user.edi-playbooks') == 'abc'
+            set_container_config_item('debian-buster', 'user.edi-playbooks', 'def')
+            assert commands[-1] == ['config', 'set', 'debian-buster', 'user.edi-playbooks', 'def']
+            assert get_container_snapshots('debian-buster') == ['snap0', 'edi-1']
+            assert get_container_snapshots('debian-buster-2') == []
+            create_container_snapshot('debian-buster', 'edi-2')
+            restore_container_snapshot('debian-buster', 'edi-1')
+            delete_container_snapshot('debian-buster', 'edi-2')
+            assert commands[-3:] == [['snapshot', 'debian-buster', 'edi-2'], ['restore', 'debian-buster', 'edi-1'],
+                                     ['delete', 'debian-buster/edi-2']]
+
+
+@pytest.mark.parametrize("error_message, expected_force", [
+    ("Failed shutting down instance: context deadline exceeded", True),
+    ("Instance is busy running a restore operation", False),
+])
+def test_stop_container_rest_timeout(monkeypatch, error_message, expected_force):
+    routes = {
+        ('PUT', '/1.0/containers/debian-buster/state'): async_response('/1.0/operations/stop'),
+        ('GET', '/1.0/operations/stop/wait?timeout=30'): sync_response({'status_code': 400, 'err': error_message}),
+    }
+
+    def no_subprocess(*popenargs, **_):
+        assert False, "Unexpected subprocess {}.".format(popenargs)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', no_subprocess)
+
+    with fake_lxd_server(routes) as server:
+        with mocked_executable('lxc', '/here/is/no/lxc'), mocked_lxd_version_check():
+            with mocked_lxd_backend(LxdRestClient(server.socket_path)):
+                if expected_force:
+                    with pytest.raises(FatalError):
+                        # the forced stop fails as well within this fake setup
+                        stop_container('debian-buster', timeout=60)
+                    _, _, body = server.requests[-2]
+                    assert json.loads(body.decode())['force']
+                else:
+                    with pytest.raises(FatalError) as error:
+                        stop_container('debian-buster', timeout=60)
+                    assert 'restore' in error.value.message
+                    assert len(server.requests) == 2
+
+
+def test_disabled_rest_api(monkeypatch):
+    with mocked_lxd_backend(LxdRestClient('/here/is/no/socket')):
+        assert LxdBackend.get_rest_client()
+        LxdBackend.enable_rest_api(False)
+        try:
+            assert LxdBackend.get_rest_client() is None
+        finally:
+            LxdBackend.enable_rest_api(True)
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import os
+import pytest
+from edi.lib.helpers import FatalError
+from edi.lib.lxdrestclient import LxdRestClient, LxdRestError, UnsupportedDownload, find_lxd_socket
+from tests.libtesting.contextmanagers.fake_lxd_server import fake_lxd_server, sync_response, async_response
+
+
+def test_get_reuses_connection():
+    routes = {
+        ('GET', '/1.0'): sync_response({'environment': {'server_version': '5.21.1'}}),
+        ('GET', '/1.0/containers?recursion=1'): sync_response([{'name': 'foo', 'status': 'Running'}]),
+    }
+    with fake_lxd_server(routes) as server:
+        client = LxdRestClient(server.socket_path)
+        assert client.get('/1.0')['environment']['server_version'] == '5.21.1'
+        assert client.get('/1.0/containers', recursion=1) == [{'name': 'foo', 'status': 'Running'}]
+        assert server.connections == 1
+        client.close()
+
+
+def test_retry_after_disconnect():
+    responses = []
+
+    def drop_first_request(_):
+        responses.append(len(responses) > 0)
+        if not responses[-1]:
+            return None
+        return 200, {'Content-Type': 'application/json'}, json.dumps(sync_response({'name': 'foo'})).encode()
+
+    routes = {('GET', '/1.0/profiles/foo'): drop_first_request,
+              ('POST', '/1.0/profiles'): drop_first_request}
+    with fake_lxd_server(routes) as server:
+        client = LxdRestClient(server.socket_path)
+        # a read only request gets repeated on a new connection
+        assert client.get('/1.0/profiles/foo') == {'name': 'foo'}
+        assert len(server.requests) == 2
+
+        # a request that modifies the state does not get repeated
+        responses.clear()
+        with pytest.raises(ConnectionError):
+            client.post('/1.0/profiles', {'name': 'foo'})
+        assert len(server.requests) == 3
+        client.close()
+
+
+def test_error_response():
+    with fake_lxd_server({}) as server:
+        client = LxdRestClient(server.socket_path)
+        with pytest.raises(LxdRestError) as error:
+            client.get('/1.0/containers/does-not-exist')
+        assert error.value.status_code == 404
+        assert 'does-not-exist' in error.value.message
+
+
+def test_async_operation_polling():
+    poll_results = [{'status_code': 103}, {'status_code': 103}, {'status_code': 200, 'metadata': {'id': 42}}]
+
+    def wait_for_operation(_):
+        return 200, {'Content-Type': 'application/json'}, json.dumps(sync_response(poll_results.pop(0))).encode()
+
+    routes = {
+        ('POST', '/1.0/profiles'): async_response('/1.0/operations/1234'),
+        ('GET', '/1.0/operations/1234/wait?timeout=30'): wait_for_operation,
+    }
+    with fake_lxd_server(routes) as server:
+        client = LxdRestClient(server.socket_path)
+        assert client.post('/1.0/profiles', {'name': 'foo'}) == {'status_code': 200, 'metadata': {'id': 42}}
+        assert not poll_results
+        method, path, body = server.requests[0]
+        assert (method, path, json.loads(body.decode())) == ('POST', '/1.0/profiles', {'name': 'foo'})
+
+
+def test_failed_async_operation():
+    routes = {
+        ('DELETE', '/1.0/containers/foo'): async_response('/1.0/operations/1'),
+        ('GET', '/1.0/operations/1/wait?timeout=30'): sync_response({'status_code': 400, 'err': 'still running'}),
+    }
+    with fake_lxd_server(routes) as server:
+        client = LxdRestClient(server.socket_path)
+        with pytest.raises(LxdRestError) as error:
+            client.delete('/1.0/containers/foo')
+        assert 'still running' in error.value.message
+
+
+def test_upload(tmpdir):
+    image = os.path.join(str(tmpdir), 'image.tar.xz')
+    content = os.urandom(3 * 1024 * 1024 + 17)
+    with open(image, mode='wb') as image_file:
+        image_file.write(content)
+
+    routes = {
+        ('POST', '/1.0/images'): async_response('/1.0/operations/upload'),
+        ('GET', '/1.0/operations/upload/wait?timeout=30'): sync_response({'status_code': 200,
+                                                                          'metadata': {'fingerprint': 'abc'}}),
+    }
+    with fake_lxd_server(routes) as server:
+        client = LxdRestClient(server.socket_path)
+        with open(image, mode='rb') as image_file:
+            result = client.upload('/1.0/images', image_file, headers={'X-LXD-public': '0'})
+        assert result['metadata']['fingerprint'] == 'abc'
+        _, _, body = server.requests[0]
+        assert body == content
+
+
+def test_upload_multipart(tmpdir):
+    metadata = os.path.join(str(tmpdir), 'metadata.tar.xz')
+    rootfs = os.path.join(str(tmpdir), 'rootfs.tar.xz')
+    metadata_content = os.urandom(1000)
+    rootfs_content = os.urandom(2 * 1024 * 1024 + 5)
+    for path, content in [(metadata, metadata_content), (rootfs, rootfs_content)]:
+        with open(path, mode='wb') as f:
+            f.write(content)
+
+    routes = {
+        ('POST', '/1.0/images'): async_response('/1.0/operations/upload'),
+        ('GET', '/1.0/operations/upload/wait?timeout=30'): sync_response({'status_code': 200,
+                                                                          'metadata': {'fingerprint': 'abc'}}),
+    }
+    with fake_lxd_server(routes) as server:
+        client = LxdRestClient(server.socket_path)
+        with open(metadata, mode='rb') as metadata_file, open(rootfs, mode='rb') as rootfs_file:
+            result = client.upload_multipart('/1.0/images', [('metadata', metadata_file), ('rootfs', rootfs_file)])
+        assert result['metadata']['fingerprint'] == 'abc'
+        _, _, body = server.requests[0]
+
+    boundary = body[2:body.index(b'\r\n')]
+    parts = body.split(b'--' + boundary)
+    assert parts[0] == b''
+    assert parts[-1] == b'--\r\n'
+    for part, name, content in [(parts[1], 'metadata', metadata_content), (parts[2], 'rootfs', rootfs_content)]:
+        header, data = part.split(b'\r\n\r\n', 1)
+        assert 'name="{}"'.format(name).encode() in header
+        assert data == content + b'\r\n'
+
+
+def test_download(tmpdir):
+    content = os.urandom(2 * 1024 * 1024 + 3)
+
+    def export_image(_):
+        return 200, {'Content-Type': 'application/octet-stream',
+                     'Content-Disposition': 'attachment; filename=abc.tar.xz'}, content
+
+    def export_split_image(_):
+        return 200, {'Content-Type': 'multipart/form-data; boundary=foo'}, b'--foo--'
+
+    routes = {
+        ('GET', '/1.0/images/abc/export'): export_image,
+        ('GET', '/1.0/images/def/export'): export_split_image,
+        ('GET', '/1.0'): sync_response({}),
+    }
+    with fake_lxd_server(routes) as server:
+        client = LxdRestClient(server.socket_path)
+        target = client.download('/1.0/images/abc/export', os.path.join(str(tmpdir), 'image'))
+        assert target == os.path.join(str(tmpdir), 'image.tar.xz')
+        with open(target, mode='rb') as target_file:
+            assert target_file.read() == content
+
+        with pytest.raises(UnsupportedDownload):
+            client.download('/1.0/images/def/export', os.path.join(str(tmpdir), 'split'))
+
+        with pytest.raises(LxdRestError):
+            client.download('/1.0/images/ghi/export', os.path.join(str(tmpdir), 'missing'))
+
+        # the connection gets re-established after an aborted download
+        assert client.get('/1.0') == {}
+
+
+def test_download_after_disconnect(tmpdir):
+    content = b'image content'
+    requests = []
+
+    def export_image(_):
+        requests.append(True)
+        if len(requests) == 1:
+            return None
+        return 200, {'Content-Type': 'application/octet-stream',
+                     'Content-Disposition': 'attachment; filename=abc.tar.xz'}, content
+
+    with fake_lxd_server({('GET', '/1.0/images/abc/export'): export_image}) as server:
+        client = LxdRestClient(server.socket_path)
+        # a dropped connection gets re-established once
+        target = client.download('/1.0/images/abc/export', os.path.join(str(tmpdir), 'image'))
+        with open(target, mode='rb') as target_file:
+            assert target_file.read() == content
+        assert len(server.requests) == 2
+        client.close()
+
+
+def test_aborted_download(tmpdir):
+    def export_image(_):
+        return 200, {'Content-Type': 'application/octet-stream', 'Content-Length': '1000',
+                     'Content-Disposition': 'attachment; filename=abc.tar.xz'}, b'truncated'
+
+    routes = {
+        ('GET', '/1.0/images/abc/export'): export_image,
+        ('GET', '/1.0'): sync_response({}),
+    }
+    with fake_lxd_server(routes) as server:
+        client = LxdRestClient(server.socket_path)
+        with pytest.raises(FatalError) as error:
+            client.download('/1.0/images/abc/export', os.path.join(str(tmpdir), 'image'))
+        assert '/1.0/images/abc/export' in error.value.message
+
+        # no partially downloaded image remains
+        assert os.listdir(str(tmpdir)) == []
+        assert client.get('/1.0') == {}
+        client.close()
+
+
+def test_find_lxd_socket(monkeypatch):
+    with fake_lxd_server({}) as server:
+        monkeypatch.setenv('LXD_DIR', os.path.dirname(server.socket_path))
+        assert find_lxd_socket() == server.socket_path
+
+    monkeypatch.setenv('LXD_DIR', os.path.join(os.sep, 'here', 'is', 'no', 'lxd'))
+    assert find_lxd_socket() is None
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import pytest
+from edi.lib.helpers import FatalError
+from edi.lib.packageindex import PackageIndex
+from edi.lib.templateengine import TemplateEngine
+
+installed_packages = [
+    {'package': 'sudo', 'version': '1.8.27-1+deb10u2'},
+    {'package': 'zlib1g', 'version': '1:1.2.11.dfsg-1', 'architecture': 'arm64'},
+    {'package': 'zlib1g', 'version': '1:1.2.11.dfsg-1', 'architecture': 'armhf'},
+    {'package': 'python3-apt', 'version': '1.8.4.1'},
+]
+
+baseline_versions = {'sudo': '1.8.27-1+deb10u1'}
+
+
+def get_names(records):
+    return [record.get_name() for record in records]
+
+
+def test_select():
+    index = PackageIndex(installed_packages, baseline_versions)
+    assert len(index) == 4
+    assert get_names(index.select()) == ['sudo', 'zlib1g', 'zlib1g', 'python3-apt']
+    assert get_names(index.select([])) == []
+    assert get_names(index.select(['python3-apt', 'sudo', 'foo'])) == ['sudo', 'python3-apt']
+    assert get_names(index.select(None, ['zlib1g'])) == ['sudo', 'python3-apt']
+    assert index.select(None, ['zlib1g']) is index.select(None, ['zlib1g'])
+
+
+def test_records():
+    index = PackageIndex(installed_packages, baseline_versions)
+    assert len(index.get_records('zlib1g')) == 2
+    assert index.get_records('foo') == []
+    assert index.get_baseline_version('sudo') == '1.8.27-1+deb10u1'
+    assert index.get_baseline_version('zlib1g') == '0.0.0'
+
+    sudo = index.get_records('sudo')[0]
+    assert sudo['version'] == '1.8.27-1+deb10u2'
+    assert sudo['baseline_version'] == '1.8.27-1+deb10u1'
+    assert 'changelog' not in sudo
+
+    changelog = {'version': '1.8.27-1+deb10u2', 'change_blocks': []}
+    sudo_with_changelog = sudo.with_changelog(changelog)
+    assert sudo_with_changelog.to_dict() == dict(installed_packages[0], baseline_version='1.8.27-1+deb10u1',
+                                                 changelog=changelog)
+    # the package dictionary does not get modified
+    assert 'changelog' not in installed_packages[0]
+
+    template = '{% for p in packages %}{{ p.package }} {{ p["version"] }} {{ p.baseline_version }}{% endfor %}'
+    assert TemplateEngine().render_string(template, {'packages': [sudo]}) == \
+        'sudo 1.8.27-1+deb10u2 1.8.27-1+deb10u1'
+
+    assert json.loads(TemplateEngine().render_string('{{ package|tojson }}', {'package': sudo_with_changelog})) == \
+        sudo_with_changelog.to_dict()
+
+
+def test_missing_package_name():
+    with pytest.raises(FatalError) as error:
+        PackageIndex([{'version': '1.0'}], {})
+    assert "Missing 'package' key" in error.value.message
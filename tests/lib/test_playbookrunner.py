@@ -19,14 +19,22 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
-from edi.lib.configurationparser import ConfigurationParser
+from edi.lib.configurationparser import ConfigurationParser, command_context
+from edi.lib.helpers import FatalError
 from edi.lib.playbookrunner import PlaybookRunner
-from tests.libtesting.helpers import get_command, get_command_parameter
+from tests.libtesting.helpers import (get_command, get_command_parameter, get_sub_command,
+                                      suppress_chown_during_debuild)
+from tests.libtesting.contextmanagers.mocked_executable import mocked_executable, mocked_buildah_version_check
 from edi.lib import mockablerun
+from tests.libtesting.contextmanagers.workspace import workspace
+import configparser
+import json
+import os
 import shutil
 import subprocess
 from codecs import open
 import yaml
+import pytest
 
 
 def verify_inventory(file):
@@ -62,7 +70,7 @@ def test_lxd_connection(config_files, monkeypatch):
 
     monkeypatch.setattr(shutil, 'chown', fakechown)
 
-    with open(config_files, "r") as main_file:
+    with open(config_files, "r") as main_file, workspace():
         parser = ConfigurationParser(main_file)
         runner = PlaybookRunner(parser, "fake-container", "lxd")
 
@@ -70,3 +78,319 @@ def test_lxd_connection(config_files, monkeypatch):
 
         expected_playbooks = ['10_base_system', '20_networking', '30_foo']
         assert playbooks == expected_playbooks
+
+
+def test_aggregated_playbooks(config_files, monkeypatch):
+    invocations = []
+
+    def fake_ansible_playbook_run(*popenargs, **kwargs):
+        if get_command(popenargs) == 'ansible-playbook':
+            with open(popenargs[0][-1], encoding='utf-8') as f:
+                wrapper_playbook = yaml.safe_load(f)
+            with open(get_command_parameter(popenargs, '--extra-vars').lstrip('@'), encoding='utf-8') as f:
+                extra_vars = yaml.safe_load(f)
+            invocations.append((popenargs, wrapper_playbook, extra_vars))
+            return subprocess.CompletedProcess("fakerun", 0, '')
+        else:
+            return subprocess.run(*popenargs, **kwargs)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', fake_ansible_playbook_run)
+
+    def fakechown(*_):
+        pass
+
+    monkeypatch.setattr(shutil, 'chown', fakechown)
+
+    with open(config_files, "r") as main_file, workspace():
+        parser = ConfigurationParser(main_file)
+        monkeypatch.setitem(parser._get_config()['general'], 'edi_aggregate_playbooks', True)
+        runner = PlaybookRunner(parser, "fake-container", "lxd")
+
+        with command_context({'edi_start_at_task': 'foo'}):
+            playbooks = runner.run_all()
+
+        assert playbooks == ['10_base_system', '20_networking', '30_foo']
+        assert len(invocations) == 1
+        cmd, wrapper_playbook, extra_vars = invocations[0]
+        assert 'foo' == get_command_parameter(cmd, '--start-at-task')
+        imported_playbooks = [playbook for playbook in wrapper_playbook if 'import_playbook' in playbook]
+        assert [playbook['name'] for playbook in imported_playbooks] == playbooks
+        for playbook in imported_playbooks:
+            assert os.path.isabs(playbook['import_playbook'])
+        assert len(imported_playbooks) == len(wrapper_playbook)
+        assert extra_vars['edi_config_management_user_name'] == 'edicfgmgmt'
+        assert len(extra_vars['edi_shared_folder_mountpoints']) == 2
+
+
+def test_aggregated_playbook_vars(monkeypatch, tmpdir):
+    wrapper_playbooks = []
+
+    def fake_run_playbook(_, playbook, __, extra_vars, ___):
+        with open(playbook, encoding='utf-8') as f:
+            wrapper_playbooks.append(yaml.safe_load(f))
+        with open(extra_vars, encoding='utf-8') as f:
+            wrapper_playbooks.append(yaml.safe_load(f))
+
+    monkeypatch.setattr(PlaybookRunner, '_run_playbook', fake_run_playbook)
+    suppress_chown_during_debuild(monkeypatch)
+
+    playbooks = [('10_first', 'first/main.yml', {'common': 'foo', 'message': 'first', 'count': 3, 'enabled': False}),
+                 ('20_second', 'second/main.yml', {'common': 'foo'}),
+                 ('30_third', 'third/main.yml', {'common': 'foo', 'message': {'nested': 'third'}, 'count': '007',
+                                                 'enabled': 'yes', 'optional': None})]
+    with workspace():
+        runner = PlaybookRunner(None, "fake-container", "lxd")
+        runner._run_aggregated_playbooks(str(tmpdir), 'inventory', playbooks)
+
+    wrapper_playbook, extra_vars = wrapper_playbooks
+    assert [playbook['name'] for playbook in wrapper_playbook] == ['10_first', '20_second', '30_third']
+    assert extra_vars == {'common': 'foo'}
+    # the playbook specific variables only apply to the imported playbook and keep their types
+    assert wrapper_playbook[0]['vars'] == {'message': 'first', 'count': 3, 'enabled': False}
+    assert 'vars' not in wrapper_playbook[1]
+    assert wrapper_playbook[2]['vars'] == {'message': {'nested': 'third'}, 'count': '007', 'enabled': 'yes',
+                                           'optional': None}
+
+
+def test_aggregated_playbooks_require_same_user(monkeypatch, tmpdir):
+    monkeypatch.setattr(PlaybookRunner, '_run_playbook', lambda *_: pytest.fail('unexpected playbook run'))
+    suppress_chown_during_debuild(monkeypatch)
+
+    playbooks = [('10_first', 'first/main.yml', {'edi_config_management_user_name': 'foo'}),
+                 ('20_second', 'second/main.yml', {'edi_config_management_user_name': 'bar'})]
+    with workspace():
+        runner = PlaybookRunner(None, "fake-container", "lxd")
+        with pytest.raises(FatalError) as error:
+            runner._run_aggregated_playbooks(str(tmpdir), 'inventory', playbooks)
+        assert 'edi_config_management_user_name' in error.value.message
+
+
+def test_invalid_aggregate_playbooks(config_files, monkeypatch):
+    with open(config_files, "r") as main_file:
+        parser = ConfigurationParser(main_file)
+        monkeypatch.setitem(parser._get_config()['general'], 'edi_aggregate_playbooks', 'yes')
+        with pytest.raises(FatalError) as error:
+            parser.get_aggregate_playbooks()
+        assert 'edi_aggregate_playbooks' in error.value.message
+
+
+@pytest.mark.parametrize("setting, value, getter", [
+    ('edi_project_layer_cache', True, 'get_project_layer_cache'),
+    ('edi_lxc_max_snapshots', 3, 'get_lxc_max_snapshots'),
+])
+def test_aggregate_playbooks_conflicts(config_files, monkeypatch, setting, value, getter):
+    with open(config_files, "r") as main_file:
+        parser = ConfigurationParser(main_file)
+        monkeypatch.setitem(parser._get_config()['general'], setting, value)
+        assert getattr(parser, getter)() == value
+
+        monkeypatch.setitem(parser._get_config()['general'], 'edi_aggregate_playbooks', True)
+        with pytest.raises(FatalError) as error:
+            getattr(parser, getter)()
+        assert setting in error.value.message
+        assert 'edi_aggregate_playbooks' in error.value.message
+
+
+def test_ansible_config(config_files, monkeypatch):
+    ansible_configs = []
+
+    def fake_ansible_playbook_run(*popenargs, **kwargs):
+        if get_command(popenargs) == 'ansible-playbook':
+            ansible_config = configparser.RawConfigParser()
+            ansible_config.read(kwargs['env']['ANSIBLE_CONFIG'])
+            ansible_configs.append(ansible_config)
+            return subprocess.CompletedProcess("fakerun", 0, '')
+        else:
+            return subprocess.run(*popenargs, **kwargs)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', fake_ansible_playbook_run)
+
+    def fakechown(*_):
+        pass
+
+    monkeypatch.setattr(shutil, 'chown', fakechown)
+
+    with open(config_files, "r") as main_file, workspace() as workdir:
+        parser = ConfigurationParser(main_file)
+        monkeypatch.setitem(parser._get_config()['general'], 'edi_ansible_config',
+                            {'defaults': {'strategy': 'free', 'forks': None},
+                             'ssh_connection': {'control_path_dir': os.path.join(workdir, 'cp')}})
+        runner = PlaybookRunner(parser, "fake-container", "lxd")
+        runner.run_all()
+
+        assert len(ansible_configs) == 3
+        for ansible_config in ansible_configs:
+            assert ansible_config['defaults']['strategy'] == 'free'
+            assert 'forks' not in ansible_config['defaults']
+            assert 'gathering' not in ansible_config['defaults']
+            assert 'fact_caching' not in ansible_config['defaults']
+            assert ansible_config.getboolean('ssh_connection', 'pipelining')
+            assert 'ControlPersist' in ansible_config['ssh_connection']['ssh_args']
+        assert os.path.isdir(os.path.join(workdir, 'cp'))
+
+
+@pytest.mark.parametrize("ansible_config", [None, False])
+def test_disabled_ansible_config(config_files, monkeypatch, ansible_config):
+    environments = []
+
+    def fake_ansible_playbook_run(*popenargs, **kwargs):
+        if get_command(popenargs) == 'ansible-playbook':
+            environments.append(kwargs['env'])
+            return subprocess.CompletedProcess("fakerun", 0, '')
+        else:
+            return subprocess.run(*popenargs, **kwargs)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', fake_ansible_playbook_run)
+    monkeypatch.delenv('ANSIBLE_CONFIG', raising=False)
+
+    def fakechown(*_):
+        pass
+
+    monkeypatch.setattr(shutil, 'chown', fakechown)
+
+    with open(config_files, "r") as main_file, workspace():
+        parser = ConfigurationParser(main_file)
+        if ansible_config is not None:
+            monkeypatch.setitem(parser._get_config()['general'], 'edi_ansible_config', ansible_config)
+        runner = PlaybookRunner(parser, "fake-container", "lxd")
+        runner.run_all()
+
+        assert len(environments) == 3
+        assert all('ANSIBLE_CONFIG' not in environment for environment in environments)
+
+
+@pytest.mark.parametrize("own_config", ['environment', 'playbook_directory'])
+def test_own_ansible_config(config_files, monkeypatch, own_config):
+    environments = []
+
+    def fake_ansible_playbook_run(*popenargs, **kwargs):
+        if get_command(popenargs) == 'ansible-playbook':
+            environments.append(kwargs['env'])
+            return subprocess.CompletedProcess("fakerun", 0, '')
+        else:
+            return subprocess.run(*popenargs, **kwargs)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', fake_ansible_playbook_run)
+    monkeypatch.delenv('ANSIBLE_CONFIG', raising=False)
+
+    def fakechown(*_):
+        pass
+
+    monkeypatch.setattr(shutil, 'chown', fakechown)
+
+    with open(config_files, "r") as main_file, workspace():
+        parser = ConfigurationParser(main_file)
+        monkeypatch.setitem(parser._get_config()['general'], 'edi_ansible_config', True)
+        runner = PlaybookRunner(parser, "fake-container", "lxd")
+        if own_config == 'environment':
+            monkeypatch.setenv('ANSIBLE_CONFIG', '/my/ansible.cfg')
+        else:
+            _, playbook, _ = runner._get_playbooks()[-1]
+            with open(os.path.join(os.path.dirname(playbook), 'ansible.cfg'), mode='w') as f:
+                f.write('[defaults]\n')
+        runner.run_all()
+
+        assert len(environments) == 3
+        for environment in environments:
+            if own_config == 'environment':
+                assert environment['ANSIBLE_CONFIG'] == '/my/ansible.cfg'
+            else:
+                assert 'ANSIBLE_CONFIG' not in environment
+
+
+@pytest.mark.parametrize("ansible_config", ['yes', {'defaults': 'forks=5'}])
+def test_invalid_ansible_config(config_files, monkeypatch, ansible_config):
+    with open(config_files, "r") as main_file:
+        parser = ConfigurationParser(main_file)
+        monkeypatch.setitem(parser._get_config()['general'], 'edi_ansible_config', ansible_config)
+        with pytest.raises(FatalError) as error:
+            parser.get_ansible_config()
+        assert 'edi_ansible_config' in error.value.message
+
+
+def test_chroot_connection(config_files, monkeypatch):
+    ansible_commands = []
+
+    def fake_buildah_run(*popenargs, **kwargs):
+        if get_command(popenargs).endswith('buildah') and get_sub_command(popenargs) == 'inspect':
+            return subprocess.CompletedProcess("fakerun", 0, stdout="")
+        elif get_command(popenargs).endswith('buildah') and get_sub_command(popenargs) == 'unshare':
+            assert 'edi_project_container_root=fake-container' == get_command_parameter(popenargs, '--mount')
+            assert 'mount --rbind' in popenargs[0][popenargs[0].index('-c') + 1]
+            ansible_command = popenargs[0][popenargs[0].index('-c') + 3:]
+            assert 'ansible-playbook' in ansible_command
+            assert 'ANSIBLE_CONFIG' in kwargs['env']
+            ansible_commands.append(ansible_command)
+            return subprocess.CompletedProcess("fakerun", 0, '')
+        else:
+            return subprocess.run(*popenargs, **kwargs)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', fake_buildah_run)
+
+    def fakechown(*_):
+        pass
+
+    monkeypatch.setattr(shutil, 'chown', fakechown)
+
+    with open(config_files, "r") as main_file, workspace(), \
+            mocked_executable('buildah', '/here/is/no/buildah'), mocked_buildah_version_check():
+        parser = ConfigurationParser(main_file)
+        monkeypatch.setitem(parser._get_config()['general'], 'edi_buildah_connection', 'chroot')
+        monkeypatch.setitem(parser._get_config()['general'], 'edi_ansible_config', True)
+        runner = PlaybookRunner(parser, "fake-container", parser.get_buildah_connection())
+
+        playbooks = runner.run_all()
+
+        assert playbooks == ['10_base_system', '20_networking', '30_foo']
+        assert len(ansible_commands) == 3
+        for ansible_command in ansible_commands:
+            assert 'chroot' == ansible_command[ansible_command.index('--connection') + 1]
+            extra_vars = [ansible_command[index + 1] for index, item in enumerate(ansible_command)
+                          if item == '--extra-vars']
+            assert json.loads(extra_vars[-1])['ansible_host'] == \
+                "{{ lookup('env', 'edi_project_container_root') }}"
+
+
+def test_invalid_buildah_connection(config_files, monkeypatch):
+    with open(config_files, "r") as main_file:
+        parser = ConfigurationParser(main_file)
+        assert parser.get_buildah_connection() == 'buildah'
+        monkeypatch.setitem(parser._get_config()['general'], 'edi_buildah_connection', 'podman')
+        with pytest.raises(FatalError) as error:
+            parser.get_buildah_connection()
+        assert 'edi_buildah_connection' in error.value.message
+
+
+def test_resume_playbooks(config_files, monkeypatch):
+    ansible_commands = []
+
+    def fake_ansible_playbook_run(*popenargs, **kwargs):
+        if get_command(popenargs) == 'ansible-playbook':
+            ansible_commands.append(popenargs[0])
+            return subprocess.CompletedProcess("fakerun", 0, '')
+        else:
+            return subprocess.run(*popenargs, **kwargs)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', fake_ansible_playbook_run)
+
+    def fakechown(*_):
+        pass
+
+    monkeypatch.setattr(shutil, 'chown', fakechown)
+
+    with open(config_files, "r") as main_file, workspace():
+        parser = ConfigurationParser(main_file)
+        runner = PlaybookRunner(parser, "fake-container", "lxd")
+
+        fingerprints = runner.get_fingerprints('base')
+        assert len(fingerprints) == 3
+        assert len(set(fingerprints)) == 3
+        assert fingerprints == runner.get_fingerprints('base')
+        assert fingerprints[0] != runner.get_fingerprints('other base')[0]
+
+        completed_layers = []
+        playbooks = runner.run_all(skip=1, playbook_done=lambda index, _: completed_layers.append(index))
+
+        assert playbooks == ['20_networking', '30_foo']
+        assert len(ansible_commands) == 2
+        assert completed_layers == [1, 2]
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import os
+import subprocess
+import sys
+import pytest
+import edi
+from contextlib import contextmanager
+from edi.lib.profiler import Profiler, profiled_stage
+from edi.lib.shellhelpers import run
+from edi.commands.imagecommands.bootstrap import Bootstrap
+from tests.libtesting.contextmanagers.workspace import workspace
+from tests.libtesting.helpers import suppress_chown_during_debuild
+
+
+@contextmanager
+def enabled_profiler():
+    try:
+        Profiler.enable()
+        yield
+    finally:
+        Profiler(clear_cache=True)
+
+
+def test_disabled_profiler():
+    Profiler(clear_cache=True)
+    with profiled_stage('nothing'):
+        run(['true'])
+    assert Profiler.get_events() == []
+
+
+def test_profiled_stage_and_subprocess(tmpdir):
+    target = os.path.join(str(tmpdir), 'zeros')
+    with enabled_profiler():
+        with profiled_stage('write zeros', 'test'):
+            run(['sh', '-c', 'head -c 2000000 /dev/zero > {}'.format(target)])
+            result = run(['echo', 'hello'], stdout=subprocess.PIPE)
+            assert result.stdout == 'hello\n'
+
+        with pytest.raises(subprocess.CalledProcessError):
+            run(['false'])
+
+        events = Profiler.get_events()
+        subprocess_events = [event for event in events if event['category'] == 'subprocess']
+        assert len(subprocess_events) == 3
+        assert 'head -c 2000000' in subprocess_events[0]['name']
+        assert subprocess_events[0]['return_code'] == 0
+        assert subprocess_events[0]['peak_rss'] > 0
+        assert subprocess_events[0]['cpu_time'] >= 0
+        assert subprocess_events[2]['return_code'] == 1
+
+        stage = [event for event in events if event['category'] == 'test'][0]
+        assert stage['name'] == 'write zeros'
+        assert stage['wall_time'] >= subprocess_events[0]['wall_time']
+        assert stage['start'] <= subprocess_events[0]['start']
+
+        report_file, trace_file = Profiler.write_report(str(tmpdir))
+
+    with open(report_file, mode='r') as f:
+        assert len(json.load(f)['events']) == 4
+    with open(trace_file, mode='r') as f:
+        trace_events = json.load(f)['traceEvents']
+    assert len(trace_events) == 4
+    assert all(event['ph'] == 'X' for event in trace_events)
+    trace_stage = [event for event in trace_events if event['name'] == 'write zeros'][0]
+    assert trace_stage['cat'] == 'test'
+    assert trace_stage['dur'] >= trace_events[0]['dur']
+
+
+def test_peak_rss_per_subprocess():
+    with enabled_profiler():
+        run([sys.executable, '-c', 'data = bytearray(200 * 1024 * 1024)'])
+        result = run(['cat'], input='hello', stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        assert result.stdout == 'hello'
+        assert result.stderr == ''
+        run(['true'], timeout=10)
+
+        large, small, with_timeout = Profiler.get_events()
+        assert large['peak_rss'] >= 200 * 1024 * 1024
+        # the peak RSS of a previous child must not get attributed to a later one
+        assert 0 < small['peak_rss'] < large['peak_rss']
+        assert with_timeout['peak_rss'] is None
+        assert with_timeout['return_code'] == 0
+
+
+def test_commands_are_profiled():
+    assert Bootstrap._run.__wrapped__
+    assert Bootstrap._run.__name__ == '_run'
+
+
+def test_profile_option(monkeypatch, empty_config_file):
+    suppress_chown_during_debuild(monkeypatch)
+    with workspace():
+        monkeypatch.setattr(sys, 'argv', ['edi', '--profile', 'version'])
+        try:
+            edi.main()
+        finally:
+            Profiler(clear_cache=True)
+
+        with open(os.path.join('artifacts', 'edi_profile.json'), mode='r') as f:
+            events = json.load(f)['events']
+        assert events[-1]['name'] == 'edi --profile version'
+        assert os.path.isfile(os.path.join('artifacts', 'edi_profile.trace.json'))
@@ -24,7 +24,7 @@ import os
 import subprocess
 from contextlib import contextmanager
 import edi.lib.helpers
-from tests.libtesting.helpers import get_command, get_command_parameter, get_sub_command
+from tests.libtesting.helpers import get_command, get_command_parameter
 from edi.lib.proxyhelpers import get_gsettings_value, ProxySetup
 from edi.lib import mockablerun
 
@@ -74,23 +74,27 @@ def intercept_proxy_environment(monkeypatch, gsettings_proxy_mode, gsettings_no_
                 result = ''
 
             return subprocess.CompletedProcess("fakerun", return_value, stdout=result)
-        elif get_command(popenargs) == 'printenv':
-            env_var = get_sub_command(popenargs)
-            if env_var == 'no_proxy' and env_value_no_proxy:
-                return subprocess.CompletedProcess("fakerun", 0, stdout=env_value_no_proxy)
-            elif env_var != 'no_proxy' and env_var.endswith('_proxy') and env_value_proxy:
-                return subprocess.CompletedProcess("fakerun", 0, stdout=env_value_proxy)
-            elif env_var == 'NO_PROXY' and env_value_no_proxy_upper:
-                return subprocess.CompletedProcess("fakerun", 0, stdout=env_value_no_proxy_upper)
-            elif env_var != 'NO_PROXY' and env_var.endswith('_PROXY') and env_value_proxy_upper:
-                return subprocess.CompletedProcess("fakerun", 0, stdout=env_value_proxy_upper)
-            else:
-                return subprocess.CompletedProcess("fakerun", 1, stdout='')
         else:
             return subprocess.run(*popenargs, **kwargs)
 
     monkeypatch.setattr(mockablerun, 'run_mockable', intercept_command_run)
 
+    for proxy in ['http_proxy', 'https_proxy', 'ftp_proxy', 'all_proxy', 'no_proxy']:
+        for env_var in [proxy, proxy.upper()]:
+            if env_var == 'no_proxy':
+                env_value = env_value_no_proxy
+            elif env_var == 'NO_PROXY':
+                env_value = env_value_no_proxy_upper
+            elif env_var.islower():
+                env_value = env_value_proxy
+            else:
+                env_value = env_value_proxy_upper
+
+            if env_value:
+                monkeypatch.setenv(env_var, env_value)
+            else:
+                monkeypatch.delenv(env_var, raising=False)
+
 
 def test_get_gsettings_value(monkeypatch):
     intercept_proxy_environment(monkeypatch, 'manual',
@@ -20,12 +20,17 @@
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import logging
 import os
+import pwd
 import pytest
 import tempfile
+import time
 from edi.lib.shellhelpers import (run, safely_remove_artifacts_folder, gpg_agent, require,
                                   Executables, get_user_home_directory, mockablerun, mount_aware_tempdir,
-                                  get_current_display, is_running_in_user_namespace)
+                                  get_current_display, is_running_in_user_namespace, step_log)
+from edi.lib import shellhelpers
+from edi.lib import hostfacthelpers
 from tests.libtesting.contextmanagers.workspace import workspace
 from tests.libtesting.helpers import (get_random_string, suppress_chown_during_debuild, get_command,
                                       get_sub_command, get_command_parameter)
@@ -43,9 +48,14 @@ def test_get_user_home_directory(monkeypatch):
             return subprocess.run(*popenargs, **kwargs)
 
     monkeypatch.setattr(mockablerun, 'run_mockable', fake_getent_passwd)
+    monkeypatch.setattr(hostfacthelpers, 'get_user_home_directory', lambda _: None)
     assert get_user_home_directory('john') == '/home/john'
 
 
+def test_get_user_home_directory_natively():
+    assert get_user_home_directory('root') == pwd.getpwnam('root').pw_dir
+
+
 def test_artifacts_folder_removal(monkeypatch):
     suppress_chown_during_debuild(monkeypatch)
 
@@ -206,15 +216,91 @@ def test_mount_aware_tempdir_remove_mount():
     ('', ''),
 ])
 def test_get_current_display(monkeypatch, env_var, result):
-    def intercept_command_run(*popenargs, **kwargs):
-        if get_command(popenargs) == 'printenv' and get_sub_command(popenargs) == 'DISPLAY':
-            return subprocess.CompletedProcess("fakerun", 0, stdout=env_var)
-        else:
-            return subprocess.run(*popenargs, **kwargs)
-
-    monkeypatch.setattr(mockablerun, 'run_mockable', intercept_command_run)
+    monkeypatch.setenv('DISPLAY', env_var)
     assert get_current_display() == result
 
 
 def test_is_running_in_user_namespace():
     assert not is_running_in_user_namespace()
+
+
+def test_streamed_run(monkeypatch, caplog):
+    suppress_chown_during_debuild(monkeypatch)
+    caplog.set_level(logging.INFO)
+
+    with workspace():
+        with step_log('test_step') as log_file:
+            result = run(['sh', '-c', 'echo one; echo two >&2; printf three'], log_threshold=logging.INFO)
+
+        assert result.returncode == 0
+        assert log_file == os.path.join(get_artifact_dir(), '.edi_logs', 'test_step.log')
+        with open(log_file, encoding='utf-8') as f:
+            assert sorted(f.read().splitlines()) == ['one', 'three', 'two']
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert 'one' in messages
+    assert 'three' in messages
+    assert 'two' not in messages
+
+
+def test_streamed_run_does_not_collect_stdout(caplog):
+    caplog.set_level(logging.WARNING)
+
+    # the streamed output only gets forwarded (bounded memory)
+    result = run(['sh', '-c', 'echo hi; echo ignored >&2'], log_threshold=logging.INFO)
+    assert result.stdout is None
+
+    result = run(['sh', '-c', 'echo hi; echo ignored >&2'], stdout=subprocess.PIPE, log_threshold=logging.INFO)
+    assert result.stdout == 'hi\n'
+
+    result = run(['printf', 'raw'], stdout=subprocess.PIPE, universal_newlines=False, log_threshold=logging.INFO)
+    assert result.stdout == b'raw'
+
+
+def test_streamed_run_ignores_daemonized_children():
+    start = time.monotonic()
+    result = run(['sh', '-c', 'sleep 30 & echo started'])
+    assert time.monotonic() - start < 10
+    assert result.returncode == 0
+
+
+def test_streamed_run_keeps_tail_only():
+    cmd = ['sh', '-c', 'for i in $(seq 1 1000); do echo "line $i"; done; exit 3']
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        run(cmd)
+
+    assert error.value.returncode == 3
+    tail = error.value.output.splitlines()
+    assert len(tail) == shellhelpers._tail_line_count
+    assert tail[-1] == 'line 1000'
+
+
+def test_streamed_run_is_mockable(monkeypatch):
+    def fake_run(*popenargs, **kwargs):
+        assert type(kwargs['stdout']) is int
+        return subprocess.CompletedProcess("fakerun", 0)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', fake_run)
+    assert run(['fake-command']).returncode == 0
+
+
+def test_run_keeps_terminal(monkeypatch):
+    suppress_chown_during_debuild(monkeypatch)
+    subprocess_kwargs = []
+
+    def fake_run(*_, **kwargs):
+        subprocess_kwargs.append(kwargs)
+        return subprocess.CompletedProcess("fakerun", 0)
+
+    monkeypatch.setattr(mockablerun, 'run_mockable', fake_run)
+    monkeypatch.setattr(mockablerun, 'is_logging_enabled_for', lambda _: True)
+
+    run(['fake-command'])
+    assert subprocess_kwargs[-1]['stdout'] is None
+    assert 'stderr' not in subprocess_kwargs[-1]
+
+    with workspace():
+        with step_log('test_step'):
+            run(['fake-command'])
+    assert type(subprocess_kwargs[-1]['stdout']) is int
+    assert type(subprocess_kwargs[-1]['stderr']) is int
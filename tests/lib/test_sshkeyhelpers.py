@@ -25,7 +25,7 @@ import edi.lib.helpers
 from codecs import open
 from edi.lib.sshkeyhelpers import get_user_ssh_pub_keys
 from tests.libtesting.helpers import get_command, get_sub_command
-from edi.lib import mockablerun
+from edi.lib import mockablerun, hostfacthelpers
 import subprocess
 
 
@@ -61,6 +61,9 @@ def fake_ssh_environment(monkeypatch, tmpdir):
             return subprocess.run(*popenargs, **kwargs)
 
     monkeypatch.setattr(mockablerun, 'run_mockable', intercept_command_run)
+    # force the fallback to ssh -G and getent
+    monkeypatch.setattr(hostfacthelpers, 'get_ssh_identity_files', lambda _: None)
+    monkeypatch.setattr(hostfacthelpers, 'get_user_home_directory', lambda _: None)
 
 
 def test_ssh_identity_files_no_ssh(monkeypatch):
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import pytest
+import time
+from edi.lib import templateengine
+from edi.lib.templateengine import TemplateEngine
+from tests.libtesting.helpers import suppress_chown_during_debuild
+
+
+def write_template(directory, name, content, mtime=None):
+    path = os.path.join(str(directory), name)
+    with open(path, encoding='utf-8', mode='w') as f:
+        f.write(content)
+    if mtime:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def setup_engine(monkeypatch, home_directory):
+    suppress_chown_during_debuild(monkeypatch)
+    monkeypatch.setattr(templateengine, 'get_user_home_directory', lambda _: str(home_directory))
+    return TemplateEngine(clear_cache=True)
+
+
+def test_render_file(monkeypatch, tmpdir):
+    engine = setup_engine(monkeypatch, tmpdir.mkdir('home'))
+    template = write_template(tmpdir, 'hello.j2', 'Hello {{ name }}!')
+
+    assert engine.render_file(template, {'name': 'edi'}) == 'Hello edi!'
+    assert engine.get_template(template) is TemplateEngine().get_template(template)
+
+    # a modified template gets recompiled
+    write_template(tmpdir, 'hello.j2', 'Bye {{ name }}!', mtime=time.time() + 10)
+    assert TemplateEngine().render_file(template, {'name': 'edi'}) == 'Bye edi!'
+
+
+def test_bytecode_cache(monkeypatch, tmpdir):
+    home_directory = tmpdir.mkdir('home')
+    template = write_template(tmpdir, 'hello.j2', 'Hello {{ name }}!')
+    setup_engine(monkeypatch, home_directory).render_file(template, {'name': 'edi'})
+
+    cache_directory = os.path.join(str(home_directory), '.cache', 'edi', 'templates')
+    assert len(os.listdir(cache_directory)) == 1
+
+    # a new process (simulated by clearing the in memory cache) loads the compiled template
+    engine = TemplateEngine(clear_cache=True)
+    assert engine.render_file(template, {'name': 'edi'}) == 'Hello edi!'
+    assert len(os.listdir(cache_directory)) == 1
+
+
+def setup_sudo_engine(monkeypatch, tmpdir):
+    homes = {'root': tmpdir.mkdir('root'), 'john': tmpdir.mkdir('john')}
+    setup_engine(monkeypatch, None)
+    monkeypatch.setattr(templateengine, 'get_user_home_directory', lambda user: str(homes[user]))
+    monkeypatch.setattr(templateengine, 'get_user', lambda: 'john')
+    monkeypatch.setattr(os, 'geteuid', lambda: 0)
+    return homes
+
+
+def test_no_user_bytecode_as_root(monkeypatch, tmpdir):
+    homes = setup_sudo_engine(monkeypatch, tmpdir)
+    template = write_template(tmpdir, 'hello.j2', 'Hello {{ name }}!')
+
+    # sudo edi: the bytecode goes to the cache directory of root
+    assert TemplateEngine(clear_cache=True).render_file(template, {'name': 'edi'}) == 'Hello edi!'
+    assert not os.path.exists(os.path.join(str(homes['john']), '.cache'))
+    root_cache_directory = os.path.join(str(homes['root']), '.cache', 'edi', 'templates')
+    assert len(os.listdir(root_cache_directory)) == 1
+
+
+@pytest.mark.requires_sudo
+def test_no_foreign_bytecode_as_root(monkeypatch, tmpdir):
+    homes = setup_sudo_engine(monkeypatch, tmpdir)
+    template = write_template(tmpdir, 'hello.j2', 'Hello {{ name }}!')
+
+    # a cache directory that is not owned by root does not get used
+    root_cache_directory = os.path.join(str(homes['root']), '.cache', 'edi', 'templates')
+    os.makedirs(root_cache_directory)
+    os.chown(root_cache_directory, 4242, 4242)
+    engine = TemplateEngine(clear_cache=True)
+    assert engine.render_file(template, {'name': 'edi'}) == 'Hello edi!'
+    assert TemplateEngine._get_cache_directory() is None
+
+
+def test_options_and_strings(monkeypatch, tmpdir):
+    engine = setup_engine(monkeypatch, tmpdir.mkdir('home'))
+    template = write_template(tmpdir, 'block.j2', '{% if True %}\n  value\n{% endif %}\n')
+
+    assert engine.render_file(template, {}) == '\n  value\n'
+    assert engine.render_file(template, {}, trim_blocks=True, lstrip_blocks=True) == '  value\n'
+    assert engine.render_string('{{ a }}-{{ b }}', {'a': 1, 'b': 2}) == '1-2'
+    assert engine.render_string('{{ a }}-{{ b }}', {'a': 3, 'b': 4}) == '3-4'
+
+
+def test_bounded_string_templates(monkeypatch, tmpdir):
+    engine = setup_engine(monkeypatch, tmpdir.mkdir('home'))
+    monkeypatch.setattr(TemplateEngine, '_max_string_templates', 2)
+
+    assert engine.render_string('a{{ x }}', {'x': 1}) == 'a1'
+    assert engine.render_string('b{{ x }}', {'x': 1}) == 'b1'
+    assert engine.render_string('a{{ x }}', {'x': 2}) == 'a2'
+    assert engine.render_string('c{{ x }}', {'x': 1}) == 'c1'
+
+    # the least recently used template got evicted
+    assert list(TemplateEngine._string_templates) == ['a{{ x }}', 'c{{ x }}']
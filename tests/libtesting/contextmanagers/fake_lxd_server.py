@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 Matthias Luescher
+#
+# Authors:
+#  Matthias Luescher
+#
+# This file is part of edi.
+#
+# edi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# edi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with edi.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import os
+import socketserver
+import tempfile
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler
+
+
+def sync_response(metadata):
+    return {'type': 'sync', 'status': 'Success', 'status_code': 200, 'metadata': metadata}
+
+
+def async_response(operation):
+    return {'type': 'async', 'status': 'Operation created', 'status_code': 100, 'operation': operation}
+
+
+def error_response(error_code, error):
+    return {'type': 'error', 'error_code': error_code, 'error': error}
+
+
+class _FakeLxdRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def handle_request(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length) if length else b''
+        self.server.requests.append((self.command, self.path, body))
+
+        route = self.server.routes.get((self.command, self.path))
+        if route is None:
+            response = error_response(404, 'not found')
+            status, headers, content = 404, {'Content-Type': 'application/json'}, json.dumps(response).encode()
+        elif callable(route):
+            result = route(body)
+            if result is None:
+                # drop the connection without a response
+                self.close_connection = True
+                return
+            status, headers, content = result
+        else:
+            status, headers, content = 200, {'Content-Type': 'application/json'}, json.dumps(route).encode()
+
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        if 'Content-Length' in headers:
+            # the content might be shorter than announced: abort the transfer
+            self.close_connection = True
+        else:
+            self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = handle_request
+    do_POST = handle_request
+    do_PUT = handle_request
+    do_PATCH = handle_request
+    do_DELETE = handle_request
+
+    def log_message(self, *_):
+        pass
+
+
+class _FakeLxdServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, routes):
+        super().__init__(socket_path, _FakeLxdRequestHandler)
+        self.routes = routes
+        self.requests = []
+        self.connections = 0
+
+
+@contextmanager
+def fake_lxd_server(routes):
+    """
+    Serves a fake LXD REST API on a temporary unix socket.
+    :param routes: A dictionary that maps (method, path) either to a json response or to a
+                   callable that takes the request body and returns (status, headers, content)
+                   or None to drop the connection. A Content-Length header that exceeds the length
+                   of the content simulates an aborted transfer.
+    :return: The server (providing socket_path, requests and connections).
+    """
+    with tempfile.TemporaryDirectory() as tempdir:
+        server = _FakeLxdServer(os.path.join(tempdir, 'unix.socket'), routes)
+        server.socket_path = server.server_address
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            yield server
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -23,7 +23,7 @@
 import os
 from contextlib import contextmanager
 from edi.lib.shellhelpers import Executables
-from edi.lib.lxchelpers import LxdVersion
+from edi.lib.lxchelpers import LxdVersion, LxdBackend
 from edi.lib.buildahhelpers import BuildahVersion
 from edi.lib.podmanhelpers import PodmanVersion
 
@@ -69,3 +69,15 @@ def mocked_podman_version_check():
         yield
     finally:
         PodmanVersion._check_done = False
+
+
+@contextmanager
+def mocked_lxd_backend(rest_client=None):
+    """
+    Forces the LXD backend: None selects the lxc command line client.
+    """
+    LxdBackend._cache['rest_client'] = rest_client
+    try:
+        yield rest_client
+    finally:
+        LxdBackend(clear_cache=True)
@@ -19,7 +19,16 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with edi.  If not, see <http://www.gnu.org/licenses/>.
 
+import argparse
+import importlib
+import os
+import pkgutil
+import subprocess
+import sys
+import pytest
 import edi
+import edi.commands
+from edi.lib import commandfactory
 
 
 def test_command_line_interface_setup(empty_config_file):
@@ -31,3 +40,66 @@ def test_command_line_interface_setup(empty_config_file):
     assert args.container_name == 'some-container'
     assert args.sub_command_name == 'configure'
     assert args.verbose is True
+
+
+def _get_advertised_help(parser, prefix='edicommand'):
+    help_texts = {}
+    for action in parser._actions:
+        if isinstance(action, argparse._SubParsersAction):
+            for choice_action in action._choices_actions:
+                command = '{}.{}'.format(prefix, choice_action.dest)
+                help_texts[command] = choice_action.help
+                help_texts.update(_get_advertised_help(action.choices[choice_action.dest], command))
+    return help_texts
+
+
+def test_command_manifest():
+    for module_info in pkgutil.walk_packages(edi.commands.__path__, prefix='edi.commands.'):
+        importlib.import_module(module_info.name)
+
+    assert set(commandfactory._command_registry) == set(commandfactory._command_manifest)
+
+    advertised_help = _get_advertised_help(edi._setup_command_line_interface())
+    assert set(advertised_help) == set(commandfactory._command_manifest)
+    for command, help_text in advertised_help.items():
+        assert help_text == commandfactory.get_command_help(command)
+
+
+_startup_script = '''
+import sys
+import time
+start = time.perf_counter()
+import edi
+try:
+    edi._setup_command_line_interface(sys.argv[1:]).parse_args(sys.argv[1:])
+except SystemExit:
+    pass
+print(time.perf_counter() - start)
+print(' '.join(sorted(sys.modules)))
+'''
+
+# modules that are expensive to import and not needed to dispatch a command
+_heavy_modules = ['requests', 'argcomplete', 'jinja2', 'gnupg', 'debian.changelog', 'dateutil', 'aptsources',
+                  'edi.commands.imagecommands.bootstrap', 'edi.commands.documentationcommands.render']
+
+# generous budget for the startup of the edi command line interface (without the python interpreter startup)
+# that still catches the import of a heavy dependency (the best of a few runs compensates for a busy machine)
+_startup_time_budget = 2.0
+
+
+@pytest.mark.parametrize("argv", [['version'], ['--help'], ['config', 'init', 'foo', 'bar-amd64']])
+def test_startup_time(argv):
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.path.dirname(os.path.dirname(edi.__file__))
+    env.pop('_ARGCOMPLETE', None)
+
+    measurements = []
+    for _ in range(3):
+        result = subprocess.run([sys.executable, '-c', _startup_script] + argv, env=env, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True)
+        startup_time, loaded_modules = result.stdout.splitlines()[-2:]
+        for heavy_module in _heavy_modules:
+            assert heavy_module not in loaded_modules.split()
+        measurements.append(float(startup_time))
+
+    assert min(measurements) < _startup_time_budget